@@ -1,22 +1,81 @@
 import React, { useState, useEffect, useRef } from 'react'
 import io from 'socket.io-client'
+import msgpackParser from 'socket.io-msgpack-parser'
 import { DiscordSDK } from "@discord/embedded-app-sdk";
 
 // Mock SDK if outside Discord
 const discordSdk = new DiscordSDK(import.meta.env.VITE_DISCORD_CLIENT_ID || "1234567890");
 
+// Opt-in MessagePack frames (the API picks the codec per connection; JSON otherwise).
+const USE_MSGPACK = import.meta.env.VITE_SOCKET_MSGPACK === '1';
+
 const socket = io({
   path: '/socket.io',
   transports: ['websocket'],
-  autoConnect: false
+  autoConnect: false,
+  ...(USE_MSGPACK && { parser: msgpackParser, query: { codec: 'msgpack' } })
 });
 
+// Drift correction (seconds): nudge playbackRate past DRIFT_TOLERANCE, hard seek past HARD_SEEK.
+const DRIFT_TOLERANCE = 0.1;
+const HARD_SEEK = 1.0;
+const PING_INTERVAL_MS = 10000;
+
+// Server clock estimate: offset taken from the lowest-RTT of the recent time_ping samples.
+const clock = { offset: 0, samples: [] };
+const serverNow = () => Date.now() / 1000 + clock.offset;
+
+function pingServer() {
+    const t0 = Date.now() / 1000;
+    socket.emit('time_ping', t0, ({ server_time }) => {
+        const t1 = Date.now() / 1000;
+        const rtt = t1 - t0;
+        clock.samples = [...clock.samples.slice(-4), { rtt, offset: server_time - (t0 + rtt / 2) }];
+        clock.offset = clock.samples.reduce((best, s) => (s.rtt < best.rtt ? s : best)).offset;
+    });
+}
+
 function App() {
   const [session, setSession] = useState(null);
   const [sessionIdInput, setSessionIdInput] = useState("");
   const [status, setStatus] = useState("Disconnected");
   const [videoUrl, setVideoUrl] = useState("");
+  const [videoTitle, setVideoTitle] = useState("");
   const videoRef = useRef(null);
+  // Last authoritative state from the server: { url, position, playing, server_time, revision }
+  const playbackRef = useRef(null);
+
+  const correctDrift = () => {
+      const video = videoRef.current;
+      const state = playbackRef.current;
+      if (!video || !state) return;
+      const target = state.position + (state.playing ? serverNow() - state.server_time : 0);
+      const drift = video.currentTime - target;
+
+      if (!state.playing) {
+          if (!video.paused) video.pause();
+          if (Math.abs(drift) > DRIFT_TOLERANCE) video.currentTime = target;
+          return;
+      }
+      if (video.paused) video.play().catch(() => {});
+      if (Math.abs(drift) > HARD_SEEK) {
+          video.currentTime = target;
+          video.playbackRate = 1;
+      } else if (Math.abs(drift) > DRIFT_TOLERANCE) {
+          video.playbackRate = drift > 0 ? 0.95 : 1.05;
+      } else {
+          video.playbackRate = 1;
+      }
+  };
+
+  const applyState = (state) => {
+      if (playbackRef.current && state.revision < playbackRef.current.revision) return;
+      playbackRef.current = state;
+      // Prefer the source the API resolved (same direct file for everyone); raw URL as fallback.
+      setVideoUrl(state.media?.source || state.url || "");
+      setVideoTitle(state.media?.title || state.url || "");
+      correctDrift();
+  };
 
   useEffect(() => {
     async function setupDiscord() {
@@ -33,10 +92,19 @@ function App() {
                     "guilds",
                 ],
             });
-            // Authenticate with backend
-            // const response = await fetch('/api/auth', { method: 'POST', body: JSON.stringify({ code }) })
-            // ...
+            // The API trades the code for a token; the socket presents that token and the
+            // API looks up who we are with Discord (room tickets are checked against that).
+            const response = await fetch('/api/token', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ code }),
+            });
+            if (!response.ok) throw new Error(`Token exchange failed (${response.status})`);
+            const { access_token } = await response.json();
+            await discordSdk.commands.authenticate({ access_token });
             setStatus("Discord Authorized");
+            socket.auth = { access_token };
+            socket.connect();
         } catch (e) {
             console.error(e);
             setStatus("Discord SDK Error (Dev Mode?)");
@@ -44,26 +112,51 @@ function App() {
     }
     setupDiscord();
 
-    socket.connect();
-    socket.on('connect', () => setStatus("Socket Connected"));
+    socket.on('connect', () => {
+        setStatus("Socket Connected");
+        pingServer();
+    });
     socket.on('disconnect', () => setStatus("Socket Disconnected"));
-    
+    socket.on('connect_error', () => setStatus("Not authorized (open the activity from Discord)"));
+    const pinger = setInterval(() => socket.connected && pingServer(), PING_INTERVAL_MS);
+
+    // Full snapshots: on join (sync_state) and on every control event (sync_video).
+    socket.on('sync_state', applyState);
     socket.on('sync_video', (data) => {
         console.log("Sync Event", data);
-        if (data.action === 'play') {
-            setVideoUrl(data.url);
-            // Auto play logic
-        } else if (data.action === 'seek') {
-             if (videoRef.current) videoRef.current.currentTime = data.timestamp;
-        } else if (data.action === 'pause') {
-             if (videoRef.current) videoRef.current.pause();
-        }
+        applyState(data);
+    });
+    // Heartbeat: refresh the clock. A newer revision here means the server dropped a
+    // broadcast that looked identical to the state we already have.
+    socket.on('join_denied', () => {
+        setSession(null);
+        setStatus("No ticket for this session (use !cinema join <id> first)");
+    });
+    socket.on('session_ended', () => {
+        setSession(null);
+        playbackRef.current = null;
+        setVideoUrl("");
+        setStatus("Session ended");
+    });
+    socket.on('tick', ({ p, t, r }) => {
+        const state = playbackRef.current;
+        if (!state || r < state.revision) return;
+        state.position = p;
+        state.server_time = t;
+        state.revision = r;
+        correctDrift();
     });
 
     return () => {
+        clearInterval(pinger);
         socket.off('connect');
         socket.off('disconnect');
+        socket.off('connect_error');
+        socket.off('sync_state');
         socket.off('sync_video');
+        socket.off('tick');
+        socket.off('join_denied');
+        socket.off('session_ended');
         socket.disconnect();
     }
   }, []);
@@ -99,12 +192,13 @@ function App() {
             <h2>Session: {session}</h2>
             {videoUrl ? (
                 <div style={{ marginTop: 20 }}>
-                    <p>Playing: {videoUrl}</p>
+                    <p>Playing: {videoTitle}</p>
                     {/* Simple Video Tag for Demo */}
                     <video 
                         ref={videoRef}
                         src={videoUrl} 
                         controls 
+                        onLoadedMetadata={correctDrift}
                         style={{ width: '100%', maxWidth: 800, borderRadius: 10 }}
                     />
                 </div>
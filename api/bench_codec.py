@@ -0,0 +1,102 @@
+"""
+Socket.IO codec benchmark (in-process, no network).
+
+Broadcasts a sync_video snapshot to a room of N viewers through CodecServer and
+measures CPU per broadcast and bytes on the wire for all-JSON, all-MessagePack
+and mixed rooms, next to a naive encode-per-recipient baseline. The engine.io
+send is replaced by a sink that frames each packet the way the transport would
+and counts its size.
+
+Usage (repo root):
+    PYTHONPATH=. python api/bench_codec.py --viewers 100 500 1000 --broadcasts 200
+"""
+import argparse
+import asyncio
+import time
+
+from socketio import packet
+
+from api.cinema.codec import CodecServer, to_msgpack
+from api.cinema.state import PlaybackState, room_for
+
+SESSION = "bench"
+
+
+def snapshot():
+    state = PlaybackState(SESSION, url="https://cdn.example.com/videos/some-long-video-name.mp4")
+    state.apply("play")
+    state.apply("seek", timestamp=1234.5)
+    return state.snapshot()
+
+
+async def build_room(viewers, msgpack_share):
+    server = CodecServer(async_mode='asgi')
+    server.manager.initialize()
+    wire = {"bytes": 0, "frames": 0}
+
+    async def sink(eio_sid, eio_pkt):
+        wire["bytes"] += len(eio_pkt.encode())
+        wire["frames"] += 1
+
+    server.eio.send_packet = sink
+    msgpack_viewers = int(viewers * msgpack_share)
+    for i in range(viewers):
+        eio_sid = f"eio{i}"
+        if i < msgpack_viewers:
+            server.msgpack_sids.add(eio_sid)
+        sid = await server.manager.connect(eio_sid, '/')
+        await server.manager.enter_room(sid, '/', room_for(SESSION))
+    return server, wire
+
+
+async def run_room(viewers, msgpack_share, broadcasts):
+    server, wire = await build_room(viewers, msgpack_share)
+    data = snapshot()
+    start = time.process_time()
+    for _ in range(broadcasts):
+        await server.emit('sync_video', data, room=room_for(SESSION))
+    cpu = time.process_time() - start
+    return cpu / broadcasts * 1000, wire["bytes"] / max(wire["frames"], 1)
+
+
+def run_naive(viewers, broadcasts):
+    # What encoding per recipient would cost (JSON): one Packet + encode per viewer.
+    data = snapshot()
+    start = time.process_time()
+    for _ in range(broadcasts):
+        for _ in range(viewers):
+            packet.Packet(packet.EVENT, namespace='/', data=['sync_video', data]).encode()
+    return (time.process_time() - start) / broadcasts * 1000
+
+
+def encode_cost(rounds=20000):
+    # Single-packet encode time (µs) per format, the part that grows with payload size.
+    pkt = packet.Packet(packet.EVENT, namespace='/', data=['sync_video', snapshot()])
+    costs = {}
+    for label, p in (("json", pkt), ("msgpack", to_msgpack(pkt))):
+        start = time.process_time()
+        for _ in range(rounds):
+            p.encode()
+        costs[label] = (time.process_time() - start) / rounds * 1e6
+    return costs
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Socket.IO JSON vs MessagePack broadcast benchmark")
+    parser.add_argument("--viewers", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--broadcasts", type=int, default=200)
+    args = parser.parse_args()
+
+    costs = encode_cost()
+    print("encode per packet: " + ", ".join(f"{k} {v:.1f} µs" for k, v in costs.items()) + "\n")
+    print(f"{'viewers':>8} {'room':>14} {'cpu/broadcast':>14} {'bytes/frame':>12}")
+    for viewers in args.viewers:
+        naive = run_naive(viewers, args.broadcasts)
+        print(f"{viewers:>8} {'naive json':>14} {naive:>11.2f} ms {'-':>12}")
+        for label, share in (("json", 0.0), ("msgpack", 1.0), ("50/50 mix", 0.5)):
+            cpu_ms, frame = await run_room(viewers, share, args.broadcasts)
+            print(f"{viewers:>8} {label:>14} {cpu_ms:>11.2f} ms {frame:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,204 @@
+"""
+Multi-worker Socket.IO fan-out benchmark.
+
+Starts N uvicorn workers (one port each) sharing REDIS_URL, spreads viewers
+round-robin across them, then has a host on worker 0 emit `play_video` and
+times how long each viewer takes to receive the `sync_video` broadcast.
+Viewers on other workers only get it through the Redis manager, so the
+cross-worker numbers are the ones that matter.
+
+Viewers need tickets to join, so each round inserts a throwaway cinema session
+and tickets (workers learn about them through NOTIFY) and deletes them after.
+Workers are started through `--serve`, which swaps Discord token checks for
+`bench-viewer-<user_id>` tokens so viewers can connect as the seeded ticket
+holders. The host connects as the bot with CINEMA_API_SECRET (a random one is
+generated if unset).
+
+Usage (repo root, Redis + Postgres running, e.g. `docker-compose up -d postgres redis`):
+    PYTHONPATH=. REDIS_URL=redis://localhost:6379/0 python api/bench_fanout.py --workers 2 --viewers 10 50 100 250
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import socketio
+
+from common.database.db import Database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VIEWER_TOKEN = "bench-viewer-"
+
+
+def viewer_token(user_id):
+    return f"{VIEWER_TOKEN}{user_id}"
+
+
+def serve(port):
+    """One API worker whose viewers authenticate with viewer_token() instead of a Discord token."""
+    import uvicorn
+    from api import main as api
+
+    async def verify(access_token):
+        if isinstance(access_token, str) and access_token.startswith(VIEWER_TOKEN):
+            return int(access_token[len(VIEWER_TOKEN):])
+        return None
+
+    api.discord_auth.verify = verify
+    uvicorn.run(api.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_workers(count, base_port):
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    procs = []
+    for i in range(count):
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", str(base_port + i)],
+            cwd=ROOT, env=env
+        ))
+    return procs
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"worker on port {port} did not come up")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def connect(port, **kwargs):
+    client = socketio.AsyncClient(reconnection=False)
+    await client.connect(f"http://127.0.0.1:{port}", socketio_path="/socket.io", transports=["websocket"], **kwargs)
+    return client
+
+
+async def create_session(viewer_count):
+    pool = await Database.get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            session_id = str(await conn.fetchval(
+                "INSERT INTO cinema_sessions (host_id, guild_id, channel_id) VALUES (0, 0, 0) RETURNING session_id"
+            ))
+            await conn.executemany(
+                "INSERT INTO cinema_tickets (session_id, user_id) VALUES ($1::uuid, $2)",
+                [(session_id, user_id) for user_id in range(1, viewer_count + 1)]
+            )
+    return session_id
+
+
+async def drop_session(session_id):
+    pool = await Database.get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("DELETE FROM cinema_tickets WHERE session_id = $1::uuid", session_id)
+        await conn.execute("DELETE FROM cinema_sessions WHERE session_id = $1::uuid", session_id)
+
+
+async def run_round(viewer_count, ports, rounds):
+    session_id = await create_session(viewer_count)
+    await asyncio.sleep(0.2)  # NOTIFY delivery to every worker
+    pending = {}
+    samples = {"same_worker": [], "cross_worker": []}
+    viewers = []
+
+    for i in range(viewer_count):
+        port = ports[i % len(ports)]
+        client = await connect(port, auth={"access_token": viewer_token(i + 1)})
+        kind = "same_worker" if port == ports[0] else "cross_worker"
+
+        def on_sync(data, kind=kind):
+            sent = pending.get(data.get("url"))
+            if sent is not None:
+                samples[kind].append(time.perf_counter() - sent)
+
+        client.on("sync_video", on_sync)
+        joined = await client.call("join_session", {"session_id": session_id})
+        if not joined or not joined.get("ok"):
+            print(f"viewer {i + 1} was refused a seat on port {port}")
+        viewers.append(client)
+
+    host = await connect(ports[0], auth={"token": os.environ["CINEMA_API_SECRET"]})
+    await asyncio.sleep(0.5)  # let room joins settle on every worker
+
+    for r in range(rounds):
+        url = f"bench://{session_id}/{r}"
+        pending[url] = time.perf_counter()
+        await host.emit("play_video", {"session_id": session_id, "url": url})
+        await asyncio.sleep(0.5)
+
+    for client in viewers + [host]:
+        await client.disconnect()
+    await drop_session(session_id)
+
+    expected = viewer_count * rounds
+    received = sum(len(v) for v in samples.values())
+    result = {"viewers": viewer_count, "delivered": f"{received}/{expected}"}
+    for kind, values in samples.items():
+        if values:
+            result[kind] = {
+                "p50_ms": statistics.median(values) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "max_ms": max(values) * 1000,
+            }
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Socket.IO multi-worker fan-out benchmark")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=8100)
+    parser.add_argument("--viewers", type=int, nargs="+", default=[10, 50, 100, 250])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)  # worker process
+    return parser.parse_args()
+
+
+async def main(args):
+    if not os.getenv("REDIS_URL"):
+        sys.exit("REDIS_URL must be set; without it each worker has its own rooms.")
+    # The host drives playback as the bot; workers inherit the secret.
+    os.environ.setdefault("CINEMA_API_SECRET", secrets.token_hex(16))
+
+    procs = start_workers(args.workers, args.base_port)
+    ports = [args.base_port + i for i in range(args.workers)]
+    try:
+        for port in ports:
+            wait_ready(port)
+        results = []
+        for count in args.viewers:
+            result = await run_round(count, ports, args.rounds)
+            results.append(result)
+            print(json.dumps(result))
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+        await Database.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.serve:
+        serve(args.serve)
+    else:
+        asyncio.run(main(args))
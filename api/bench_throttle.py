@@ -0,0 +1,102 @@
+"""
+Cinema control-event load test (in-process, no network).
+
+Simulates a host scrubbing the timeline (a burst of seek_video events) plus
+pause/play toggles, fanned out to hundreds of simulated viewers, and compares
+outbound messages for naive re-broadcasting vs the per-room RoomThrottle.
+Also checks that every viewer ends on the final authoritative state.
+
+Usage (repo root):
+    PYTHONPATH=. python api/bench_throttle.py --viewers 100 300 500 --seek-rate 40 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from api.cinema.state import PlaybackStore
+from api.cinema.throttle import RoomThrottle
+
+SESSION = "bench"
+
+
+class Room:
+    """Counts outbound messages as (broadcasts x viewers) and tracks the last state each viewer saw."""
+
+    def __init__(self, viewers):
+        self.viewers = viewers
+        self.messages = 0
+        self.last_seen = None
+
+    async def emit(self, session_id, state):
+        self.messages += self.viewers
+        self.last_seen = state.snapshot()
+
+
+async def scrub(store, deliver, seek_rate, seconds, seed):
+    rng = random.Random(seed)
+    await store.apply(SESSION, "play", url="bench://video")
+    await deliver()
+    position = 0.0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        roll = rng.random()
+        if roll < 0.05:
+            # Quick pause/play double toggle (the kind that cancels out).
+            await store.apply(SESSION, "pause"); await deliver()
+            await store.apply(SESSION, "play"); await deliver()
+        else:
+            position = max(0.0, position + rng.uniform(-5, 10))
+            await store.apply(SESSION, "seek", timestamp=position); await deliver()
+        await asyncio.sleep(1 / seek_rate)
+
+
+async def run_naive(viewers, seek_rate, seconds, seed):
+    store, room = PlaybackStore(), Room(viewers)
+    events = 0
+
+    async def deliver():
+        nonlocal events
+        events += 1
+        await room.emit(SESSION, await store.get(SESSION))
+
+    await scrub(store, deliver, seek_rate, seconds, seed)
+    return events, room, store
+
+
+async def run_throttled(viewers, seek_rate, seconds, seed):
+    store, room = PlaybackStore(), Room(viewers)
+    throttle = RoomThrottle(store.get, room.emit)
+
+    async def deliver():
+        await throttle.submit(SESSION)
+
+    await scrub(store, deliver, seek_rate, seconds, seed)
+    await asyncio.sleep(throttle.min_interval * 2)  # let the trailing flush land
+    return throttle.stats["events"], room, store, throttle
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Cinema control-event coalescing load test")
+    parser.add_argument("--viewers", type=int, nargs="+", default=[100, 300, 500])
+    parser.add_argument("--seek-rate", type=float, default=40, help="Host control events per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'viewers':>8} {'events':>7} {'naive msgs':>11} {'throttled msgs':>15} {'reduction':>10}  final state")
+    for viewers in args.viewers:
+        events, naive, _ = await run_naive(viewers, args.seek_rate, args.seconds, args.seed)
+        _, throttled, store, throttle = await run_throttled(viewers, args.seek_rate, args.seconds, args.seed)
+
+        final = (await store.get(SESSION)).snapshot()
+        seen = throttled.last_seen
+        consistent = seen is not None and seen["url"] == final["url"] and seen["playing"] == final["playing"] \
+            and abs(seen["position"] - final["position"]) < 0.5
+        reduction = 1 - throttled.messages / naive.messages
+        print(f"{viewers:>8} {events:>7} {naive.messages:>11,} {throttled.messages:>15,} {reduction:>9.1%}  "
+              f"{'delivered' if consistent else 'MISSING'} ({throttle.stats['coalesced']} coalesced, {throttle.stats['suppressed']} suppressed)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
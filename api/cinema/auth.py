@@ -0,0 +1,69 @@
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+# The activity belongs to the cinema bot's application.
+DISCORD_API = "https://discord.com/api/v10"
+CLIENT_ID = os.getenv('DISCORD_CLIENT_ID')
+CLIENT_SECRET = os.getenv('DISCORD_CLIENT_SECRET')
+# Verified tokens are remembered this long, so reconnects don't each call Discord.
+TOKEN_CACHE_TTL = 300
+
+
+class DiscordAuth:
+    """
+    Establishes who an activity user is: their OAuth access token is checked against
+    Discord (GET /users/@me) on the server, never taken from what the client claims.
+    """
+
+    def __init__(self):
+        self._verified: Dict[str, Tuple[float, int]] = {}  # access token -> (valid_until, user_id)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        return self._session
+
+    async def exchange_code(self, code) -> Optional[str]:
+        """OAuth code from the Embedded App SDK's authorize() -> access token."""
+        if not code or not CLIENT_ID or not CLIENT_SECRET:
+            return None
+        async with self.session().post(f"{DISCORD_API}/oauth2/token", data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "grant_type": "authorization_code",
+            "code": code,
+        }) as resp:
+            if resp.status != 200:
+                print(f"Discord token exchange failed: {resp.status}")
+                return None
+            return (await resp.json()).get("access_token")
+
+    async def verify(self, access_token) -> Optional[int]:
+        """The Discord user id behind `access_token`, or None if Discord doesn't accept it."""
+        if not access_token or not isinstance(access_token, str):
+            return None
+        now = time.time()
+        cached = self._verified.get(access_token)
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            async with self.session().get(f"{DISCORD_API}/users/@me",
+                                          headers={"Authorization": f"Bearer {access_token}"}) as resp:
+                if resp.status != 200:
+                    return None
+                user_id = int((await resp.json())["id"])
+        except Exception as e:
+            print(f"Discord token check failed: {e}")
+            return None
+        if len(self._verified) > 4096:
+            self._verified = {t: entry for t, entry in self._verified.items() if entry[0] > now}
+        self._verified[access_token] = (now + TOKEN_CACHE_TTL, user_id)
+        return user_id
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
@@ -0,0 +1,69 @@
+import weakref
+from urllib.parse import parse_qs
+
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+# Clients opt in with ?codec=msgpack on the connection URL; everyone else gets JSON.
+CODEC_PARAM = 'codec'
+MSGPACK = 'msgpack'
+
+
+class NegotiatedPacket(packet.Packet):
+    """Reads either wire format: text frames are JSON packets, binary frames are MessagePack."""
+    ext_hook = MsgPackPacket.ext_hook
+
+    def decode(self, encoded_packet):
+        if isinstance(encoded_packet, bytes):
+            return MsgPackPacket.decode(self, encoded_packet)
+        return super().decode(encoded_packet)
+
+
+def to_msgpack(pkt):
+    return MsgPackPacket(pkt.packet_type, data=pkt.data, namespace=pkt.namespace, id=pkt.id)
+
+
+class CodecServer(socketio.AsyncServer):
+    """
+    AsyncServer that picks JSON or MessagePack per connection.
+    Room broadcasts are encoded once by the manager (JSON); the first MessagePack recipient
+    converts that packet and the result is shared with the rest of the room, so each
+    broadcast costs one encode per format in use, not one per recipient.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, serializer=NegotiatedPacket, **kwargs)
+        self.msgpack_sids = set()
+        self._converted = weakref.WeakKeyDictionary()  # JSON eio packet -> MessagePack eio packet
+
+    def codec_of(self, sid):
+        eio_sid = self.manager.eio_sid_from_sid(sid, '/')
+        return MSGPACK if eio_sid in self.msgpack_sids else 'json'
+
+    async def _handle_eio_connect(self, eio_sid, environ):
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        if query.get(CODEC_PARAM, [''])[0] == MSGPACK:
+            self.msgpack_sids.add(eio_sid)
+        return await super()._handle_eio_connect(eio_sid, environ)
+
+    async def _handle_eio_disconnect(self, eio_sid, reason):
+        try:
+            return await super()._handle_eio_disconnect(eio_sid, reason)
+        finally:
+            self.msgpack_sids.discard(eio_sid)
+
+    async def _send_packet(self, eio_sid, pkt):
+        if eio_sid in self.msgpack_sids:
+            pkt = to_msgpack(pkt)
+        await super()._send_packet(eio_sid, pkt)
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        if eio_sid in self.msgpack_sids and isinstance(eio_pkt.data, str):
+            converted = self._converted.get(eio_pkt)
+            if converted is None:
+                pkt = to_msgpack(NegotiatedPacket(encoded_packet=eio_pkt.data))
+                converted = self._converted[eio_pkt] = eio_packet.Packet(eio_packet.MESSAGE, pkt.encode())
+            eio_pkt = converted
+        await super()._send_eio_packet(eio_sid, eio_pkt)
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import yt_dlp
+
+from common import metrics
+
+# yt-dlp extractions running at once (per API worker).
+RESOLVE_WORKERS = int(os.getenv('CINEMA_RESOLVE_WORKERS', 4))
+# Cache lifetime for sources that don't advertise an expiry.
+DEFAULT_TTL = int(os.getenv('CINEMA_RESOLVE_TTL', 3600))
+MAX_TTL = 12 * 3600
+# Signed URLs are dropped this long before they expire so viewers never get a dead link.
+EXPIRY_MARGIN = 600
+# Failed resolutions are remembered briefly so a broken link isn't re-extracted on every play.
+FAILURE_TTL = 60
+# Page hosts that may be resolved (comma separated; subdomains match). "*" = any public host.
+# Private, loopback and link-local addresses are refused either way, on every connection yt-dlp makes.
+DEFAULT_HOSTS = "youtube.com,youtu.be,vimeo.com,dailymotion.com,twitch.tv,streamable.com"
+ALLOWED_HOSTS = [h.strip().lower().lstrip('.') for h in (os.getenv('CINEMA_RESOLVE_HOSTS') or DEFAULT_HOSTS).split(',')
+                 if h.strip()]
+
+# The browser plays this itself, so it needs one progressive file with audio and video.
+YDL_OPTIONS = {
+    'format': 'best[ext=mp4][vcodec!=none][acodec!=none]/best[vcodec!=none][acodec!=none]/best',
+    'noplaylist': True,
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+}
+
+
+@dataclass
+class Media:
+    """A page URL resolved to something a <video> tag can play directly."""
+    source: str
+    title: Optional[str] = None
+    duration: Optional[float] = None
+    format: Optional[str] = None
+    expires_at: Optional[float] = None
+
+    def info(self):
+        return {"source": self.source, "title": self.title, "duration": self.duration, "format": self.format}
+
+
+def url_expiry(url) -> Optional[float]:
+    """Expiry advertised by signed media URLs (googlevideo `expire=`, CloudFront `Expires=`)."""
+    query = parse_qs(urlparse(url).query)
+    for key in ('expire', 'Expires'):
+        value = query.get(key, [None])[0]
+        if value and value.isdigit():
+            return float(value)
+    return None
+
+
+def host_allowed(host):
+    host = host.lower().rstrip('.')
+    return '*' in ALLOWED_HOSTS or any(host == h or host.endswith('.' + h) for h in ALLOWED_HOSTS)
+
+
+def is_public(address):
+    ip = ipaddress.ip_address(address.split('%', 1)[0])  # strip IPv6 zone ids
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_url(url):
+    """
+    Raises ValueError unless `url` is http(s) on an allowed host that resolves only to public
+    addresses, so extraction can't be pointed at postgres, redis or anything else internal.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError("not an http(s) URL")
+    if not host_allowed(parsed.hostname):
+        raise ValueError(f"host {parsed.hostname} is not allowed")
+    infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, parsed.port or None)
+    if not infos or not all(is_public(info[4][0]) for info in infos):
+        raise ValueError(f"host {parsed.hostname} resolves to a private address")
+
+
+# check_url() only vets the page URL. yt-dlp then resolves hosts itself and follows redirects,
+# so a public page could still bounce it to 10.x / 127.0.0.1 or a rebinding DNS name. Every
+# connection it makes (urllib, requests, websockets) looks its address up through
+# socket.getaddrinfo at connect time; inside extract() that lookup refuses non-public answers,
+# so the addresses checked are the ones actually connected to.
+_guard = threading.local()
+_getaddrinfo = socket.getaddrinfo
+
+
+def _public_getaddrinfo(host, *args, **kwargs):
+    infos = _getaddrinfo(host, *args, **kwargs)
+    if getattr(_guard, 'active', False):
+        for info in infos:
+            if not is_public(info[4][0]):
+                raise OSError(f"{host} resolves to a non-public address ({info[4][0]})")
+    return infos
+
+
+def install_guard():
+    """Routes lookups through _public_getaddrinfo. Only threads inside extract() are checked."""
+    socket.getaddrinfo = _public_getaddrinfo
+
+
+def extract(url) -> Media:
+    _guard.active = True
+    try:
+        with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
+            info = ydl.extract_info(url, download=False)
+    finally:
+        _guard.active = False
+    source = info['url']
+    return Media(
+        source=source,
+        title=info.get('title'),
+        duration=info.get('duration'),
+        format=info.get('ext'),
+        expires_at=url_expiry(source),
+    )
+
+
+class MediaResolver:
+    """
+    Resolves page URLs once on a small thread pool and caches the result in memory and
+    in Redis (shared by every worker) until shortly before the media URL expires.
+    Concurrent plays of the same URL share one extraction.
+    """
+
+    def __init__(self, redis=None, workers=RESOLVE_WORKERS):
+        install_guard()
+        self.redis = redis
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='resolve')
+        self._cache: Dict[str, Tuple[float, Optional[Media]]] = {}  # url -> (valid_until, media or None)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "failures": 0}
+
+    @staticmethod
+    def key(url):
+        return f"cinema_media:{hashlib.sha1(url.encode()).hexdigest()}"
+
+    @staticmethod
+    def ttl_for(media: Optional[Media], now):
+        if media is None:
+            return FAILURE_TTL
+        if media.expires_at:
+            return max(0, min(MAX_TTL, media.expires_at - EXPIRY_MARGIN - now))
+        return DEFAULT_TTL
+
+    async def resolve(self, url) -> Optional[Media]:
+        """Direct media for `url`, or None if it can't be resolved (viewers fall back to the page URL)."""
+        if not url:
+            return None
+        try:
+            await check_url(url)
+        except (ValueError, OSError) as e:
+            print(f"Refusing to resolve {url}: {e}")
+            return None
+        now = time.time()
+        cached = self._cache.get(url)
+        if cached and cached[0] > now:
+            self.stats["hits"] += 1
+            return cached[1]
+        if url in self._inflight:
+            return await self._inflight[url]
+
+        future = self._inflight[url] = asyncio.get_running_loop().create_future()
+        try:
+            media = await self._lookup(url, now)
+            future.set_result(media)
+            return media
+        except Exception as e:
+            future.set_result(None)
+            print(f"Failed to resolve {url}: {e}")
+            return None
+        finally:
+            del self._inflight[url]
+
+    async def _lookup(self, url, now):
+        if self.redis:
+            data = await self.redis.get(self.key(url))
+            if data is not None:
+                self.stats["hits"] += 1
+                media = Media(**json.loads(data)) if data else None
+                self._remember(url, media, time.time())
+                return media
+
+        self.stats["misses"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.YTDL_SECONDS.time(kind="cinema"):
+                media = await loop.run_in_executor(self.pool, extract, url)
+        except Exception as e:
+            self.stats["failures"] += 1
+            print(f"Could not resolve {url}: {e}")
+            media = None
+
+        now = time.time()
+        ttl = self._remember(url, media, now)
+        if self.redis and ttl >= 1:
+            await self.redis.set(self.key(url), json.dumps(asdict(media)) if media else "", ex=int(ttl))
+        return media
+
+    def _remember(self, url, media, now):
+        ttl = self.ttl_for(media, now)
+        self._cache[url] = (now + ttl, media)
+        # Drop expired entries now and then so the map doesn't grow forever.
+        if len(self._cache) > 1024:
+            self._cache = {u: entry for u, entry in self._cache.items() if entry[0] > now}
+        return ttl
+
+    def is_fresh(self, expires_at, now=None):
+        return not expires_at or expires_at - EXPIRY_MARGIN > (now or time.time())
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
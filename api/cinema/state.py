@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Set
+
+# Seconds between heartbeat ticks for playing sessions.
+HEARTBEAT_INTERVAL = float(os.getenv('CINEMA_HEARTBEAT_INTERVAL', 2))
+# Redis mirror lifetime; refreshed on every update.
+STATE_TTL = 12 * 3600
+
+
+def room_for(session_id):
+    return f"session_{session_id}"
+
+
+@dataclass
+class PlaybackState:
+    """Authoritative playback clock for one cinema session (server time, seconds)."""
+    session_id: str
+    url: Optional[str] = None
+    position: float = 0.0       # Position at `updated_at`
+    playing: bool = False
+    updated_at: float = 0.0
+    revision: int = 0
+    action: str = "idle"
+    media: Optional[dict] = None  # Resolved source for `url` (see cinema.resolver.Media)
+
+    def current_position(self, now=None):
+        if not self.playing: return self.position
+        return self.position + ((now or time.time()) - self.updated_at)
+
+    def apply(self, action, url=None, timestamp=None, media=None):
+        """Applies a control event (play/seek/pause, or media refresh) and bumps the revision."""
+        now = time.time()
+        position = self.current_position(now)
+        if action == "play":
+            if url and url != self.url:
+                self.url, position, self.media = url, 0.0, media
+            elif media:
+                self.media = media
+            self.playing = True
+        elif action == "media":
+            self.media = media
+        elif action == "seek":
+            position = max(0.0, float(timestamp or 0))
+        elif action == "pause":
+            self.playing = False
+        self.position = position
+        self.updated_at = now
+        self.revision += 1
+        self.action = action
+
+    def signature(self):
+        """What viewers would see. Control bursts that end where they started compare equal."""
+        anchor = self.updated_at - self.position if self.playing else self.position
+        source = self.media["source"] if self.media else None
+        return (self.url, source, self.playing, round(anchor, 1))
+
+    def snapshot(self):
+        """Full state for late joiners and control broadcasts."""
+        now = time.time()
+        return {
+            "action": self.action,
+            "url": self.url,
+            "media": self.media,
+            "position": self.current_position(now),
+            "playing": self.playing,
+            "server_time": now,
+            "revision": self.revision,
+        }
+
+    def tick(self):
+        """Minimal heartbeat payload."""
+        now = time.time()
+        return {"p": round(self.current_position(now), 3), "t": now, "r": self.revision}
+
+    def to_redis(self):
+        data = asdict(self)
+        data["url"] = self.url or ""
+        data["playing"] = int(self.playing)
+        data["media"] = json.dumps(self.media) if self.media else ""
+        return data
+
+    @classmethod
+    def from_redis(cls, data):
+        return cls(
+            session_id=data["session_id"],
+            url=data.get("url") or None,
+            position=float(data.get("position", 0)),
+            playing=data.get("playing") == "1",
+            updated_at=float(data.get("updated_at", 0)),
+            revision=int(data.get("revision", 0)),
+            action=data.get("action", "idle"),
+            media=json.loads(data["media"]) if data.get("media") else None,
+        )
+
+
+class PlaybackStore:
+    """
+    In-memory playback states, mirrored to Redis so late joiners on any worker get a snapshot.
+    A worker heartbeats only the sessions it last updated ("owned"), and drops ownership
+    as soon as Redis shows a newer revision written by another worker.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+        self.states: Dict[str, PlaybackState] = {}
+        self.owned: Set[str] = set()
+
+    @staticmethod
+    def key(session_id):
+        return f"cinema_state:{session_id}"
+
+    async def get(self, session_id):
+        state = self.states.get(session_id)
+        if not self.redis:
+            return state
+        if state is not None:
+            # Another worker may have moved this session on since we cached it.
+            remote = await self.redis.hget(self.key(session_id), "revision")
+            if remote is None or int(remote) <= state.revision:
+                return state
+            self.owned.discard(session_id)
+        data = await self.redis.hgetall(self.key(session_id))
+        if data:
+            state = self.states[session_id] = PlaybackState.from_redis(data)
+        return state
+
+    async def apply(self, session_id, action, **kwargs):
+        state = await self.get(session_id) or PlaybackState(session_id)
+        state.apply(action, **kwargs)
+        self.states[session_id] = state
+        self.owned.add(session_id)
+        if self.redis:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(self.key(session_id), mapping=state.to_redis())
+                pipe.expire(self.key(session_id), STATE_TTL)
+                await pipe.execute()
+        return state
+
+    async def heartbeat_targets(self):
+        """Owned, playing sessions that this worker should tick."""
+        targets = [self.states[s] for s in self.owned if s in self.states and self.states[s].playing]
+        if not self.redis or not targets:
+            return targets
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for state in targets:
+                pipe.hget(self.key(state.session_id), "revision")
+            revisions = await pipe.execute()
+        current = []
+        for state, remote in zip(targets, revisions):
+            if remote is not None and int(remote) != state.revision:
+                self.owned.discard(state.session_id)
+                self.states.pop(state.session_id, None)
+            else:
+                current.append(state)
+        return current
+
+    async def drop(self, session_id):
+        self.states.pop(session_id, None)
+        self.owned.discard(session_id)
+        if self.redis:
+            await self.redis.delete(self.key(session_id))
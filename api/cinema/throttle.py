@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+
+# Per-room broadcast cap: at most one sync_video per interval (default 5/s).
+MIN_BROADCAST_INTERVAL = float(os.getenv('CINEMA_MIN_BROADCAST_INTERVAL', 0.2))
+
+
+class RoomThrottle:
+    """
+    Coalesces bursty control events per room.
+    The playback state is updated on every event; only broadcasts of it are rate limited.
+    The first event in a quiet room goes out immediately. Events inside the interval collapse
+    into one trailing broadcast of the latest state, so the last state is always delivered.
+    A broadcast whose state looks the same to viewers as the previous one (e.g. pause/play
+    toggles that cancel out) is dropped.
+    """
+
+    def __init__(self, get_state, emit, min_interval=MIN_BROADCAST_INTERVAL):
+        self.get_state = get_state  # async (session_id) -> PlaybackState
+        self.emit = emit            # async (session_id, state) -> None
+        self.min_interval = min_interval
+        self._pending = {}          # session_id -> trailing flush task
+        self._last_sent = {}
+        self._last_signature = {}
+        self.stats = {"events": 0, "broadcasts": 0, "coalesced": 0, "suppressed": 0}
+
+    def is_pending(self, session_id):
+        return session_id in self._pending
+
+    async def submit(self, session_id):
+        self.stats["events"] += 1
+        if session_id in self._pending:
+            self.stats["coalesced"] += 1
+            return
+        wait = self._last_sent.get(session_id, float('-inf')) + self.min_interval - time.monotonic()
+        if wait <= 0:
+            await self._flush(session_id)
+        else:
+            self._pending[session_id] = asyncio.create_task(self._flush_later(session_id, wait))
+
+    async def _flush_later(self, session_id, delay):
+        await asyncio.sleep(delay)
+        self._pending.pop(session_id, None)
+        try:
+            await self._flush(session_id)
+        except Exception as e:
+            print(f"Throttled broadcast failed for {session_id}: {e}")
+
+    async def _flush(self, session_id):
+        state = await self.get_state(session_id)
+        if state is None: return
+        signature = state.signature()
+        if signature == self._last_signature.get(session_id):
+            self.stats["suppressed"] += 1
+            return
+        self._last_signature[session_id] = signature
+        self._last_sent[session_id] = time.monotonic()
+        self.stats["broadcasts"] += 1
+        await self.emit(session_id, state)
+
+    def forget(self, session_id):
+        task = self._pending.pop(session_id, None)
+        if task: task.cancel()
+        self._last_sent.pop(session_id, None)
+        self._last_signature.pop(session_id, None)
@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+from typing import Dict, List, Optional, Set, Tuple
+
+from common.database.db import Database
+
+NOTIFY_TICKETS = 'cinema_tickets'    # payload: "<session_id>:<user_id>"
+NOTIFY_SESSIONS = 'cinema_sessions'  # payload: "<session_id>:<host_id>"
+NOTIFY_ENDED = 'cinema_sessions_ended'  # payload: "<session_id>"
+# Seconds between liveness probes of the LISTEN connection.
+LISTEN_CHECK_INTERVAL = 30
+RECONNECT_BACKOFF = (1, 2, 5, 10, 30)
+
+
+def parse_user_id(value) -> Optional[int]:
+    # Discord ids arrive as strings from the browser (they overflow JS numbers).
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TicketIndex:
+    """
+    In-memory map of active session -> users allowed in its room (ticket holders + host).
+    Warmed from cinema_tickets on startup and kept current by Postgres NOTIFY (and the
+    bot's user_joined fast path), so authorizing a join is a set lookup with no query.
+    LISTEN runs on its own connection to the primary (Database.connect_direct), outside the
+    pool and PgBouncer. If it drops, it is reopened with backoff and the index is reloaded,
+    since anything sent while it was down is gone.
+    """
+
+    def __init__(self, on_end=None):
+        self.sessions: Dict[str, Set[int]] = {}
+        self.on_end = on_end  # async (session_id) -> None, run on every worker when a session ends
+        self._conn = None
+        self._pool = None
+        self._lost = asyncio.Event()
+        self._task = None
+        # Grants (session, user) and ends (session, None) seen while a reload query runs
+        self._reloading: Optional[List[Tuple[str, Optional[int]]]] = None
+
+    async def start(self, pool):
+        self._pool = pool
+        try:
+            await self._listen()
+        except Exception:
+            self._lost.set()  # the watcher keeps trying
+            raise
+        finally:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        conn, self._conn = self._conn, None
+        if conn:
+            await conn.close()
+
+    async def _listen(self):
+        # Listen before loading so grants made during the query aren't lost.
+        conn = self._conn = await Database.connect_direct()
+        try:
+            await conn.add_listener(NOTIFY_TICKETS, self._on_notify)
+            await conn.add_listener(NOTIFY_SESSIONS, self._on_notify)
+            await conn.add_listener(NOTIFY_ENDED, self._on_ended)
+            self._lost.clear()
+            conn.add_termination_listener(self._on_terminated)
+            await self.reload()
+        except BaseException:
+            self._conn = None
+            conn.terminate()
+            raise
+
+    def _on_terminated(self, conn):
+        if conn is self._conn:  # not one we replaced or closed ourselves
+            self._lost.set()
+
+    async def _watch(self):
+        """Reopens the LISTEN connection when it closes or stops answering."""
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), LISTEN_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                # A silently dead socket never reports termination; probe it
+                try:
+                    await self._conn.fetchval("SELECT 1", timeout=10)
+                    continue
+                except Exception:
+                    pass
+            print("⚠️ Ticket NOTIFY connection lost. Reconnecting...")
+            conn, self._conn = self._conn, None
+            if conn:
+                conn.terminate()
+            for attempt in itertools.count():
+                try:
+                    await self._listen()
+                    print(f"Ticket index reloaded ({len(self.sessions)} active sessions).")
+                    break
+                except Exception as e:
+                    delay = RECONNECT_BACKOFF[min(attempt, len(RECONNECT_BACKOFF) - 1)]
+                    print(f"⚠️ Ticket NOTIFY reconnect failed ({e}). Retrying in {delay}s...")
+                    await asyncio.sleep(delay)
+
+    async def reload(self):
+        """
+        Replaces the whole index from the database. Sessions that ended while we weren't
+        listening are dropped and get their on_end, like a missed cinema_sessions_ended.
+        """
+        self._reloading = []
+        try:
+            sessions = await self._load(self._pool)
+        finally:
+            recent, self._reloading = self._reloading, None
+        for session_id, user_id in recent:
+            if user_id is None:
+                sessions.pop(session_id, None)
+            else:
+                sessions.setdefault(session_id, set()).add(user_id)
+        ended = [s for s in self.sessions if s not in sessions]
+        self.sessions = sessions
+        if self.on_end:
+            for session_id in ended:
+                asyncio.create_task(self.on_end(session_id))
+
+    @staticmethod
+    async def _load(pool) -> Dict[str, Set[int]]:
+        """Hosts and ticket holders for every active session."""
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT s.session_id::text AS session_id, s.host_id, t.user_id
+                FROM cinema_sessions s LEFT JOIN cinema_tickets t ON t.session_id = s.session_id
+                WHERE s.is_active = TRUE
+                """
+            )
+        sessions: Dict[str, Set[int]] = {}
+        for r in rows:
+            users = sessions.setdefault(r['session_id'], set())
+            users.add(r['host_id'])
+            if r['user_id'] is not None: users.add(r['user_id'])
+        return sessions
+
+    def _on_notify(self, conn, pid, channel, payload):
+        session_id, _, user_id = payload.partition(':')
+        self.grant(session_id, parse_user_id(user_id))
+
+    def _on_ended(self, conn, pid, channel, session_id):
+        self.drop(session_id)
+        if self.on_end:
+            asyncio.create_task(self.on_end(session_id))
+
+    def grant(self, session_id, user_id):
+        if session_id and user_id is not None:
+            self.sessions.setdefault(session_id, set()).add(user_id)
+            if self._reloading is not None:
+                self._reloading.append((session_id, user_id))
+
+    def is_authorized(self, session_id, user_id) -> bool:
+        return user_id in self.sessions.get(session_id, ())
+
+    def drop(self, session_id):
+        self.sessions.pop(session_id, None)
+        if self._reloading is not None:
+            self._reloading.append((session_id, None))
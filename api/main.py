@@ -1,17 +1,87 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import socketio
+import asyncio
 import os
+import time
 from common.database.db import Database
+from common.redis_client import RedisClient
+from common import metrics
+from api.cinema.state import PlaybackStore, HEARTBEAT_INTERVAL, room_for
+from api.cinema.throttle import RoomThrottle
+from api.cinema.tickets import TicketIndex, parse_user_id
+from api.cinema.codec import CodecServer
+from api.cinema.resolver import MediaResolver
+from api.cinema.auth import DiscordAuth
+from dataclasses import asdict
 
 # 1. Setup Socket.IO
 # asyncio_mode='asgi' is important for integration with FastAPI/Uvicorn
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+# With REDIS_URL set, rooms and broadcasts go through Redis pub/sub so any uvicorn
+# worker can emit to viewers connected to the others. Without it we fall back to
+# the in-memory manager (single worker only).
+# Clients connecting with ?codec=msgpack get MessagePack frames, everyone else JSON.
+SOCKET_EVENT_SECONDS = metrics.Histogram("socket_event_seconds", "Socket.IO handler latency", ("event",))
+HTTP_SECONDS = metrics.Histogram("http_request_seconds", "HTTP request latency", ("method", "route", "status"))
+
+class CinemaServer(CodecServer):
+    async def _trigger_event(self, event, namespace, *args):
+        # Only registered handlers get their own label; clients can send any event name.
+        label = event if event in self.handlers.get(namespace, {}) else "other"
+        with SOCKET_EVENT_SECONDS.time(event=label):
+            return await super()._trigger_event(event, namespace, *args)
+
+REDIS_URL = os.getenv('REDIS_URL')
+client_manager = socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
+sio = CinemaServer(async_mode='asgi', cors_allowed_origins='*', client_manager=client_manager)
 socket_app = socketio.ASGIApp(sio)
 
+# One pooled client per worker, shared by playback, the resolver and the event consumers.
+redis_client = RedisClient.get() if REDIS_URL else None
+
+# Authoritative playback clocks, mirrored to Redis for late joiners on other workers.
+playback = PlaybackStore(redis_client)
+
+# Page URL -> direct media, resolved once and shared by every viewer (and worker).
+resolver = MediaResolver(redis_client)
+
+# Who may join which room. Kept in memory (warmed + NOTIFY-fed) so joins never hit the DB.
+tickets = TicketIndex()
+# Shared with the cinema bot; sockets presenting it may grant tickets.
+CINEMA_API_SECRET = os.getenv('CINEMA_API_SECRET')
+# Activity users are identified by their Discord access token, checked server-side.
+discord_auth = DiscordAuth()
+
 # 2. Setup FastAPI
 app = FastAPI(title="Ethereal Trifid API")
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    if request.url.path.startswith("/socket.io"):
+        return await call_next(request)  # long-polls; timed per event instead
+    start, status = time.perf_counter(), 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Per worker: with API_WORKERS > 1 each scrape sees whichever worker answered.
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/api/token")
+async def exchange_token(payload: dict):
+    # Embedded App SDK flow: authorize() gives the activity a code, we trade it for a token
+    # (needs the client secret), the activity authenticates with it and connects the socket.
+    access_token = await discord_auth.exchange_code(payload.get("code"))
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Could not exchange code")
+    return {"access_token": access_token}
+
 @app.get("/")
 async def root():
     from common.version import get_version
@@ -37,20 +107,45 @@ app.add_middleware(
 async def startup_db():
     print("API Starting up...")
     try:
-        await Database.get_pool()
+        pool = await Database.get_pool()
         print("Database connected.")
+        await tickets.start(pool)
+        print(f"Ticket index loaded ({len(tickets.sessions)} active sessions).")
     except Exception as e:
         print(f"Failed to connect to DB: {e}")
+    try:
+        await leaderboard.start()
+    except Exception as e:
+        print(f"Leaderboard consumer not started: {e}")
+    app.state.heartbeat = asyncio.create_task(heartbeat())
+    app.state.lag_sampler = asyncio.create_task(metrics.sample_loop_lag())
 
 @app.on_event("shutdown")
 async def shutdown_db():
     print("API Shutting down...")
+    app.state.heartbeat.cancel()
+    app.state.lag_sampler.cancel()
+    await tickets.stop()
+    await leaderboard.stop()
+    resolver.close()
+    await discord_auth.close()
     await Database.close()
+    await RedisClient.close()
 
 # 4. Socket.IO Events
 @sio.event
-async def connect(sid, environ):
-    print(f"Socket Connected: {sid}")
+async def connect(sid, environ, auth=None):
+    auth = auth or {}
+    bot = bool(CINEMA_API_SECRET) and auth.get('token') == CINEMA_API_SECRET
+    # Viewers: identity comes from Discord, never from anything the client says about itself.
+    user_id = None if bot else await discord_auth.verify(auth.get('access_token'))
+    if not bot and user_id is None:
+        raise socketio.exceptions.ConnectionRefusedError('unauthorized')
+    await sio.save_session(sid, {'bot': bot, 'user_id': user_id})
+    print(f"Socket Connected: {sid}" + (" (bot)" if bot else f" (user {user_id})"))
+
+async def is_bot(sid):
+    return (await sio.get_session(sid)).get('bot', False)
 
 @sio.event
 async def disconnect(sid):
@@ -58,42 +153,130 @@ async def disconnect(sid):
 
 @sio.event
 async def join_session(sid, data):
-    # data: {'session_id': 'uuid'}
+    # data: {'session_id': 'uuid'}; the user is the one verified in connect
     session_id = data.get('session_id')
     if session_id:
-        room = f"session_{session_id}"
-        sio.enter_room(sid, room)
+        user_id = (await sio.get_session(sid)).get('user_id')
+        if not tickets.is_authorized(session_id, user_id):
+            print(f"Socket {sid} denied room for {session_id} (user {user_id})")
+            await sio.emit('join_denied', {'session_id': session_id}, to=sid)
+            return {'ok': False}
+        room = room_for(session_id)
+        await sio.enter_room(sid, room)
         print(f"Socket {sid} joined room {room}")
+        # Late joiners start from the current clock instead of waiting for the next event.
+        state = await playback.get(session_id)
+        if state and state.media and not resolver.is_fresh(state.media.get('expires_at')):
+            # The signed source ran out during a long session; everyone gets the fresh one.
+            media = await resolver.resolve(state.url)
+            if media:
+                state = await playback.apply(session_id, 'media', media=asdict(media))
+                await throttle.submit(session_id)
+        if state:
+            await sio.emit('sync_state', state.snapshot(), to=sid)
+        return {'ok': True}
+
+@sio.event
+async def time_ping(sid, client_time):
+    # Ack-based clock probe: the client derives RTT and its offset to server time.
+    return {'client_time': client_time, 'server_time': time.time()}
 
 @sio.event
 async def create_session(sid, data):
     # From Bot: {'session_id': '...', 'host_id': ...}
     session_id = data.get('session_id')
     print(f"Session Created Event received for {session_id}")
-    # Logic to maybe notify global listeners?
+    if await is_bot(sid):
+        tickets.grant(session_id, parse_user_id(data.get('host_id')))
+
+@sio.event
+async def user_joined(sid, data):
+    # From Bot after a ticket purchase: {'session_id': '...', 'user_id': ...}
+    # Fast path for this worker; the others pick the ticket up from NOTIFY.
+    if await is_bot(sid):
+        tickets.grant(data.get('session_id'), parse_user_id(data.get('user_id')))
+
+async def emit_state(session_id, state):
+    await sio.emit('sync_video', state.snapshot(), room=room_for(session_id))
+
+# Scrubbing hosts can fire dozens of seeks a second; only the latest state per room goes out.
+throttle = RoomThrottle(playback.get, emit_state)
+
+async def broadcast_state(session_id, action, **kwargs):
+    await playback.apply(session_id, action, **kwargs)
+    await throttle.submit(session_id)
+
+async def forget_session(session_id):
+    # Per-worker cleanup for an ended session; every worker gets the NOTIFY.
+    try:
+        throttle.forget(session_id)
+        await playback.drop(session_id)
+    except Exception as e:
+        print(f"Failed to clean up session {session_id}: {e}")
+
+tickets.on_end = forget_session
+
+@sio.event
+async def end_session(sid, data):
+    # From Bot when a session ends (host left, channel empty, TTL). One emit + close
+    # reaches every worker through the client manager.
+    if not await is_bot(sid): return
+    session_id = data.get('session_id')
+    print(f"Ending session {session_id}: {data.get('reason')}")
+    await sio.emit('session_ended', {'session_id': session_id, 'reason': data.get('reason')}, room=room_for(session_id))
+    await sio.close_room(room_for(session_id))
+    tickets.drop(session_id)
+    await forget_session(session_id)
+
+# Control events move the authoritative clock (and play_video runs the resolver), so only
+# the bot may send them, directly or inside a batch. Hosts control playback through it.
 
 @sio.event
 async def play_video(sid, data):
-    # From Bot/Host: {'session_id': '...', 'url': '...'}
+    # From Bot: {'session_id': '...', 'url': '...'}
+    if not await is_bot(sid): return
     session_id = data.get('session_id')
     url = data.get('url')
-    room = f"session_{session_id}"
-    print(f"Broadcasting play_video to {room}: {url}")
-    await sio.emit('sync_video', {'action': 'play', 'url': url}, room=room)
+    # Resolved once here (cached across plays and workers) so viewers don't each resolve the page.
+    media = await resolver.resolve(url)
+    print(f"Broadcasting play_video to {room_for(session_id)}: {url} ({media.format if media else 'unresolved'})")
+    await broadcast_state(session_id, 'play', url=url, media=asdict(media) if media else None)
 
 @sio.event
 async def seek_video(sid, data):
-    session_id = data.get('session_id')
-    timestamp = data.get('timestamp')
-    room = f"session_{session_id}"
-    await sio.emit('sync_video', {'action': 'seek', 'timestamp': timestamp}, room=room)
+    if not await is_bot(sid): return
+    await broadcast_state(data.get('session_id'), 'seek', timestamp=data.get('timestamp'))
 
 @sio.event
 async def pause_video(sid, data):
-    session_id = data.get('session_id')
-    room = f"session_{session_id}"
-    await sio.emit('sync_video', {'action': 'pause'}, room=room)
+    if not await is_bot(sid): return
+    await broadcast_state(data.get('session_id'), 'pause')
+
+# Events the bot may send inside a 'batch' frame (its client groups bursts and outage replays).
+BATCHABLE = {f.__name__: f for f in (create_session, user_joined, end_session, play_video, seek_video, pause_video)}
+
+@sio.event
+async def batch(sid, events):
+    # [[event, data], ...] applied in order
+    if not await is_bot(sid): return
+    for event, data in events:
+        handler = BATCHABLE.get(event)
+        if handler:
+            await handler(sid, data)
+
+async def heartbeat():
+    """Low-cost clock ticks for playing sessions so viewers can correct drift without host re-broadcasts."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            for state in await playback.heartbeat_targets():
+                if throttle.is_pending(state.session_id): continue  # a full snapshot is about to go out
+                await sio.emit('tick', state.tick(), room=room_for(state.session_id))
+        except Exception as e:
+            print(f"Heartbeat failed: {e}")
 
 # 5. Include Routers
-from api.routers import users
+from api.routers import users, leaderboard as leaderboard_routes
+from api.routers.leaderboard import leaderboard
 app.include_router(users.router)
+app.include_router(leaderboard_routes.router)
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+from typing import List
+import os
+from common.database.db import Database
+from common.redis_client import RedisClient
+from common.database import queries
+from common import events
+
+router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+
+# Sorted set of user_id -> balance, fed by economy events instead of polling Postgres.
+KEY = "leaderboard:balance"
+# user_id -> users.balance_version of the balance currently in KEY
+VERSIONS = "leaderboard:version"
+WARM_LOCK = "leaderboard:warming"
+BANK_ID = 0
+
+# Compare-and-set: a balance only lands if its version is newer than the one already applied,
+# so redelivered or out-of-order events (several workers, several producers) can't roll it back.
+# KEYS: KEY, VERSIONS; ARGV: user_id, balance, version
+SET_BALANCE = """
+local current = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '-1')
+if tonumber(ARGV[3]) <= current then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[3])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+else
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+class Entry(BaseModel):
+    rank: int
+    user_id: int
+    balance: int
+
+class Leaderboard:
+    """
+    Keeps KEY current from `transfer` and `ticket_purchased` events (one consumer group
+    shared by all API workers). Each balance carries its row version and is applied with
+    SET_BALANCE, so the newest balance wins rather than the last one processed.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+        self.set_balance = redis.register_script(SET_BALANCE) if redis else None
+        self.consumer = events.Consumer("leaderboard", [events.ECONOMY, events.CINEMA_TICKETS], self.apply)
+
+    async def start(self):
+        if not self.redis:
+            return
+        # Group first, then the snapshot: versions decide between it and events applied meanwhile.
+        await self.consumer.ensure_groups(self.redis)
+        await self.warm()
+        self.consumer.start()
+
+    async def stop(self):
+        await self.consumer.stop()
+
+    async def warm(self):
+        # Only the first worker to start after a Redis flush rebuilds the set.
+        if await self.redis.exists(KEY) or not await self.redis.set(WARM_LOCK, 1, nx=True, ex=60):
+            return
+        pool = await Database.reader()
+        rows = await pool.fetch(
+            "SELECT user_id, balance, balance_version FROM users WHERE user_id <> 0 AND balance > 0")
+        await self.store([(r['user_id'], r['balance'], r['balance_version']) for r in rows])
+        print(f"Leaderboard warmed ({len(rows)} users).")
+
+    async def apply(self, event):
+        d = event.data
+        if event.type == "transfer":
+            await self.store([(d['from_id'], d.get('from_balance'), d.get('from_version')),
+                              (d['to_id'], d.get('to_balance'), d.get('to_version'))])
+        elif event.type == "ticket_purchased":
+            await self.store([(d['user_id'], d.get('balance'), d.get('version'))])
+
+    async def store(self, balances):
+        """Applies (user_id, balance, version) triples; unversioned ones can't be ordered and are skipped."""
+        balances = [b for b in balances if b[0] != BANK_ID and b[1] is not None and b[2] is not None]
+        if not balances:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, balance, version in balances:
+                await self.set_balance(keys=[KEY, VERSIONS], args=[str(user_id), balance, version], client=pipe)
+            await pipe.execute()
+
+    async def top(self, limit):
+        if self.redis:
+            rows = await self.redis.zrevrange(KEY, 0, limit - 1, withscores=True)
+            return [(int(user_id), int(balance)) for user_id, balance in rows]
+        # No Redis: straight from the balance index
+        pool = await Database.reader()
+        rows = await queries.TOP_BALANCES.fetch(pool, limit)
+        return [(r['user_id'], r['balance']) for r in rows]
+
+leaderboard = Leaderboard(RedisClient.get() if os.getenv('REDIS_URL') else None)
+
+@router.get("", response_model=List[Entry])
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100)):
+    rows = await leaderboard.top(limit)
+    return [Entry(rank=i, user_id=user_id, balance=balance) for i, (user_id, balance) in enumerate(rows, 1)]
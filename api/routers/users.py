@@ -1,10 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Query, Response
 from common.database.db import Database
+from common.database import queries
 from pydantic import BaseModel
 from typing import List, Optional
+import hashlib
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Profiles change often (balance, xp); let clients reuse them briefly, then revalidate by ETag.
+CACHE_CONTROL = "private, max-age=5, must-revalidate"
+MAX_BATCH = 100
+
 class UserProfile(BaseModel):
     user_id: int
     balance: int
@@ -13,21 +19,65 @@ class UserProfile(BaseModel):
     badges: List[str]
     inventory: List[str]
 
+def to_profile(row):
+    return UserProfile(
+        user_id=row['user_id'],
+        balance=row['balance'],
+        xp=row['xp'],
+        level=row['level'],
+        badges=row['badges'] or [],
+        inventory=row['inventory'] or []
+    )
+
+def etag_for(rows):
+    # `version` is xmin, which changes on every UPDATE of the row
+    versions = ",".join(f"{r['user_id']}:{r['version']}" for r in rows)
+    return '"' + hashlib.sha1(versions.encode()).hexdigest()[:20] + '"'
+
+def not_modified(etag, if_none_match):
+    # Weak comparison: proxies that re-compress responses turn the tag into W/"...".
+    return if_none_match is not None and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+def parse_ids(ids):
+    try:
+        parsed = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma-separated user IDs")
+    if not parsed:
+        raise HTTPException(status_code=422, detail="ids is empty")
+    if len(parsed) > MAX_BATCH:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH} ids per request")
+    return parsed
+
+@router.get("", response_model=List[UserProfile])
+async def get_user_profiles(response: Response, ids: str = Query(..., description="Comma-separated user IDs"),
+                            if_none_match: Optional[str] = Header(None)):
+    # One query for a whole room of viewers; unknown ids are left out.
+    user_ids = parse_ids(ids)
+    pool = await Database.reader()
+    rows = await queries.USER_PROFILES.fetch(pool, user_ids)
+    order = {user_id: i for i, user_id in enumerate(user_ids)}
+    rows.sort(key=lambda r: order[r['user_id']])
+
+    etag = etag_for(rows)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if not_modified(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return [to_profile(r) for r in rows]
+
 @router.get("/{user_id}", response_model=UserProfile)
-async def get_user_profile(user_id: int):
-    pool = await Database.get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
-        if not row:
-            # Create user if not exists? Or 404?
-            # 404 is better for API, usually bot creates them.
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        return UserProfile(
-            user_id=row['user_id'],
-            balance=row['balance'],
-            xp=row['xp'],
-            level=row['level'],
-            badges=row['badges'] or [],
-            inventory=row['inventory'] or []
-        )
+async def get_user_profile(user_id: int, response: Response, if_none_match: Optional[str] = Header(None)):
+    pool = await Database.reader()
+    row = await queries.USER_PROFILE.fetchrow(pool, user_id)
+    if not row:
+        # Create user if not exists? Or 404?
+        # 404 is better for API, usually bot creates them.
+        raise HTTPException(status_code=404, detail="User not found")
+
+    etag = etag_for([row])
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if not_modified(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return to_profile(row)
@@ -0,0 +1,105 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Hard cap on a session's lifetime (seconds).
+SESSION_TTL = int(os.getenv('CINEMA_SESSION_TTL', 6 * 3600))
+# How long the voice channel may sit empty before the session ends (covers host reconnects).
+EMPTY_GRACE = int(os.getenv('CINEMA_EMPTY_GRACE', 60))
+
+
+@dataclass
+class ActiveSession:
+    session_id: str
+    host_id: int
+    guild_id: int
+    channel_id: int
+    started_at: float = field(default_factory=time.time)
+    empty_since: Optional[float] = None
+
+
+class SessionManager:
+    """
+    Owns the cinema session lifecycle: the bot is the only writer of cinema_sessions, so the
+    active set is held in memory, keyed by (host_id, guild_id) for `!cinema play`.
+    Sessions end when their voice channel has been empty for EMPTY_GRACE or after SESSION_TTL.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.by_host: Dict[Tuple[int, int], ActiveSession] = {}
+
+    async def warm(self, owns_guild=None):
+        """
+        Loads active sessions; older duplicates per host/guild (pre-cache data) are ended.
+        owns_guild(guild_id) limits this to the guilds on our shards (cluster mode).
+        """
+        rows = await self.pool.fetch(
+            """
+            SELECT session_id::text AS session_id, host_id, guild_id, channel_id,
+                   EXTRACT(EPOCH FROM created_at)::float8 AS started_at
+            FROM cinema_sessions WHERE is_active = TRUE ORDER BY created_at
+            """
+        )
+        stale = []
+        for r in rows:
+            if owns_guild and not owns_guild(r['guild_id']):
+                continue
+            previous = self.by_host.get((r['host_id'], r['guild_id']))
+            if previous: stale.append(previous.session_id)
+            self.by_host[(r['host_id'], r['guild_id'])] = ActiveSession(**dict(r))
+        if stale:
+            await self._mark_ended(stale)
+        return stale
+
+    def get(self, host_id, guild_id) -> Optional[ActiveSession]:
+        return self.by_host.get((host_id, guild_id))
+
+    async def create(self, host_id, guild_id, channel_id):
+        """Starts a session. Returns (session, replaced session_id or None): one active session per host per guild."""
+        # Left in place until the new row commits, so a failed insert keeps the old session tracked
+        previous = self.by_host.get((host_id, guild_id))
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if previous:
+                    await conn.execute(
+                        "UPDATE cinema_sessions SET is_active = FALSE, ended_at = NOW() WHERE session_id = $1::uuid",
+                        previous.session_id
+                    )
+                session_id = await conn.fetchval(
+                    "INSERT INTO cinema_sessions (host_id, guild_id, channel_id) VALUES ($1, $2, $3) RETURNING session_id",
+                    host_id, guild_id, channel_id
+                )
+        session = ActiveSession(str(session_id), host_id, guild_id, channel_id)
+        self.by_host[(host_id, guild_id)] = session
+        return session, previous.session_id if previous else None
+
+    async def end(self, sessions: List[ActiveSession]):
+        for s in sessions:
+            self.by_host.pop((s.host_id, s.guild_id), None)
+        await self._mark_ended([s.session_id for s in sessions])
+
+    async def _mark_ended(self, session_ids):
+        await self.pool.execute(
+            "UPDATE cinema_sessions SET is_active = FALSE, ended_at = NOW() WHERE session_id = ANY($1::uuid[]) AND is_active",
+            session_ids
+        )
+
+    def expired(self, get_channel, now=None) -> List[Tuple[ActiveSession, str]]:
+        """Sessions due to end, with the reason. get_channel(channel_id) -> voice channel or None."""
+        now = now or time.time()
+        due = []
+        for s in self.by_host.values():
+            if now - s.started_at >= SESSION_TTL:
+                due.append((s, "ttl"))
+                continue
+            channel = get_channel(s.channel_id)
+            if channel is not None and any(not m.bot for m in channel.members):
+                s.empty_since = None
+                continue
+            if s.empty_since is None:
+                s.empty_since = now
+            if now - s.empty_since >= EMPTY_GRACE:
+                due.append((s, "empty"))
+        return due
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import random
+from collections import OrderedDict
+from itertools import count
+
+import socketio
+
+# Outbound events kept while the API is unreachable; the oldest are dropped past this.
+MAX_BACKLOG = int(os.getenv('CINEMA_SOCKET_BACKLOG', 1000))
+# Events sent in one 'batch' frame at most.
+BATCH_MAX = 50
+RECONNECT_MIN, RECONNECT_MAX = 1, 60
+# Talk MessagePack to the API instead of JSON (smaller frames, cheaper encode).
+USE_MSGPACK = os.getenv('CINEMA_SOCKET_MSGPACK', '0') == '1'
+
+# Control events where only the latest one per session matters.
+COALESCED_EVENTS = {'play_video', 'seek_video', 'pause_video'}
+
+
+class SyncClient:
+    """
+    Socket.IO link from the bot to the API.
+    emit() never blocks or fails: events go into an ordered, bounded backlog drained by one
+    sender task. Bursts (and everything queued during an outage) go out as 'batch' frames in
+    their original order. While queued, a newer control event for the same session replaces
+    the older one and moves to the back, so replay ends on the latest state.
+    The connection is re-established with exponential backoff whenever it drops.
+    """
+
+    def __init__(self, url, auth=None, msgpack=USE_MSGPACK):
+        self.url = f"{url}?codec=msgpack" if msgpack else url
+        self.auth = auth
+        self.sio = socketio.AsyncClient(reconnection=False, serializer='msgpack' if msgpack else 'default')
+        self.sio.on('connect', self._on_connect)
+        self.sio.on('disconnect', self._on_disconnect)
+        self.connected = False
+        self._backlog = OrderedDict()  # key -> (event, data)
+        self._seq = count()
+        self._ready = asyncio.Event()    # backlog has items
+        self._online = asyncio.Event()   # connected
+        self._offline = asyncio.Event()  # connection dropped
+        self._tasks = []
+        self.stats = {"sent": 0, "batches": 0, "coalesced": 0, "dropped": 0, "reconnects": 0}
+
+    @property
+    def backlog(self):
+        return len(self._backlog)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._connect_loop()), asyncio.create_task(self._send_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+    def emit(self, event, data):
+        session_id = data.get('session_id')
+        if event in COALESCED_EVENTS and session_id:
+            key = (event, session_id)
+            if self._backlog.pop(key, None) is not None:
+                self.stats["coalesced"] += 1
+        else:
+            key = next(self._seq)
+        self._backlog[key] = (event, data)
+        while len(self._backlog) > MAX_BACKLOG:
+            self._backlog.popitem(last=False)
+            self.stats["dropped"] += 1
+        self._ready.set()
+
+    async def _on_connect(self):
+        self.connected = True
+        self._offline.clear()
+        self._online.set()
+        print(f"Connected to Socket.IO Server ({self.backlog} queued events)")
+
+    async def _on_disconnect(self, *args):
+        self._mark_offline()
+        print("Socket.IO connection lost")
+
+    def _mark_offline(self):
+        self.connected = False
+        self._online.clear()
+        self._offline.set()
+
+    async def _connect_loop(self):
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                print(f"Attempting Socket.IO connection to {self.url}...")
+                await self.sio.connect(self.url, socketio_path='/socket.io', transports=['websocket', 'polling'], auth=self.auth)
+                delay = RECONNECT_MIN
+                await self._offline.wait()
+                self.stats["reconnects"] += 1
+                continue
+            except Exception as e:
+                print(f"Socket.IO Connection Failed: {e}. Retrying in {delay}s...")
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    async def _send_loop(self):
+        while True:
+            await self._ready.wait()
+            await self._online.wait()
+            # Yield once so a burst emitted in the same tick lands in one batch
+            await asyncio.sleep(0)
+
+            batch = []
+            while self._backlog and len(batch) < BATCH_MAX:
+                batch.append(self._backlog.popitem(last=False))
+            if not self._backlog:
+                self._ready.clear()
+            if not batch: continue
+
+            try:
+                if len(batch) == 1:
+                    await self.sio.emit(*batch[0][1])
+                else:
+                    await self.sio.emit('batch', [list(item) for _, item in batch])
+                self.stats["sent"] += len(batch)
+                self.stats["batches"] += 1
+            except Exception as e:
+                # Not delivered: put the events back in front (unless superseded meanwhile) and wait for the link
+                print(f"Socket.IO emit failed ({e}); keeping {len(batch)} events for replay")
+                for key, item in reversed(batch):
+                    if key not in self._backlog:
+                        self._backlog[key] = item
+                        self._backlog.move_to_end(key, last=False)
+                self._ready.set()
+                if self.sio.connected:
+                    await asyncio.sleep(1)
+                else:
+                    self._mark_offline()
@@ -1,133 +1,142 @@
 import discord
-from discord.ext import commands
-import socketio
+from discord.ext import commands, tasks
 import os
 import json
-import asyncio
+import asyncpg
 from common.database.db import Database
+from common.database import queries
+from common.redis_client import RedisClient
+from common import events
+from common.cluster import cluster
+from cinema.sessions import SessionManager
+from cinema.sync_client import SyncClient
 
 class CinemaCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         from common.version import get_version
         print(f"🎬 Cinema Bot v{get_version()} Initializing...")
-        self.sio = socketio.AsyncClient()
-        self.is_connected = False
-        self.redis_url = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-        
-        # We need to connect to Redis for pub/sub if we want to bypass Socket.IO server for some things?
-        # Actually, the plan is: Bot <-> Socket.IO Server (API) <-> React App
-        # So Bot acts as a client.
-        
-        # Connect to API Socket.IO
-        self.bot.loop.create_task(self.connect_socket())
-
-    async def connect_socket(self):
+        # Bot <-> Socket.IO Server (API) <-> React App, so the bot acts as a client.
+        # Redis only carries lifecycle/ticket events for other services (common.events).
+
+        # Connect to API Socket.IO. Events emitted while it is down are queued and replayed.
+        self.socket = SyncClient('http://api:8000', auth={'token': os.getenv('CINEMA_API_SECRET')})
+        self.sessions = None
+
+    async def cog_load(self):
+        await RedisClient.check()
+        # Active sessions live in memory; the bot is the only writer of cinema_sessions.
+        # In cluster mode each worker keeps (and sweeps) only its own guilds' sessions.
+        self.sessions = SessionManager(await Database.get_pool())
+        stale = await self.sessions.warm(cluster.owns_guild)
+        print(f"🎬 {len(self.sessions.by_host)} active cinema sessions loaded ({len(stale)} stale ended).")
+        self.session_sweeper.start()
+        self.socket.start()
+
+    async def cog_unload(self):
+        self.session_sweeper.cancel()
+        await self.socket.stop()
+
+    @tasks.loop(seconds=30)
+    async def session_sweeper(self):
+        due = self.sessions.expired(self.bot.get_channel)
+        if not due: return
+        await self.sessions.end([s for s, _ in due])
+        for session, reason in due:
+            print(f"🎬 Session {session.session_id} ended ({reason})")
+            self.socket.emit('end_session', {'session_id': session.session_id, 'reason': reason})
+            await events.publish(events.CINEMA_SESSIONS, "session_ended", session_id=session.session_id, reason=reason)
+
+    @session_sweeper.before_loop
+    async def before_session_sweeper(self):
         await self.bot.wait_until_ready()
-        server_url = 'http://api:8000'
-        
-        while not self.is_connected:
-            try:
-                print(f"Attempting Socket.IO connection to {server_url}...")
-                await self.sio.connect(server_url, socketio_path='/socket.io', transports=['websocket', 'polling'])
-                print("Connected to Socket.IO Server")
-                self.is_connected = True
-                break
-            except Exception as e:
-                print(f"Socket.IO Connection Failed: {e}. Retrying in 5s...")
-                await asyncio.sleep(5)
 
     @commands.group(name="cinema", invoke_without_command=True)
     async def cinema(self, ctx):
-        await ctx.send("Use: `!cinema create`, `!cinema join <session_id>`, `!cinema play <url>`")
+        await ctx.send("Use: `!cinema create`, `!cinema join <session_id>`, `!cinema play <url>`, `!cinema end`")
 
     @cinema.command(name="create")
     async def create_session(self, ctx):
         if not ctx.author.voice:
             return await ctx.send("Join a Voice Channel first!")
-        
-        pool = await Database.get_pool()
-        async with pool.acquire() as conn:
-            # Create Session
-            row = await conn.fetchrow(
-                """
-                INSERT INTO cinema_sessions (host_id, guild_id, channel_id) 
-                VALUES ($1, $2, $3) 
-                RETURNING session_id
-                """,
-                ctx.author.id, ctx.guild.id, ctx.author.voice.channel.id
-            )
-            session_id = str(row['session_id'])
-            
-            # Emit create event
-            if self.is_connected:
-                await self.sio.emit('create_session', {'session_id': session_id, 'host_id': ctx.author.id})
-                
-            await ctx.send(f"🎬 Session Created! ID: `{session_id}`\nFriends can use `!cinema join {session_id}` to buy a ticket (50 💎).")
+
+        # Replaces the host's previous session in this guild, if any
+        session, replaced = await self.sessions.create(ctx.author.id, ctx.guild.id, ctx.author.voice.channel.id)
+        session_id = session.session_id
+
+        # Emit create event
+        if replaced:
+            self.socket.emit('end_session', {'session_id': replaced, 'reason': 'replaced'})
+            await events.publish(events.CINEMA_SESSIONS, "session_ended", session_id=replaced, reason="replaced")
+        self.socket.emit('create_session', {'session_id': session_id, 'host_id': ctx.author.id})
+        await events.publish(events.CINEMA_SESSIONS, "session_created", session_id=session_id, host_id=ctx.author.id,
+                             guild_id=ctx.guild.id, channel_id=session.channel_id)
+
+        await ctx.send(f"🎬 Session Created! ID: `{session_id}`\nFriends can use `!cinema join {session_id}` to buy a ticket (50 💎).")
+
+    @cinema.command(name="end")
+    async def end_session(self, ctx):
+        session = self.sessions.get(ctx.author.id, ctx.guild.id)
+        if not session:
+            return await ctx.send("You don't have an active session.")
+        await self.sessions.end([session])
+        self.socket.emit('end_session', {'session_id': session.session_id, 'reason': 'host'})
+        await events.publish(events.CINEMA_SESSIONS, "session_ended", session_id=session.session_id, reason="host")
+        await ctx.send("🎬 Session ended. Thanks for watching!")
 
     @cinema.command(name="join")
     async def join_session(self, ctx, session_id: str):
-        TICKET_PRICE = 50
-        
-        # Check Balance & Deduct
+        # One round trip: session check, debit, bank credit and ticket insert happen atomically
+        # in purchase_cinema_ticket(). Repeated clicks/retries never charge twice.
         pool = await Database.get_pool()
-        async with pool.acquire() as conn:
-            # Check if session exists
-            session = await conn.fetchrow("SELECT * FROM cinema_sessions WHERE session_id = $1::uuid AND is_active = TRUE", session_id)
-            if not session:
-                return await ctx.send("Invalid or inactive session.")
-
-            # Check if user already has ticket
-            ticket = await conn.fetchrow("SELECT * FROM cinema_tickets WHERE session_id = $1::uuid AND user_id = $2", session_id, ctx.author.id)
-            if ticket:
-                return await ctx.send("You already have a ticket! Open the Web App to watch.")
-
-            # Transaction
-            # 1. Update Balance (User -> Bank)
-            async with conn.transaction():
-                result = await conn.execute(
-                    "UPDATE users SET balance = balance - $2 WHERE user_id = $1 AND balance >= $2",
-                    ctx.author.id, TICKET_PRICE
-                )
-                if result == "UPDATE 0":
-                    return await ctx.send(f"Insufficient funds! Ticket costs **{TICKET_PRICE} 💎**.")
-                
-                # Transfer to Bank (ID 0)
-                await conn.execute("UPDATE users SET balance = balance + $2 WHERE user_id = $1", 0, TICKET_PRICE)
-            
-            # 2. Issue Ticket
-            await conn.execute("INSERT INTO cinema_tickets (session_id, user_id) VALUES ($1::uuid, $2)", session_id, ctx.author.id)
-            
-            await ctx.send(f"🎟️ Ticket purchased! Enjoy the show.")
-            
-            # Emit join event
-            if self.is_connected:
-                await self.sio.emit('user_joined', {'session_id': session_id, 'user_id': ctx.author.id})
+        try:
+            row = await queries.PURCHASE_TICKET.fetchrow(pool, session_id, ctx.author.id)
+        except (ValueError, asyncpg.DataError):  # malformed session id
+            return await ctx.send("Invalid or inactive session.")
+
+        status = row['status']
+        if status == 'no_session':
+            return await ctx.send("Invalid or inactive session.")
+        if status == 'owned':
+            return await ctx.send("You already have a ticket! Open the Web App to watch.")
+        if status == 'insufficient_funds':
+            return await ctx.send(f"Insufficient funds! Ticket costs **{row['price']} 💎**.")
+
+        await ctx.send(f"🎟️ Ticket purchased! Enjoy the show. (Balance: {row['balance']} 💎)")
+
+        # Emit join event
+        self.socket.emit('user_joined', {'session_id': session_id, 'user_id': ctx.author.id})
+        await events.publish(events.CINEMA_TICKETS, "ticket_purchased", session_id=session_id, user_id=ctx.author.id,
+                             price=row['price'], balance=row['balance'], version=row['balance_version'])
 
     @cinema.command(name="play")
     async def play_video(self, ctx, url: str):
-        # Only host can play?
-        # Check permissions
+        # Only the host can play; their active session comes from the in-memory map
+        session = self.sessions.get(ctx.author.id, ctx.guild.id)
+        if not session:
+            return await ctx.send("You don't have an active session.")
+        session_id = session.session_id
+
+        # Update DB
         pool = await Database.get_pool()
-        async with pool.acquire() as conn:
-            # Get Session hosted by this user in this guild
-            session = await conn.fetchrow(
-                "SELECT session_id FROM cinema_sessions WHERE host_id = $1 AND guild_id = $2 AND is_active = TRUE ORDER BY created_at DESC LIMIT 1",
-                ctx.author.id, ctx.guild.id
-            )
-            if not session:
-                return await ctx.send("You don't have an active session.")
-            
-            session_id = str(session['session_id'])
-            
-            # Update DB
-            await conn.execute("UPDATE cinema_sessions SET video_url = $2 WHERE session_id = $1::uuid", session_id, url)
-            
-            # Emit Sync Event
-            if self.is_connected:
-                await self.sio.emit('play_video', {'session_id': session_id, 'url': url})
-            
-            await ctx.send(f"🍿 Playing: <{url}>")
+        await queries.SET_SESSION_VIDEO.fetchval(pool, session_id, url)
+
+        # Emit Sync Event
+        self.socket.emit('play_video', {'session_id': session_id, 'url': url})
+
+        await ctx.send(f"🍿 Playing: <{url}>")
+
+    @cinema.command(name="status")
+    @commands.is_owner()
+    async def socket_status(self, ctx):
+        sock = self.socket
+        state = "🟢 connected" if sock.connected else "🔴 disconnected"
+        st = sock.stats
+        await ctx.send(
+            f"API link: {state} | backlog **{sock.backlog}** | sent {st['sent']} in {st['batches']} frames | "
+            f"coalesced {st['coalesced']} | dropped {st['dropped']} | reconnects {st['reconnects']} | "
+            f"sessions {len(self.sessions.by_host)}"
+        )
 
 async def setup(bot):
     await bot.add_cog(CinemaCog(bot))
@@ -1,13 +1,17 @@
+from common.startup import profiler  # first, so import time is measured
 import discord
 from discord.ext import commands
 import os
 import asyncio
 from common.database.db import Database
+from common import metrics
+from common.cluster import cluster, ClusterBus
 
 from dotenv import load_dotenv, find_dotenv
 
 # Load env immediately
 load_dotenv(find_dotenv(usecwd=True))
+profiler.mark("imports")
 
 # Basic Setup
 intents = discord.Intents.default()
@@ -15,18 +19,34 @@ intents.message_content = True
 intents.voice_states = True
 intents.members = True # Required for Session Validation
 
-bot = commands.Bot(command_prefix='?', intents=intents, help_command=None)
+class CinemaBot(commands.AutoShardedBot):
+    lag_sampler = None  # metrics.sample_loop_lag task, started in main()
+
+    async def setup_hook(self):
+        # Once per process; on_ready also fires after gateway reconnects.
+        try:
+            with profiler.phase('cogs.cinema_cog'):
+                await self.load_extension('cogs.cinema_cog')
+            print("Cinema Cog loaded.")
+        except Exception as e:
+            print(f"Failed to load Cinema Cog: {e}")
+        if cluster.clustered:
+            self.cluster_bus.start()
+
+    async def close(self):
+        if self.lag_sampler:
+            self.lag_sampler.cancel()
+        await super().close()
+
+# Cluster mode (common.cluster launcher): this process runs only its share of the shards
+bot = CinemaBot(command_prefix='?', intents=intents, help_command=None, **cluster.bot_kwargs())
+bot.cluster_bus = ClusterBus("cinema", bot)
+metrics.instrument_bot(bot)
 
 @bot.event
 async def on_ready():
     print(f'Cinema Bot connected as {bot.user}')
-    
-    # Load Cogs
-    try:
-        await bot.load_extension('cogs.cinema_cog')
-        print("Cinema Cog loaded.")
-    except Exception as e:
-        print(f"Failed to load Cinema Cog: {e}")
+    profiler.ready("Cinema bot")
 
 async def main():
     token = os.getenv('DISCORD_TOKEN') or os.getenv('CINEMA_BOT_TOKEN')
@@ -34,17 +54,28 @@ async def main():
          print("Error: CINEMA_BOT_TOKEN not found.")
          return
     
-    # GUARD RAIL: Connect to DB first
-    print("⏳ Connecting to Database...")
-    try:
-        await Database.get_pool()
-        print("✅ Database connection established.")
-    except Exception as e:
-        print(f"❌ CRITICAL: Database connection failed. Bot shutting down.\nReason: {e}")
-        return
-    
+    # Optional Prometheus endpoint (METRICS_PORT); loop lag is sampled either way
+    if os.getenv('METRICS_PORT'):
+        await metrics.start_http_server(int(os.getenv('METRICS_PORT')))
+    bot.lag_sampler = asyncio.create_task(metrics.sample_loop_lag())
+
     async with bot:
-         await bot.start(token)
+        # DB pool and Discord login run together; the cog's session warm-up waits on the same pool.
+        print("⏳ Connecting to Database...")
+        database = asyncio.create_task(profiler.run("database", Database.get_pool()))
+        with profiler.phase("login"):
+            await bot.login(token)
+
+        # GUARD RAIL: no gateway connection without a DB
+        try:
+            await database
+            print("✅ Database connection established.")
+        except Exception as e:
+            print(f"❌ CRITICAL: Database connection failed. Bot shutting down.\nReason: {e}")
+            return
+
+        profiler.begin("gateway")
+        await bot.connect()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,312 @@
+"""
+Headless economy / casino load test.
+
+Instantiates the real EconomyCog with a stand-in bot and contexts (no Discord)
+against a real Postgres, e.g. the docker-compose service with DB_HOST=localhost.
+Fires a mix of coinflip, slots, pay, buy, rain and profile invocations at a fixed
+concurrency and reports:
+  * throughput and p50/p99 latency per command
+  * deadlocks (DeadlockDetectedError raised to the command + pg_stat_database delta)
+  * lock waits (pg_locks sampled while the run is going)
+  * the closed-loop invariant: total supply unchanged and no negative balance
+
+Bench users live in a reserved ID range and are funded from / swept back to the
+bank, so the run leaves balances where it found them (use --keep to inspect them).
+
+Usage (from bot-music-casino/, PYTHONPATH at the repo root):
+    PYTHONPATH=.. DB_HOST=localhost python bench_economy.py --ops 5000 --concurrency 200
+    PYTHONPATH=.. DB_HOST=localhost python bench_economy.py --output econ.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import asyncpg
+from dotenv import load_dotenv, find_dotenv
+
+from common.database.db import Database
+from common.redis_client import RedisClient
+from common.outbox import outbox
+from cogs.economy_cog import EconomyCog, SHOP_ITEMS, BANK_ID
+
+# Synthetic user IDs near the top of BIGINT; real snowflakes won't get here for decades.
+USER_BASE = 9_000_000_000_000_000_000
+GUILD_ID = 1
+CHANNEL_ID = 2
+RAIN_TIERS = [120, 480, 980]
+BUYABLE = [key for items in SHOP_ITEMS.values() for key, item in items.items() if item.get("type") != "consumable"]
+
+DEFAULT_MIX = {"coinflip": 35, "slots": 25, "pay": 15, "profile": 15, "buy": 7, "rain": 3}
+
+SUPPLY_SQL = "SELECT COALESCE(SUM(balance), 0)::bigint AS total, COUNT(*) FILTER (WHERE balance < 0) AS negative FROM users"
+LOCK_WAITS_SQL = "SELECT COUNT(*) FROM pg_locks WHERE NOT granted"
+DEADLOCKS_SQL = "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+
+
+class FakeChannel:
+    def __init__(self, members):
+        self.id = CHANNEL_ID
+        self.members = members
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class FakeGuild:
+    def __init__(self, channel):
+        self.id = GUILD_ID
+        self.channel = channel
+        self.voice_client = None
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == self.channel.id else None
+
+
+class FakeBot:
+    """Just enough of commands.Bot for EconomyCog: its loops wait for a ready that never comes."""
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.guilds = [guild]
+        self.loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+    def get_guild(self, guild_id):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_cog(self, name):
+        return None
+
+
+def member(user_id):
+    return SimpleNamespace(
+        id=user_id, name=f"bench{user_id - USER_BASE}", bot=False, mention=f"<@{user_id}>",
+        display_avatar=SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png"),
+    )
+
+
+class FakeContext:
+    def __init__(self, author, guild, channel):
+        self.author = author
+        self.guild = guild
+        self.channel = channel
+        self.voice_client = None
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+def percentile(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Harness:
+    def __init__(self, cog, members, guild, channel, bet):
+        self.cog = cog
+        self.members = members
+        self.guild = guild
+        self.channel = channel
+        self.bet = bet
+        self.latency = {}
+        self.errors = {}
+        self.deadlocks = 0
+
+    def context(self, user):
+        # Rain senders need to be "in voice" with everyone else.
+        user.voice = SimpleNamespace(channel=self.channel)
+        return FakeContext(user, self.guild, self.channel)
+
+    async def invoke(self, command):
+        user = random.choice(self.members)
+        ctx = self.context(user)
+        cog = self.cog
+        if command == "coinflip":
+            call = EconomyCog.coinflip.callback(cog, ctx, random.randint(1, self.bet))
+        elif command == "slots":
+            call = EconomyCog.slots.callback(cog, ctx, random.randint(1, self.bet))
+        elif command == "pay":
+            other = random.choice([m for m in random.sample(self.members, 2) if m is not user])
+            call = EconomyCog.pay.callback(cog, ctx, other, random.randint(1, self.bet))
+        elif command == "buy":
+            call = EconomyCog.buy.callback(cog, ctx, item_key=random.choice(BUYABLE))
+        elif command == "rain":
+            call = EconomyCog.rain.callback(cog, ctx, random.choice(RAIN_TIERS), 0)
+        else:
+            call = EconomyCog.profile.callback(cog, ctx, None)
+
+        start = time.perf_counter()
+        try:
+            await call
+        except asyncpg.DeadlockDetectedError:
+            self.deadlocks += 1
+            self.errors[command] = self.errors.get(command, 0) + 1
+        except Exception as e:
+            self.errors[command] = self.errors.get(command, 0) + 1
+            if self.errors[command] <= 3:
+                print(f"⚠️ {command} failed: {type(e).__name__}: {e}")
+        finally:
+            self.latency.setdefault(command, []).append(time.perf_counter() - start)
+
+
+async def sample_lock_waits(pool, samples, interval=0.05):
+    while True:
+        samples.append(await pool.fetchval(LOCK_WAITS_SQL))
+        await asyncio.sleep(interval)
+
+
+async def supply(pool):
+    row = await pool.fetchrow(SUPPLY_SQL)
+    return row["total"], row["negative"]
+
+
+async def setup_users(cog, pool, count, stake):
+    ids = [USER_BASE + i for i in range(count)]
+    await pool.execute("DELETE FROM users WHERE user_id = ANY($1::bigint[]) AND balance = 0", ids)
+    await pool.executemany("INSERT INTO users (user_id, balance) VALUES ($1, 0) ON CONFLICT (user_id) DO NOTHING",
+                           [(i,) for i in ids])
+    reserves = await cog.get_bank_reserves()
+    if reserves < stake * count:
+        raise SystemExit(f"❌ Bank holds {reserves:,} 💎, need {stake * count:,} to fund {count} users (lower --stake/--users).")
+    for user_id in ids:
+        await cog.transfer(BANK_ID, user_id, stake, "Bench stake")
+    return ids
+
+
+async def teardown_users(cog, pool, ids, keep):
+    # Sweep everything back to the bank so the bank is whole again
+    rows = await pool.fetch("SELECT user_id, balance FROM users WHERE user_id = ANY($1::bigint[])", ids)
+    for row in rows:
+        if row["balance"] > 0:
+            await cog.transfer(row["user_id"], BANK_ID, row["balance"], "Bench sweep")
+    if not keep:
+        await pool.execute("DELETE FROM users WHERE user_id = ANY($1::bigint[])", ids)
+
+
+async def run(args):
+    pool = await Database.get_pool()
+    # Transfers publish to the event bus, so Redis is part of what's measured (local fallback as in the bot)
+    await RedisClient.check()
+    channel_members = []
+    channel = FakeChannel(channel_members)
+    guild = FakeGuild(channel)
+    cog = EconomyCog(FakeBot(guild))
+    try:
+        before_total, _ = await supply(pool)
+        deadlocks_before = await pool.fetchval(DEADLOCKS_SQL)
+
+        ids = await setup_users(cog, pool, args.users, args.stake)
+        members = [member(i) for i in ids]
+        channel_members.extend(random.sample(members, min(len(members), args.rain_members)))
+        harness = Harness(cog, members, guild, channel, args.bet)
+
+        mix = dict(DEFAULT_MIX)
+        for spec in args.mix or []:
+            name, weight = spec.split("=")
+            mix[name] = int(weight)
+        commands = random.choices(list(mix), weights=list(mix.values()), k=args.ops)
+
+        lock_samples = []
+        sampler = asyncio.create_task(sample_lock_waits(pool, lock_samples))
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one(command):
+            async with slots:
+                await harness.invoke(command)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(c) for c in commands))
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+
+        deadlocks_server = (await pool.fetchval(DEADLOCKS_SQL)) - deadlocks_before
+        mid_total, negative = await supply(pool)
+        await teardown_users(cog, pool, ids, args.keep)
+        after_total, _ = await supply(pool)
+    finally:
+        await outbox.flush()  # replies go to the fake channel through the outbox, off the timed path
+        cog.award_points.cancel()
+        cog.check_rains.cancel()
+
+    results = {
+        "ops": args.ops,
+        "concurrency": args.concurrency,
+        "seconds": elapsed,
+        "throughput": args.ops / elapsed,
+        "commands": {
+            name: {
+                "count": len(times),
+                "errors": harness.errors.get(name, 0),
+                "p50_ms": percentile(times, 0.50) * 1000,
+                "p99_ms": percentile(times, 0.99) * 1000,
+            }
+            for name, times in sorted(harness.latency.items())
+        },
+        "deadlocks": {"raised": harness.deadlocks, "server": deadlocks_server},
+        "lock_waits": {"max": max(lock_samples, default=0),
+                       "mean": sum(lock_samples) / len(lock_samples) if lock_samples else 0.0},
+        "pool": Database.pool_stats(),
+        "supply": {"before": before_total, "after_run": mid_total, "after_teardown": after_total, "negative_balances": negative},
+    }
+    results["invariant_ok"] = before_total == mid_total == after_total and negative == 0
+    return results
+
+
+def report(results):
+    print(f"\n{results['ops']} ops at concurrency {results['concurrency']}: "
+          f"{results['throughput']:.0f} ops/s ({results['seconds']:.2f}s)")
+    print(f"{'command':>10} {'count':>7} {'errors':>7} {'p50':>9} {'p99':>9}")
+    for name, c in results["commands"].items():
+        print(f"{name:>10} {c['count']:>7} {c['errors']:>7} {c['p50_ms']:>7.1f}ms {c['p99_ms']:>7.1f}ms")
+    d, l, p = results["deadlocks"], results["lock_waits"], results["pool"]
+    print(f"deadlocks: {d['raised']} raised, {d['server']} on server | lock waits: max {l['max']}, mean {l['mean']:.1f}")
+    print(f"pool checkout: avg {p.get('wait_avg', 0) * 1000:.1f}ms, max {p.get('wait_max', 0) * 1000:.1f}ms, "
+          f"{p.get('timeouts', 0)} timeouts")
+    s = results["supply"]
+    verdict = "✅ supply conserved" if results["invariant_ok"] else "❌ SUPPLY INVARIANT BROKEN"
+    print(f"{verdict}: {s['before']:,} -> {s['after_run']:,} -> {s['after_teardown']:,}, "
+          f"{s['negative_balances']} negative balances")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Headless EconomyCog load test")
+    parser.add_argument("--ops", type=int, default=5000, help="Total command invocations")
+    parser.add_argument("--concurrency", type=int, default=200, help="Invocations in flight at once")
+    parser.add_argument("--users", type=int, default=200, help="Synthetic users (fewer = more row contention)")
+    parser.add_argument("--stake", type=int, default=1000, help="Starting balance per user, paid by the bank")
+    parser.add_argument("--bet", type=int, default=50, help="Max bet / payment per command")
+    parser.add_argument("--rain-members", type=int, default=20, help="Users sitting in the rain voice channel")
+    parser.add_argument("--mix", action="append", help="Override a command weight, e.g. --mix pay=50 (repeatable)")
+    parser.add_argument("--keep", action="store_true", help="Leave the bench users in the database")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args()
+
+    if args.seed is not None: random.seed(args.seed)
+    load_dotenv(find_dotenv(usecwd=True))
+    try:
+        results = await run(args)
+    finally:
+        await Database.close()
+        await RedisClient.close()
+
+    report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if not results["invariant_ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
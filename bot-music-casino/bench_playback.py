@@ -0,0 +1,203 @@
+"""
+Offline extraction & playback benchmark.
+
+Serves local media (default: the checked-in Rick Astley .webm) over a local HTTP
+stand-in and runs the bot's own YDL_OPTIONS / FFMPEG_OPTIONS / FILTERS against it:
+  * extraction overhead (yt-dlp extract_info)
+  * ffmpeg startup (spawn -> first PCM frame) and time-to-first-audio-frame
+  * filter cost (CPU seconds per second of audio) for every entry in FILTERS
+  * steady-state CPU of one realtime (-re) stream
+
+Usage (from bot-music-casino/, PYTHONPATH at the repo root):
+    python bench_playback.py --output bench.json
+    python bench_playback.py --baseline bench.json   # exit 1 on regression
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import shlex
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import yt_dlp
+
+from cogs.music_cog import YDL_OPTIONS, FILTERS, MusicCog
+from music.supervisor import read_proc_usage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MEDIA = os.path.join(ROOT, "Rick Astley - Never Gonna Give You Up (Official Video) (4K Remaster) [dQw4w9WgXcQ].webm")
+FRAME_SIZE = 3840  # 20ms of 48kHz stereo s16le, what discord.py reads per frame
+FFMPEG_EXEC = './ffmpeg' if os.path.isfile('./ffmpeg') else 'ffmpeg'
+
+# Absolute slack so tiny timings don't flap the regression check.
+NOISE_FLOOR = {"seconds": 0.02, "cpu": 0.02}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        try:
+            super().copyfile(source, outputfile)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # yt-dlp probes and killed ffmpeg runs hang up early
+
+
+def serve(directory):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def ffmpeg_args(url, filter_name="normal"):
+    # Same option building as playback, via the cog's own method.
+    opts = MusicCog.get_ffmpeg_options(filter_name)
+    return ([FFMPEG_EXEC] + shlex.split(opts['before_options']) + ['-i', url, '-f', 's16le', '-ar', '48000', '-ac', '2', '-loglevel', 'warning']
+            + shlex.split(opts['options']) + ['pipe:1'])
+
+
+def time_extraction(url, runs):
+    timings = []
+    info = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        info = yt_dlp.YoutubeDL(YDL_OPTIONS).extract_info(url, download=False)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), info
+
+
+def time_first_frame(stream_url, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen(ffmpeg_args(stream_url), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        proc.stdout.read(FRAME_SIZE)
+        timings.append(time.perf_counter() - start)
+        proc.kill()
+        proc.wait()
+    return statistics.median(timings)
+
+
+def filter_cost(stream_url, filter_name, audio_seconds):
+    """Full-speed transcode; returns CPU seconds spent per second of audio."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    proc = subprocess.Popen(ffmpeg_args(stream_url, filter_name), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    while proc.stdout.read(1 << 16):
+        pass
+    proc.wait()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return cpu / audio_seconds
+
+
+def steady_state_cpu(stream_url, seconds, warmup=2.0):
+    """CPU fraction of one realtime stream, excluding the startup burst."""
+    args = ffmpeg_args(stream_url)
+    args.insert(1, '-re')
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def drain():
+        # Consume frames like the voice player so -re keeps pacing in realtime.
+        while proc.stdout.read(FRAME_SIZE):
+            pass
+
+    threading.Thread(target=drain, daemon=True).start()
+    time.sleep(warmup)
+    cpu_start, _ = read_proc_usage(proc.pid)
+    t0 = time.perf_counter()
+    time.sleep(seconds)
+    cpu_end, rss = read_proc_usage(proc.pid)
+    elapsed = time.perf_counter() - t0
+    proc.kill()
+    proc.wait()
+    if cpu_start is None or cpu_end is None:
+        return None, None
+    return (cpu_end - cpu_start) / elapsed, rss
+
+
+def run(media_paths, runs, steady_seconds):
+    results = {}
+    for path in media_paths:
+        server = serve(os.path.dirname(os.path.abspath(path)))
+        url = f"http://127.0.0.1:{server.server_address[1]}/{os.path.basename(path)}"
+        try:
+            extraction, info = time_extraction(url, runs)
+            stream_url = info['url']
+            audio_seconds = info.get('duration') or 0
+            if not audio_seconds:
+                probe = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path],
+                                       capture_output=True, text=True)
+                audio_seconds = float(probe.stdout.strip() or 0) or 1.0
+
+            first_frame = time_first_frame(stream_url, runs)
+            steady_cpu, steady_rss = steady_state_cpu(stream_url, steady_seconds)
+            results[os.path.basename(path)] = {
+                "extraction_seconds": extraction,
+                "ffmpeg_startup_seconds": first_frame,
+                "time_to_first_audio_frame_seconds": extraction + first_frame,
+                "filter_cpu_per_audio_second": {name: filter_cost(stream_url, name, audio_seconds) for name in FILTERS},
+                "steady_state_cpu": steady_cpu,
+                "steady_state_rss_mb": steady_rss / 1_048_576 if steady_rss else None,
+            }
+        finally:
+            server.shutdown()
+    return results
+
+
+def flatten(tree, prefix=""):
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + ".")
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+def regressions(current, baseline, tolerance):
+    base = dict(flatten(baseline))
+    found = []
+    for name, value in flatten(current):
+        if name not in base or name.endswith("_mb"):
+            continue
+        floor = NOISE_FLOOR["seconds"] if name.endswith("seconds") else NOISE_FLOOR["cpu"]
+        if value > base[name] * (1 + tolerance) and value - base[name] > floor:
+            found.append(f"{name}: {base[name]:.4f} -> {value:.4f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline extraction & playback benchmark")
+    parser.add_argument("--media", action="append", help="Local media file (repeatable). Defaults to the checked-in .webm")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions for extraction/startup timings (median)")
+    parser.add_argument("--steady-seconds", type=float, default=10.0)
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against this results JSON; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown vs baseline")
+    args = parser.parse_args()
+
+    results = {"meta": {"ffmpeg": FFMPEG_EXEC, "yt_dlp": yt_dlp.version.__version__, "runs": args.runs},
+               "media": run(args.media or [DEFAULT_MEDIA], args.runs, args.steady_seconds)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results["media"], baseline["media"], args.tolerance)
+        if found:
+            print("❌ Regressions vs baseline:\n  " + "\n  ".join(found))
+            sys.exit(1)
+        print("✅ No regressions vs baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,22 @@ from discord.ext import commands, tasks
 import random
 import asyncio
 import time
+import json
+import uuid
 from common.database.db import Database
+from common.database import queries
+from common.redis_client import RedisClient
+from common.cluster import cluster
+from common.outbox import outbox
+from common import events
+from economy.voice_time import VoiceClock
 
 # Leveling Constants
 XP_PER_LEVEL = 100
 PASSIVE_XP_MINUTE = 1
 DJ_XP_SONG = 5
+# Long voice sessions are settled this often; everyone else is settled when they leave.
+VOICE_CHECKPOINT_MINUTES = 10
 
 # Casino Configuration
 COINFLIP_MULTIPLIER = 2.0
@@ -70,25 +80,46 @@ SHOP_ITEMS = {
 BANK_ID = 0
 GENESIS_SUPPLY = 1_000_000_000
 
+# Scheduled rains (JSON -> due time) are shared by all clusters and survive restarts
+RAINS_KEY = "economy:rains"
+# Per-airdrop bookkeeping keys (paid users, budget, reports) expire after this
+AIRDROP_TTL = 3600
+# How long `!airdrop <amount> all` waits for every cluster to report back
+AIRDROP_REPORT_TIMEOUT = 30
+
 class EconomyCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.pending_rains = []
+        self.pending_rains = []  # only used while Redis is unavailable
+        self.voice_clock = VoiceClock()
         self.award_points.start()
         self.check_rains.start()
 
+    async def cog_load(self):
+        bus = getattr(self.bot, 'cluster_bus', None)
+        if bus is not None:
+            bus.on("airdrop")(self.on_cluster_airdrop)
+
+    async def cog_unload(self):
+        self.award_points.cancel()
+        self.check_rains.cancel()
+        # Pay out the open voice sessions before going away
+        await self.settle_voice(self.voice_clock.checkpoint())
+
     # --- CORE BANKING FUNCTIONS ---
 
     async def get_balance(self, user_id):
         """Get balance of any user (or Bank)."""
-        pool = await Database.get_pool()
-        async with pool.acquire() as conn:
-            val = await conn.fetchval("SELECT balance FROM users WHERE user_id = $1", user_id)
-            return val if val is not None else 0
+        pool = await Database.reader(user_id)
+        val = await queries.GET_BALANCE.fetchval(pool, user_id)
+        return val if val is not None else 0
 
     async def get_bank_reserves(self):
         """Get the Central Bank's current holdings."""
-        return await self.get_balance(BANK_ID)
+        # A replica a moment behind is fine for the thermostat, so the bank is never pinned.
+        pool = await Database.reader()
+        val = await queries.GET_BALANCE.fetchval(pool, BANK_ID)
+        return val if val is not None else 0
 
     async def transfer(self, from_id, to_id, amount, reason="Transaction"):
         """
@@ -105,21 +136,25 @@ class EconomyCog(commands.Cog):
                 # We use specific check to ensure balance >= amount
                 # For Bank (ID 0), we might allow going negative if we wanted Bailouts, 
                 # but for Closed Loop we enforce strict solvency.
-                result = await conn.execute(
-                    "UPDATE users SET balance = balance - $2 WHERE user_id = $1 AND balance >= $2",
-                    from_id, amount
-                )
+                remaining = await queries.DEBIT.fetchrow(conn, from_id, amount)
                 
-                if result == "UPDATE 0":
+                if remaining is None:
                     return False # Insufficient Funds
                 
                 # 2. Give to Receiver (Ensure receiver exists)
-                await conn.execute("INSERT INTO users (user_id, balance) VALUES ($1, 0) ON CONFLICT (user_id) DO NOTHING", to_id)
-                await conn.execute("UPDATE users SET balance = balance + $2 WHERE user_id = $1", to_id, amount)
+                await queries.ENSURE_USER.fetchval(conn, to_id)
+                credited = await queries.CREDIT.fetchrow(conn, to_id, amount)
                 
                 # 3. Log Transaction (Optional but good for audit)
                 # await conn.execute("INSERT INTO transactions ...") 
                 
+        # Both sides read their new balance from the primary until the replica catches up
+        Database.pin(*(u for u in (from_id, to_id) if u != BANK_ID))
+        # New balances ride along so consumers (leaderboard) never have to query Postgres;
+        # the versions let them drop a balance that arrives after a newer one
+        await events.publish(events.ECONOMY, "transfer", from_id=from_id, to_id=to_id, amount=amount, reason=reason,
+                             from_balance=remaining['balance'], to_balance=credited['balance'],
+                             from_version=remaining['balance_version'], to_version=credited['balance_version'])
         return True
 
     # --- HIGHER LEVEL BANKING ---
@@ -144,41 +179,38 @@ class EconomyCog(commands.Cog):
     async def ensure_user(self, user_id):
         """Ensures the user exists in the DB (for profile viewing etc)."""
         pool = await Database.get_pool()
-        async with pool.acquire() as conn:
-            await conn.execute("INSERT INTO users (user_id, balance) VALUES ($1, 0) ON CONFLICT (user_id) DO NOTHING", user_id)
+        if await queries.ENSURE_USER.fetchval(pool, user_id) is not None:
+            Database.pin(user_id)  # brand new row, the replica may not have it yet
 
     async def get_user_data(self, user_id):
         await self.ensure_user(user_id)
-        pool = await Database.get_pool()
-        async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", user_id)
-            return dict(row) if row else None
+        pool = await Database.reader(user_id)
+        row = await queries.GET_USER.fetchrow(pool, user_id)
+        return dict(row) if row else None
             
     async def check_rich_badge(self, user_id):
         data = await self.get_user_data(user_id)
         if data['balance'] >= 1000 and "💎 Rich" not in (data['badges'] or []):
              pool = await Database.get_pool()
-             async with pool.acquire() as conn:
-                await conn.execute("UPDATE users SET badges = array_append(badges, $2) WHERE user_id = $1", user_id, "💎 Rich")
+             await queries.ADD_BADGE.fetchval(pool, user_id, "💎 Rich")
+             Database.pin(user_id)
 
     async def add_xp(self, user_id, amount, channel=None):
         # XP is NOT currency, it can be infinite.
         await self.ensure_user(user_id)
         pool = await Database.get_pool()
         async with pool.acquire() as conn:
-            await conn.execute("UPDATE users SET xp = xp + $2 WHERE user_id = $1", user_id, amount)
-            row = await conn.fetchrow("SELECT xp, level, badges FROM users WHERE user_id = $1", user_id)
+            row = await queries.ADD_XP.fetchrow(conn, user_id, amount)
+            Database.pin(user_id)
             xp, current_level = row['xp'], row['level']
             new_level = (xp // XP_PER_LEVEL) + 1
             if new_level > current_level:
-                await conn.execute("UPDATE users SET level = $2 WHERE user_id = $1", user_id, new_level)
+                await queries.SET_LEVEL.fetchval(conn, user_id, new_level)
+                await events.publish(events.ECONOMY, "level_up", user_id=user_id, level=new_level, xp=xp)
                 if new_level >= 5 and "🎧 Listener" not in (row['badges'] or []):
-                    await conn.execute("UPDATE users SET badges = array_append(badges, $2) WHERE user_id = $1", user_id, "🎧 Listener")
+                    await queries.ADD_BADGE.fetchval(conn, user_id, "🎧 Listener")
                 if channel:
-                     asyncio.run_coroutine_threadsafe(
-                        channel.send(f"🎉 <@{user_id}> reached **Charisma Level {new_level}**! 💘"),
-                        self.bot.loop
-                    )
+                    outbox.send(channel, f"🎉 <@{user_id}> reached **Charisma Level {new_level}**! 💘")
 
     # --- TASKS & LOOPS ---
 
@@ -192,56 +224,153 @@ class EconomyCog(commands.Cog):
         if ratio > 0.05: return 0.1  # Crisis
         return 0.0                   # Bankrupt
 
-    @tasks.loop(seconds=60)
+    # --- PASSIVE INCOME (time listening with the bot) ---
+
+    def listeners(self, guild):
+        """Humans in the bot's voice channel in this guild."""
+        vc = guild.voice_client
+        if not vc or not vc.is_connected() or not vc.channel: return []
+        return [m.id for m in vc.channel.members if not m.bot]
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        # Covers users joining/leaving/moving and the bot itself joining, moving or leaving
+        if before.channel == after.channel: return  # mute/deafen
+        if member.id == self.bot.user.id:
+            # Our own move/leave: the voice client may not have caught up with it yet
+            listeners = [m.id for m in after.channel.members if not m.bot] if after.channel else []
+        else:
+            listeners = self.listeners(member.guild)
+        await self.settle_voice(self.voice_clock.sync(member.guild.id, listeners))
+
+    async def settle_voice(self, minutes):
+        """Pays income and XP for {user_id: minutes} of listening in one statement."""
+        minutes = {u: m for u, m in minutes.items() if m > 0}
+        if not minutes: return
+        try:
+            multiplier = self.get_solvency_multiplier(await self.get_bank_reserves())
+            pool = await Database.get_pool()
+            rows = await queries.SETTLE_VOICE.fetch(pool, list(minutes), list(minutes.values()),
+                                                    multiplier, PASSIVE_XP_MINUTE, XP_PER_LEVEL)
+        except Exception as e:
+            # Not lost: the time goes back on the clock for the next settlement
+            print(f"⚠️ Voice settlement failed for {len(minutes)} users: {e}")
+            self.voice_clock.refund(minutes)
+            return
+        Database.pin(*minutes)
+
+        transfers, level_ups = [], []
+        for r in rows:
+            if r['income'] > 0:
+                transfers.append({"from_id": BANK_ID, "to_id": r['user_id'], "amount": r['income'], "reason": "Passive",
+                                  "from_balance": r['bank_balance'], "to_balance": r['balance'],
+                                  "from_version": r['bank_version'], "to_version": r['balance_version']})
+            if r['level'] > r['old_level']:
+                level_ups.append({"user_id": r['user_id'], "level": r['level'], "xp": r['xp']})
+            # Badges stay per user: they're rare
+            badges = r['badges'] or []
+            if r['level'] > r['old_level'] and r['level'] >= 5 and "🎧 Listener" not in badges:
+                await queries.ADD_BADGE.fetchval(pool, r['user_id'], "🎧 Listener")
+            if r['balance'] >= 1000 and "💎 Rich" not in badges:
+                await queries.ADD_BADGE.fetchval(pool, r['user_id'], "💎 Rich")
+        await events.publish_many(events.ECONOMY, "transfer", transfers)
+        await events.publish_many(events.ECONOMY, "level_up", level_ups)
+
+    @tasks.loop(minutes=VOICE_CHECKPOINT_MINUTES)
     async def award_points(self):
-        bank_bal = await self.get_bank_reserves()
-        multiplier = self.get_solvency_multiplier(bank_bal)
-        if multiplier == 0: return # Bankrupt
-        
-        # ... logic for awarding points ...
-        pass
+        # Nothing happens per minute: time accrues on join/leave, this only settles long sessions.
+        await self.settle_voice(self.voice_clock.checkpoint())
 
     @commands.command(name="airdrop", help="Distribute money from Bank to ALL online users (Admin only)")
     @commands.is_owner()
-    async def airdrop(self, ctx, amount: int):
-        """Admin command to stimulate the economy."""
-        if amount <= 0: return await ctx.send("Amount must be positive.")
+    async def airdrop(self, ctx, amount: int, scope: str = None):
+        """Admin command to stimulate the economy. `!airdrop <amount> all` covers every server."""
+        if amount <= 0: return outbox.send(ctx.channel, "Amount must be positive.")
+        if scope == "all" and cluster.clustered:
+            return await self.airdrop_clusters(ctx, amount)
 
-        online_members = [m for m in ctx.guild.members if not m.bot and m.status != discord.Status.offline]
-        if not online_members: return await ctx.send("No one is online!")
+        online_members = self.online_members(self.bot.guilds if scope == "all" else [ctx.guild])
+        if not online_members: return outbox.send(ctx.channel, "No one is online!")
 
         amount_per_person = amount // len(online_members)
-        if amount_per_person < 1: return await ctx.send("Amount too small.")
+        if amount_per_person < 1: return outbox.send(ctx.channel, "Amount too small.")
 
         bank_reserves = await self.get_bank_reserves()
-        if bank_reserves < amount: return await ctx.send(f"❌ Bank only has {bank_reserves} 💎.")
+        if bank_reserves < amount: return outbox.send(ctx.channel, f"❌ Bank only has {bank_reserves} 💎.")
 
         for member in online_members:
             await self.ensure_user(member.id)
             await self.payout_from_bank(member.id, amount_per_person, "Airdrop")
         
-        await ctx.send(f"🎈 Global Airdrop! **{amount:,} 💎** distributed to {len(online_members)} citizens ({amount_per_person:,} each).")
-
-        for guild in self.bot.guilds:
-            if guild.voice_client and guild.voice_client.is_connected():
-                channel = guild.voice_client.channel
-                for member in channel.members:
-                    if not member.bot:
-                        data = await self.get_user_data(member.id)
-                        if not data: continue
-                        
-                        base_income = 1
-                        if data["level"] >= 20: base_income = 3
-                        elif data["level"] >= 10: base_income = 2
-                        
-                        final_income = int(base_income * multiplier)
-                        if final_income > 0:
-                            if await self.payout_from_bank(member.id, final_income, "Passive"):
-                                await self.add_xp(member.id, PASSIVE_XP_MINUTE, channel=None)
+        outbox.send(ctx.channel, f"🎈 Global Airdrop! **{amount:,} 💎** distributed to {len(online_members)} citizens ({amount_per_person:,} each).")
 
     @award_points.before_loop
     async def before_award_points(self):
         await self.bot.wait_until_ready()
+        # Already in voice (reconnect after a restart): start those clocks now
+        for guild in self.bot.guilds:
+            self.voice_clock.sync(guild.id, self.listeners(guild))
+
+    def online_members(self, guilds):
+        """Online humans across guilds, each once."""
+        members = {}
+        for guild in guilds:
+            for m in guild.members:
+                if not m.bot and m.status != discord.Status.offline:
+                    members.setdefault(m.id, m)
+        return list(members.values())
+
+    async def airdrop_clusters(self, ctx, amount):
+        """
+        Cluster-wide airdrop: the per-person amount comes from every cluster's heartbeat, then
+        each cluster pays its own online users. A shared Redis set pays users who sit in guilds
+        on several clusters once, and a shared budget caps the total at `amount`.
+        """
+        bus = self.bot.cluster_bus
+        online = sum(m["online"] for m in (await bus.members()).values())
+        if not online: return outbox.send(ctx.channel, "No one is online!")
+
+        amount_per_person = amount // online
+        if amount_per_person < 1: return outbox.send(ctx.channel, "Amount too small.")
+
+        bank_reserves = await self.get_bank_reserves()
+        if bank_reserves < amount: return outbox.send(ctx.channel, f"❌ Bank only has {bank_reserves} 💎.")
+
+        airdrop_id = uuid.uuid4().hex
+        redis = RedisClient.get()
+        await redis.set(f"airdrop:{airdrop_id}:budget", amount, ex=AIRDROP_TTL)
+        receivers = await bus.broadcast("airdrop", airdrop_id=airdrop_id, per_person=amount_per_person)
+        outbox.send(ctx.channel, f"🎈 Global Airdrop of **{amount:,} 💎** sent to {receivers} clusters ({amount_per_person:,} each)...")
+
+        deadline = time.monotonic() + AIRDROP_REPORT_TIMEOUT
+        while time.monotonic() < deadline and await redis.scard(f"airdrop:{airdrop_id}:done") < receivers:
+            await asyncio.sleep(1)
+        reported = await redis.scard(f"airdrop:{airdrop_id}:done")
+        paid = int(await redis.get(f"airdrop:{airdrop_id}:paid") or 0)
+        note = "" if reported >= receivers else f" ({receivers - reported} clusters still running)"
+        outbox.send(ctx.channel, f"🎈 Airdrop done: {paid:,} citizens got {amount_per_person:,} 💎{note}.")
+
+    async def on_cluster_airdrop(self, message):
+        airdrop_id, per_person = message["airdrop_id"], message["per_person"]
+        redis = RedisClient.get()
+        users_key, budget_key = f"airdrop:{airdrop_id}:users", f"airdrop:{airdrop_id}:budget"
+        paid = 0
+        for member in self.online_members(self.bot.guilds):
+            if not await redis.sadd(users_key, member.id):
+                continue  # already paid by another cluster
+            if await redis.decrby(budget_key, per_person) < 0:
+                break
+            await self.ensure_user(member.id)
+            if await self.payout_from_bank(member.id, per_person, "Airdrop"):
+                paid += 1
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.expire(users_key, AIRDROP_TTL)
+            pipe.incrby(f"airdrop:{airdrop_id}:paid", paid)
+            pipe.expire(f"airdrop:{airdrop_id}:paid", AIRDROP_TTL)
+            pipe.sadd(f"airdrop:{airdrop_id}:done", cluster.cluster_id)
+            pipe.expire(f"airdrop:{airdrop_id}:done", AIRDROP_TTL)
+            await pipe.execute()
+        print(f"🎈 Airdrop {airdrop_id}: paid {paid} users on cluster {cluster.cluster_id}")
 
     # --- COMMANDS ---
 
@@ -260,7 +389,7 @@ class EconomyCog(commands.Cog):
         embed.add_field(name="Solvency Ratio", value=f"**{ratio:.1f}%**", inline=True)
         embed.add_field(name="Economic Status", value=status, inline=False)
         embed.set_footer(text="Bank Funds = Total Supply - User Holdings")
-        await ctx.send(embed=embed)
+        outbox.send(ctx.channel, embed=embed)
 
     @commands.command(name="profile", aliases=["p", "wallet", "bal"], help="Check your profile")
     async def profile(self, ctx, member: discord.Member = None):
@@ -291,7 +420,7 @@ class EconomyCog(commands.Cog):
         embed.add_field(name="Wallet 💎", value=f"**{balance}** Diamonds", inline=True)
         embed.add_field(name="Badges 🏅", value=badges, inline=False)
         embed.add_field(name="Inventory 🎒", value=inventory, inline=False)
-        await ctx.send(embed=embed)
+        outbox.send(ctx.channel, embed=embed)
 
     @commands.command(name="shop", help="View items for sale")
     async def shop(self, ctx):
@@ -302,7 +431,7 @@ class EconomyCog(commands.Cog):
                 item_list.append(f"`{key.ljust(10)}` {data['name']} (**{data['price']:,} 💎**)")
             embed.add_field(name=f"--- {category} ---", value="\n".join(item_list), inline=False)
         embed.set_footer(text="Use !buy <item id>")
-        await ctx.send(embed=embed)
+        outbox.send(ctx.channel, embed=embed)
 
     @commands.command(name="buy", help="Buy an item from the shop")
     async def buy(self, ctx, *, item_key: str):
@@ -313,7 +442,7 @@ class EconomyCog(commands.Cog):
         for category, items in SHOP_ITEMS.items():
             if item_key in items: target_item = items[item_key]; break
         
-        if not target_item: return await ctx.send("Item not found. Check `!shop`.")
+        if not target_item: return outbox.send(ctx.channel, "Item not found. Check `!shop`.")
         price, name = target_item["price"], target_item["name"]
         
         # Consumable Logic
@@ -321,29 +450,30 @@ class EconomyCog(commands.Cog):
             if await self.pay_to_bank(user_id, price, "Buy Skip"):
                  music_cog = self.bot.get_cog("MusicCog")
                  if music_cog and ctx.voice_client and ctx.voice_client.is_playing():
-                     await ctx.send(f"💎 **{ctx.author.name}** bought a SKIP!")
+                     outbox.send(ctx.channel, f"💎 **{ctx.author.name}** bought a SKIP!")
                      await music_cog.skip(ctx)
                  else:
                      await self.payout_from_bank(user_id, price, "Refund Skip")
-                     await ctx.send("Nothing playing! Refunded.")
-            else: await ctx.send(f"You need **{price} 💎**!")
+                     outbox.send(ctx.channel, "Nothing playing! Refunded.")
+            else: outbox.send(ctx.channel, f"You need **{price} 💎**!")
             return
 
         # Permanent Logic
         data = await self.get_user_data(user_id)
-        if name in (data['inventory'] or []): return await ctx.send(f"You already own **{name}**!")
+        if name in (data['inventory'] or []): return outbox.send(ctx.channel, f"You already own **{name}**!")
             
         if await self.pay_to_bank(user_id, price, f"Buy {name}"):
             pool = await Database.get_pool()
-            async with pool.acquire() as conn:
-                await conn.execute("UPDATE users SET inventory = array_append(inventory, $2) WHERE user_id = $1", user_id, name)
-            await ctx.send(f"🛍️ Bought **{name}** for {price:,} 💎! (Funds returned to Bank)")
-        else: await ctx.send(f"You need **{price:,} 💎**!")
+            await queries.ADD_ITEM.fetchval(pool, user_id, name)
+            Database.pin(user_id)
+            await events.publish(events.ECONOMY, "item_bought", user_id=user_id, item=name, price=price)
+            outbox.send(ctx.channel, f"🛍️ Bought **{name}** for {price:,} 💎! (Funds returned to Bank)")
+        else: outbox.send(ctx.channel, f"You need **{price:,} 💎**!")
 
     @commands.command(name="pay", help="Pay another user (5% Tax)")
     async def pay(self, ctx, member: discord.Member, amount: int):
-        if amount <= 0: return await ctx.send("Amount must be positive.")
-        if member.bot or member.id == ctx.author.id: return await ctx.send("Invalid recipient.")
+        if amount <= 0: return outbox.send(ctx.channel, "Amount must be positive.")
+        if member.bot or member.id == ctx.author.id: return outbox.send(ctx.channel, "Invalid recipient.")
         
         # Tax Calculation
         tax = int(amount * 0.05)
@@ -360,18 +490,18 @@ class EconomyCog(commands.Cog):
             # Step 2: Pay Recipient from Bank
             await self.payout_from_bank(member.id, recipient_receives, f"Payment from {ctx.author.name}")
             
-            await ctx.send(f"💸 **{ctx.author.name}** sent **{amount} 💎** to {member.mention}.\n(Tax: {tax} 💎, Recipient got: {recipient_receives} 💎)")
+            outbox.send(ctx.channel, f"💸 **{ctx.author.name}** sent **{amount} 💎** to {member.mention}.\n(Tax: {tax} 💎, Recipient got: {recipient_receives} 💎)")
         else:
-            await ctx.send("Insufficient funds!")
+            outbox.send(ctx.channel, "Insufficient funds!")
 
     @commands.command(name="coinflip", aliases=["cf"], help="Bet against the House (50/50)")
     async def coinflip(self, ctx, amount: int):
-        if amount <= 0: return await ctx.send("Bet must be positive.")
+        if amount <= 0: return outbox.send(ctx.channel, "Bet must be positive.")
         
         # Check Table Limits (0.1% of Reserves)
         reserves = await self.get_bank_reserves()
         max_bet = int(reserves * 0.001)
-        if amount > max_bet: return await ctx.send(f"Table Limit Exceeded! Max bet is **{max_bet:,} 💎** (0.1% of Bank).")
+        if amount > max_bet: return outbox.send(ctx.channel, f"Table Limit Exceeded! Max bet is **{max_bet:,} 💎** (0.1% of Bank).")
 
         # 1. Take Bet (User -> Bank)
         if await self.pay_to_bank(ctx.author.id, amount, "CF Bet"):
@@ -380,21 +510,21 @@ class EconomyCog(commands.Cog):
                 winnings = int(amount * COINFLIP_MULTIPLIER)
                 # 2. Pay Winnings (Bank -> User)
                 if await self.payout_from_bank(ctx.author.id, winnings, "CF Win"):
-                    await ctx.send(f"🪙 **Heads!** You won **{winnings} 💎**!")
+                    outbox.send(ctx.channel, f"🪙 **Heads!** You won **{winnings} 💎**!")
                 else: 
                      # CRITICAL FAILURE (Bankrupt)
-                     await ctx.send(f"🪙 **Heads!** ... but the Bank is broke! 😱 (IOU Issued)")
+                     outbox.send(ctx.channel, f"🪙 **Heads!** ... but the Bank is broke! 😱 (IOU Issued)")
             else:
-                await ctx.send(f"🪙 **Tails!** The House wins **{amount} 💎**.")
+                outbox.send(ctx.channel, f"🪙 **Tails!** The House wins **{amount} 💎**.")
         else:
-            await ctx.send("Insufficient funds!")
+            outbox.send(ctx.channel, "Insufficient funds!")
 
     @commands.command(name="slots", help="Bet on Slots (House Edge)")
     async def slots(self, ctx, amount: int):
-        if amount <= 0: return await ctx.send("Bet must be positive.")
+        if amount <= 0: return outbox.send(ctx.channel, "Bet must be positive.")
         reserves = await self.get_bank_reserves()
         max_bet = int(reserves * 0.001)
-        if amount > max_bet: return await ctx.send(f"Table Limit Exceeded! Max bet is **{max_bet:,} 💎**.")
+        if amount > max_bet: return outbox.send(ctx.channel, f"Table Limit Exceeded! Max bet is **{max_bet:,} 💎**.")
             
         if await self.pay_to_bank(ctx.author.id, amount, "Slots Bet"):
             # Logic: House takes bet. If win, House pays multiplier.
@@ -407,19 +537,19 @@ class EconomyCog(commands.Cog):
                     result = [random.choice(SLOTS_SYMBOLS) for _ in range(3)]
                     if len(set(result)) > 1: break # Not all same
             
-            await ctx.send(f"🎰 | {' | '.join(result)} | 🎰")
+            outbox.send(ctx.channel, f"🎰 | {' | '.join(result)} | 🎰")
             
             if is_win:
                 winnings = int(amount * SLOTS_MULTIPLIER)
                 if await self.payout_from_bank(ctx.author.id, winnings, "Slots Jackpot"):
-                    await ctx.send(f"🚨 **JACKPOT!** You won **{winnings} 💎**!")
+                    outbox.send(ctx.channel, f"🚨 **JACKPOT!** You won **{winnings} 💎**!")
                     await self.check_rich_badge(ctx.author.id) # Re-check badge
                 else:
-                    await ctx.send("🚨 **JACKPOT!** ... The Bank cannot pay! 💀")
+                    outbox.send(ctx.channel, "🚨 **JACKPOT!** ... The Bank cannot pay! 💀")
             else:
-                await ctx.send("Better luck next time!")
+                outbox.send(ctx.channel, "Better luck next time!")
         else:
-            await ctx.send("Insufficient funds!")
+            outbox.send(ctx.channel, "Insufficient funds!")
 
     @commands.command(name="rain", aliases=["hongbao", "rp"], help="Distribute YOUR money")
     async def rain(self, ctx, amount: int, delay: int = 0):
@@ -427,25 +557,33 @@ class EconomyCog(commands.Cog):
         # Implementation: User pays Bank. Bank distributes to Users.
         # This keeps it clean.
         ALLOWED_TIERS = [120, 480, 980, 4800]
-        if amount not in ALLOWED_TIERS: return await ctx.send(f"Allowed tiers: {ALLOWED_TIERS}")
+        if amount not in ALLOWED_TIERS: return outbox.send(ctx.channel, f"Allowed tiers: {ALLOWED_TIERS}")
         
-        if not ctx.author.voice or not ctx.author.voice.channel: return await ctx.send("Join VC first!")
+        if not ctx.author.voice or not ctx.author.voice.channel: return outbox.send(ctx.channel, "Join VC first!")
 
         if await self.pay_to_bank(ctx.author.id, amount, "Rain Deposit"):
             due_time = time.time() + (delay * 60)
             rain_data = {
+                "id": uuid.uuid4().hex,
                 "sender_id": ctx.author.id, "sender_name": ctx.author.name,
                 "amount": amount, "due_time": due_time,
                 "channel_id": ctx.author.voice.channel.id, "guild_id": ctx.guild.id
             }
-            self.pending_rains.append(rain_data)
             if delay == 0:
                 await self.process_rain(rain_data)
-                self.pending_rains.remove(rain_data)
             else:
-                await ctx.send(f"🌧️ Scheduled Rain in {delay} mins!")
+                await self.schedule_rain(rain_data)
+                outbox.send(ctx.channel, f"🌧️ Scheduled Rain in {delay} mins!")
         else:
-            await ctx.send("Insufficient funds!")
+            outbox.send(ctx.channel, "Insufficient funds!")
+
+    async def schedule_rain(self, rain_data):
+        # In Redis the deposit survives a restart and any cluster can see it
+        try:
+            await RedisClient.get().zadd(RAINS_KEY, {json.dumps(rain_data): rain_data["due_time"]})
+        except Exception as e:
+            print(f"⚠️ Redis unavailable, rain kept in memory: {e}")
+            self.pending_rains.append(rain_data)
 
     async def process_rain(self, rain_data):
         # Logic matches previous, but uses payout_from_bank
@@ -473,18 +611,26 @@ class EconomyCog(commands.Cog):
                 await self.payout_from_bank(m.id, amt, "Rain Catch")
                 msg.append(f"> {m.mention} got {amt}")
         
-        await channel.send("\n".join(msg))
+        # Long payout lists are split at 2,000 characters by the outbox
+        outbox.send(channel, "\n".join(msg))
 
     @tasks.loop(seconds=60)
     async def check_rains(self):
-        # ... (Same logic, just calls process_rain)
         now = time.time()
-        to_remove = []
-        for r in self.pending_rains:
-            if now >= r["due_time"]:
-                await self.process_rain(r)
-                to_remove.append(r)
-        for r in to_remove: self.pending_rains.remove(r)
+        to_remove = [r for r in self.pending_rains if now >= r["due_time"]]
+        for r in to_remove:
+            self.pending_rains.remove(r)
+            await self.process_rain(r)
+
+        try:
+            redis = RedisClient.get()
+            for raw in await redis.zrangebyscore(RAINS_KEY, "-inf", now):
+                r = json.loads(raw)
+                # The guild's own cluster pays out; ZREM decides if two processes look at once
+                if cluster.owns_guild(r["guild_id"]) and await redis.zrem(RAINS_KEY, raw):
+                    await self.process_rain(r)
+        except Exception as e:
+            print(f"⚠️ Could not check scheduled rains: {e}")
     
     @check_rains.before_loop
     async def before_check_rains(self): await self.bot.wait_until_ready()
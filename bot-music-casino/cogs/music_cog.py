@@ -1,16 +1,33 @@
 import discord
 from discord.ext import commands, tasks
-import yt_dlp
 import asyncio
 import subprocess
 import shlex
 import os
 import json
 import redis.asyncio as redis
+import asyncpg
 from common.database.db import Database
-
-# Suppress noisy yt-dlp logs
-yt_dlp.utils.std_headers['User-Agent'] = 'Mozilla/5.0'
+from common import metrics
+from common.startup import profiler
+from common.redis_client import RedisClient
+from common.outbox import outbox
+from music import playlists
+from music.player import GuildPlayer, QUEUE_TOMBSTONE, queue_key, state_key
+from music.supervisor import FFmpegSupervisor, SupervisedSource
+from music.idle import IdleTracker
+
+_yt_dlp = None
+
+def ytdl(options):
+    """YoutubeDL instance. yt-dlp is imported on first use, not at startup (it is slow to import)."""
+    global _yt_dlp
+    if _yt_dlp is None:
+        import yt_dlp
+        # Suppress noisy yt-dlp logs
+        yt_dlp.utils.std_headers['User-Agent'] = 'Mozilla/5.0'
+        _yt_dlp = yt_dlp
+    return _yt_dlp.YoutubeDL(options)
 
 YDL_OPTIONS = {
     'format': 'bestaudio/best',
@@ -21,6 +38,23 @@ YDL_OPTIONS = {
     'source_address': '0.0.0.0',
 }
 
+# Playlist/mix import uses flat extraction: entries come back as id + title only
+# and each one is fully resolved by play_music right before it plays.
+PLAYLIST_IMPORT_LIMIT = 10000
+YDL_PLAYLIST_OPTIONS = {
+    **YDL_OPTIONS,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+    'playlistend': PLAYLIST_IMPORT_LIMIT,
+}
+
+QUEUE_PAGE_SIZE = 10
+# Seconds the bot may sit alone or not playing before it leaves the channel.
+IDLE_TIMEOUT = int(os.getenv('MUSIC_IDLE_TIMEOUT', 300))
+REDIS_PUSH_CHUNK = 1000
+# Guilds whose Redis state is fetched per round trip on startup.
+RESTORE_CHUNK = 50
+
 FFMPEG_OPTIONS = {
     'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
     'options': '-vn'
@@ -36,86 +70,150 @@ FILTERS = {
 class MusicCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.music_queue = []
-        self.current_song = None
-        self.volume_level = 0.5
-        self.loop_mode = "off"
-        self.active_filter = "normal"
-        self.consecutive_errors = 0 # Prevent infinite loops
+        self.players = {}  # guild_id -> GuildPlayer
         
+        self.redis = RedisClient.get()  # shared per process; host is checked in cog_load
         
-        # Smart Redis URL detection
-        redis_url = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-        # If native (windows), verify we can actually resolve 'redis' hostname.
-        # If not, fallback to localhost.
-        try:
-             import socket
-             host = redis_url.split('@')[-1].split(':')[0].replace('//', '') # naive parse
-             socket.gethostbyname(host)
-        except:
-             print("⚠️ Could not resolve Redis host. Falling back to localhost.")
-             redis_url = 'redis://localhost:6379/0'
-
-        self.redis = redis.from_url(redis_url, decode_responses=True)
-        
-        self.inactivity_check.start()
+        self.supervisor = FFmpegSupervisor(self.bot.loop)
+        self.ffmpeg_watchdog.start()
+        self.idle = IdleTracker(IDLE_TIMEOUT, self.on_idle_timeout)
+        self.idle.start()
         if not os.path.exists('./cache'):
             os.makedirs('./cache')
             
         self.bot.loop.create_task(self.restore_state())
 
+    async def cog_load(self):
+        with profiler.phase("redis"):
+            # Native runs can't resolve the compose hostname; the check falls back to localhost
+            if not await RedisClient.check():
+                print("⚠️ Queue state won't persist until Redis is up.")
+            self.redis = RedisClient.get()
+
+    def player(self, guild_id) -> GuildPlayer:
+        player = self.players.get(guild_id)
+        if player is None:
+            player = self.players[guild_id] = GuildPlayer()
+        return player
+
     async def restore_state(self):
         await self.bot.wait_until_ready()
-        # In a real multi-guild bot, iterate all guilds. 
-        # For simplicity, we skip auto-restore on boot for now to avoid complexity of getting guild IDs without events.
-        pass
+        # Import yt-dlp in the background now that we're online, so the first !play doesn't pay for it
+        await self.bot.loop.run_in_executor(None, ytdl, YDL_OPTIONS)
+        # Queues and settings outlive the process in Redis. bot.guilds only holds the guilds on
+        # our shards, so in cluster mode each worker restores exactly the guilds it serves.
+        try:
+            restored = 0
+            guild_ids = [g.id for g in self.bot.guilds]
+            for i in range(0, len(guild_ids), RESTORE_CHUNK):
+                chunk = guild_ids[i:i + RESTORE_CHUNK]
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for guild_id in chunk:
+                        pipe.hgetall(state_key(guild_id))
+                        pipe.lrange(queue_key(guild_id), 0, -1)
+                    results = await pipe.execute()
+                for guild_id, state, songs in zip(chunk, results[::2], results[1::2]):
+                    # Guilds that already used a command since startup keep their live state
+                    if guild_id in self.players or not (state or songs): continue
+                    self.players[guild_id] = GuildPlayer.restore(state, songs)
+                    restored += 1
+                    if state.get("current"):
+                        # The interrupted song is back in the queue; make the Redis copy match
+                        await self.save_state(guild_id)
+            if restored: print(f"🎵 Restored music state for {restored} guilds.")
+        except Exception as e:
+            print(f"⚠️ Music state not restored: {e}")
 
     async def save_state(self, guild_id):
-        key = f"music_queue:{guild_id}"
-        await self.redis.delete(key)
-        if self.music_queue:
-            json_songs = [json.dumps(s) for s in self.music_queue]
-            await self.redis.rpush(key, *json_songs)
-        
-        await self.redis.hset(f"music_state:{guild_id}", mapping={
-            "loop_mode": self.loop_mode,
-            "filter": self.active_filter
-        })
-
-    def get_ffmpeg_options(self, start_timestamp="00:00:00"):
+        # Full rewrite. Hot paths (advance/append/remove) use the incremental helpers below.
+        player = self.player(guild_id)
+        key = queue_key(guild_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            json_songs = [json.dumps(s) for s in player.queue]
+            for i in range(0, len(json_songs), REDIS_PUSH_CHUNK):
+                pipe.rpush(key, *json_songs[i:i + REDIS_PUSH_CHUNK])
+            pipe.hset(state_key(guild_id), mapping=player.state())
+            await pipe.execute()
+
+    async def update_state(self, guild_id, push=(), pop=0, current=None):
+        """Mirrors tail appends, head pops and a newly started song to Redis without rewriting the list."""
+        key = queue_key(guild_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            json_songs = [json.dumps(s) for s in push]
+            for i in range(0, len(json_songs), REDIS_PUSH_CHUNK):
+                pipe.rpush(key, *json_songs[i:i + REDIS_PUSH_CHUNK])
+            if pop: pipe.lpop(key, pop)
+            if current: pipe.hset(state_key(guild_id), "current", json.dumps(current))
+            await pipe.execute()
+
+    async def remove_state(self, guild_id, index, bump=None):
+        """Drops one entry (optionally re-adding it at the head) via LSET + LREM."""
+        key = queue_key(guild_id)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.lset(key, index, QUEUE_TOMBSTONE)
+                pipe.lrem(key, 1, QUEUE_TOMBSTONE)
+                if bump: pipe.lpush(key, json.dumps(bump))
+                await pipe.execute()
+        except redis.ResponseError:
+            # Redis copy drifted from memory; resync it.
+            await self.save_state(guild_id)
+
+    @staticmethod
+    def get_ffmpeg_options(active_filter="normal", start_timestamp="00:00:00"):
         options = FFMPEG_OPTIONS.copy()
         options['before_options'] = f"-ss {start_timestamp} " + options['before_options']
-        filter_str = FILTERS.get(self.active_filter, "")
+        filter_str = FILTERS.get(active_filter, "")
         if filter_str:
             options['options'] += f' -af "{filter_str}"'
         return options
 
     async def play_music(self, ctx, song, start_timestamp="00:00:00"):
         url = song['url']
+        player = self.player(ctx.guild.id)
         try:
-            ffmpeg_opts = self.get_ffmpeg_options(start_timestamp)
+            ffmpeg_opts = self.get_ffmpeg_options(player.active_filter, start_timestamp)
             ffmpeg_exec = './ffmpeg' if os.path.isfile('./ffmpeg') else 'ffmpeg'
             
             loop = self.bot.loop or asyncio.get_event_loop()
-            data = await loop.run_in_executor(None, lambda: yt_dlp.YoutubeDL(YDL_OPTIONS).extract_info(url, download=False))
+            with metrics.YTDL_SECONDS.time(kind="stream"):
+                data = await loop.run_in_executor(None, lambda: ytdl(YDL_OPTIONS).extract_info(url, download=False))
             if 'entries' in data: data = data['entries'][0]
             stream_url = data['url']
-            
-            source = discord.FFmpegPCMAudio(stream_url, executable=ffmpeg_exec, **ffmpeg_opts)
-            volume_source = discord.PCMVolumeTransformer(source, volume=self.volume_level)
+            # Lazily imported playlist entries only carry id + title until now.
+            song['title'] = song.get('title') or data.get('title', url)
+            song['duration'] = song.get('duration') or data.get('duration', 0)
             
             if ctx.voice_client is None:
                 if ctx.author.voice:
                     await ctx.author.voice.channel.connect()
                 else:
-                    return await ctx.send("You are not in a voice channel.")
+                    return outbox.send(ctx.channel, "You are not in a voice channel.")
 
             if ctx.voice_client:
-                if ctx.voice_client.is_playing(): ctx.voice_client.stop()
-                ctx.voice_client.play(volume_source, after=lambda e: self.check_queue(ctx, e))
+                # Waits here if the host is at its transcode cap; respawns reuse the guild's slot.
+                await self.supervisor.acquire(ctx.guild.id)
+                try:
+                    source = discord.FFmpegPCMAudio(stream_url, executable=ffmpeg_exec, **ffmpeg_opts)
+                except Exception:
+                    self.supervisor.release(ctx.guild.id)
+                    raise
+                volume_source = SupervisedSource(source, self.supervisor, ctx.guild.id, ctx.voice_client, volume=player.volume)
+                try:
+                    self.supervisor.attach(ctx.guild.id, volume_source)
+
+                    if ctx.voice_client.is_playing(): ctx.voice_client.stop()
+                    # Streams the supervisor killed (stalls) are already accounted for; don't count them as player errors.
+                    ctx.voice_client.play(volume_source, after=lambda e: self.check_queue(ctx, None if volume_source.killed else e))
+                except Exception:
+                    # Never reached the player: kill ffmpeg and free the slot ourselves
+                    volume_source.cleanup()
+                    raise
+                self.refresh_idle(ctx.guild)
                 
                 if start_timestamp == "00:00:00":
-                    self.consecutive_errors = 0 # Reset error count on success
+                    player.consecutive_errors = 0 # Reset error count on success
                     await self.send_now_playing(ctx, song)
                     if 'requester_id' in song:
                         try:
@@ -125,65 +223,73 @@ class MusicCog(commands.Cog):
                             print(f"⚠️ Economy XP Failed: {e}")
         
         except Exception as e:
-            await ctx.send(f"Error playing {song['title']}: {e}")
+            outbox.send(ctx.channel, f"Error playing {song['title']}: {e}")
             self.check_queue(ctx, e)
 
     def check_queue(self, ctx, error):
+        player = self.player(ctx.guild.id)
         if error: 
             print(f"Player error: {error}")
-            self.consecutive_errors += 1
-            if self.consecutive_errors > 5:
+            player.consecutive_errors += 1
+            if player.consecutive_errors > 5:
                 print("❌ Too many consecutive errors. Stopping queue to prevent spam.")
-                self.music_queue = []
-                asyncio.run_coroutine_threadsafe(ctx.send("Stopped playback due to too many errors."), self.bot.loop)
-                self.current_song = None
+                player.queue.clear()
+                outbox.send_threadsafe(self.bot.loop, ctx.channel, "Stopped playback due to too many errors.")
+                player.current_song = None
                 return
 
-        if self.loop_mode == "song" and self.current_song:
+        if player.loop_mode == "song" and player.current_song:
             if error:
                  # If we errored on loop, maybe wait a bit or stop? 
                  # For now, just retry (handled by consecutive_errors check above)
                  pass
-            asyncio.run_coroutine_threadsafe(self.play_music(ctx, self.current_song), self.bot.loop)
+            asyncio.run_coroutine_threadsafe(self.play_music(ctx, player.current_song), self.bot.loop)
             return
 
-        if self.loop_mode == "queue" and self.current_song:
-            self.music_queue.append(self.current_song)
-            asyncio.run_coroutine_threadsafe(self.save_state(ctx.guild.id), self.bot.loop)
+        requeued = []
+        if player.loop_mode == "queue" and player.current_song:
+            player.queue.append(player.current_song)
+            requeued.append(player.current_song)
 
-        if len(self.music_queue) > 0:
-            next_song = self.music_queue.pop(0)
-            self.current_song = next_song
+        next_song = player.queue.pop_next()
+        if next_song:
+            player.current_song = next_song
             asyncio.run_coroutine_threadsafe(self.play_music(ctx, next_song), self.bot.loop)
-            asyncio.run_coroutine_threadsafe(self.save_state(ctx.guild.id), self.bot.loop)
+            asyncio.run_coroutine_threadsafe(self.update_state(ctx.guild.id, push=requeued, pop=1, current=next_song), self.bot.loop)
         else:
-            self.current_song = None
+            player.current_song = None
             asyncio.run_coroutine_threadsafe(self.save_state(ctx.guild.id), self.bot.loop)
+            self.bot.loop.call_soon_threadsafe(self.refresh_idle, ctx.guild)
 
     async def send_now_playing(self, ctx, song):
+        player = self.player(ctx.guild.id)
         embed = discord.Embed(title="Now Playing 🎶", description=f"[{song['title']}]({song['url']})", color=discord.Color.green())
         status = []
-        if self.loop_mode != "off": status.append(f"🔁 {self.loop_mode.capitalize()}")
-        if self.active_filter != "normal": status.append(f"🎚️ {self.active_filter.capitalize()}")
+        if player.loop_mode != "off": status.append(f"🔁 {player.loop_mode.capitalize()}")
+        if player.active_filter != "normal": status.append(f"🎚️ {player.active_filter.capitalize()}")
         if status: embed.set_footer(text=" | ".join(status))
-        await ctx.send(embed=embed)
+        outbox.send(ctx.channel, embed=embed)
 
     @commands.command(name="join")
     async def join(self, ctx):
         if ctx.author.voice:
             if ctx.voice_client: await ctx.voice_client.move_to(ctx.author.voice.channel)
             else: await ctx.author.voice.channel.connect()
-        else: await ctx.send("Join a voice channel first!")
+            self.refresh_idle(ctx.guild)
+        else: outbox.send(ctx.channel, "Join a voice channel first!")
 
     @commands.command(name="play", help="Play a song")
     async def play(self, ctx, *, search: str):
-        if not ctx.author.voice: return await ctx.send("Join VC first!")
+        if not ctx.author.voice: return outbox.send(ctx.channel, "Join VC first!")
         if not ctx.voice_client: await ctx.author.voice.channel.connect()
         
         async with ctx.typing():
             try:
-                with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
-                    info = await self.bot.loop.run_in_executor(None, lambda: ydl.extract_info(f"ytsearch:{search}", download=False)['entries'][0])
+                if self.is_playlist_url(search):
+                    return await self.import_playlist(ctx, search)
+
+                with metrics.YTDL_SECONDS.time(kind="search"):
+                    info = await self.bot.loop.run_in_executor(None, lambda: ytdl(YDL_OPTIONS).extract_info(f"ytsearch:{search}", download=False)['entries'][0])
                 
                 song = {
                     'url': info['webpage_url'], 
@@ -192,141 +298,300 @@ class MusicCog(commands.Cog):
                     'duration': info.get('duration', 0)
                 }
 
+                player = self.player(ctx.guild.id)
                 if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
-                    self.music_queue.append(song)
-                    await self.save_state(ctx.guild.id)
-                    await ctx.send(f"Added to queue: **{song['title']}**")
+                    player.queue.append(song)
+                    await self.update_state(ctx.guild.id, push=[song])
+                    outbox.send(ctx.channel, f"Added to queue: **{song['title']}**")
                 else:
-                    self.current_song = song
+                    player.current_song = song
                     await self.play_music(ctx, song)
                     await self.save_state(ctx.guild.id)
             except Exception as e:
-                await ctx.send(f"Error: {e}")
+                outbox.send(ctx.channel, f"Error: {e}")
+
+    @staticmethod
+    def is_playlist_url(search):
+        return search.startswith(("http://", "https://")) and ("list=" in search or "/playlist" in search)
+
+    async def import_playlist(self, ctx, url):
+        """Queues a playlist/mix from a flat extraction (ids + titles only)."""
+        with metrics.YTDL_SECONDS.time(kind="playlist"):
+            info = await self.bot.loop.run_in_executor(
+                None, lambda: ytdl(YDL_PLAYLIST_OPTIONS).extract_info(url, download=False)
+            )
+        songs = []
+        for entry in info.get('entries') or []:
+            if not entry: continue
+            songs.append({
+                'url': entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}",
+                'title': entry.get('title') or entry.get('id'),
+                'requester_id': ctx.author.id,
+                'duration': entry.get('duration') or 0
+            })
+        if not songs: return outbox.send(ctx.channel, "Playlist is empty or unavailable.")
+
+        player = self.player(ctx.guild.id)
+        player.queue.extend(songs)
+        await self.update_state(ctx.guild.id, push=songs)
+        outbox.send(ctx.channel, f"Queued **{len(songs)}** songs from **{info.get('title') or 'playlist'}**.")
+        if not (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()) and not player.current_song:
+            self.check_queue(ctx, None)
 
     @commands.command(name="skip")
     async def skip(self, ctx):
         if ctx.voice_client and ctx.voice_client.is_playing():
-            temp_loop = self.loop_mode
-            if self.loop_mode == "song":
-                self.loop_mode = "off"
+            player = self.player(ctx.guild.id)
+            if player.loop_mode == "song":
+                player.loop_mode = "off"
             ctx.voice_client.stop()
-            await ctx.send("Skipped ⏭️")
+            outbox.send(ctx.channel, "Skipped ⏭️")
 
     @commands.command(name="loop")
     async def loop(self, ctx, mode: str):
         if mode in ["off", "song", "queue"]:
-            self.loop_mode = mode
+            self.player(ctx.guild.id).loop_mode = mode
             await self.save_state(ctx.guild.id)
-            await ctx.send(f"Loop mode: **{mode}**")
-        else: await ctx.send("Modes: off, song, queue")
+            outbox.send(ctx.channel, f"Loop mode: **{mode}**")
+        else: outbox.send(ctx.channel, "Modes: off, song, queue")
 
     @commands.command(name="filter")
     async def filter(self, ctx, filter_name: str):
         if filter_name in FILTERS:
-            self.active_filter = filter_name
+            self.player(ctx.guild.id).active_filter = filter_name
             await self.save_state(ctx.guild.id)
-            await ctx.send(f"Filter set to: **{filter_name}**.")
-        else: await ctx.send(f"Filters: {', '.join(FILTERS.keys())}")
+            outbox.send(ctx.channel, f"Filter set to: **{filter_name}**.")
+        else: outbox.send(ctx.channel, f"Filters: {', '.join(FILTERS.keys())}")
 
     @commands.command(name="seek")
     async def seek(self, ctx, timestamp: str):
-        if ctx.voice_client and ctx.voice_client.is_playing() and self.current_song:
-            await ctx.send(f"Seeking to {timestamp}...")
-            await self.play_music(ctx, self.current_song, start_timestamp=timestamp)
-
-    @commands.command(name="queue")
-    async def queue(self, ctx):
-        if not self.music_queue and not self.current_song: return await ctx.send("Queue empty.")
+        player = self.player(ctx.guild.id)
+        if ctx.voice_client and ctx.voice_client.is_playing() and player.current_song:
+            outbox.send(ctx.channel, f"Seeking to {timestamp}...")
+            await self.play_music(ctx, player.current_song, start_timestamp=timestamp)
+
+    @commands.command(name="queue", help="Show the queue (paged)")
+    async def queue(self, ctx, page: int = 1):
+        player = self.player(ctx.guild.id)
+        if not player.queue and not player.current_song: return outbox.send(ctx.channel, "Queue empty.")
+        pages = player.queue.page_count(QUEUE_PAGE_SIZE)
+        page = max(1, min(page, pages))
         desc = ""
-        if self.current_song: desc += f"**Now Playing**: {self.current_song['title']}\n\n"
+        if player.current_song: desc += f"**Now Playing**: {player.current_song['title']}\n\n"
         desc += "**Up Next**:\n"
-        for i, s in enumerate(self.music_queue[:10]): desc += f"{i+1}. {s['title']}\n"
+        start = (page - 1) * QUEUE_PAGE_SIZE + 1
+        for i, s in enumerate(player.queue.page(page, QUEUE_PAGE_SIZE), start): desc += f"{i}. {s['title']}\n"
         embed = discord.Embed(title="Queue", description=desc, color=discord.Color.blue())
-        await ctx.send(embed=embed)
+        minutes = player.queue.total_duration() // 60
+        embed.set_footer(text=f"Page {page}/{pages} | {len(player.queue)} songs | ~{minutes // 60}h {minutes % 60}m")
+        outbox.send(ctx.channel, embed=embed)
 
     @commands.command(name="remove")
     async def remove(self, ctx, index: int):
-        if 1 <= index <= len(self.music_queue):
-            removed = self.music_queue.pop(index-1)
-            await self.save_state(ctx.guild.id)
-            await ctx.send(f"Removed: {removed['title']}")
+        queue = self.player(ctx.guild.id).queue
+        if 1 <= index <= len(queue):
+            removed = queue.remove(index-1)
+            await self.remove_state(ctx.guild.id, index-1)
+            outbox.send(ctx.channel, f"Removed: {removed['title']}")
 
     @commands.command(name="bump")
     async def bump(self, ctx, index: int):
         economy = self.bot.get_cog("EconomyCog")
         if economy and not await economy.remove_balance(ctx.author.id, 100):
-            return await ctx.send("Need 100 💎 to bump!")
+            return outbox.send(ctx.channel, "Need 100 💎 to bump!")
         
-        if 1 <= index <= len(self.music_queue):
-            song = self.music_queue.pop(index-1)
-            self.music_queue.insert(0, song)
-            await self.save_state(ctx.guild.id)
-            await ctx.send(f"Bumped **{song['title']}**!")
+        queue = self.player(ctx.guild.id).queue
+        if 1 <= index <= len(queue):
+            song = queue.move(index-1, 0)
+            await self.remove_state(ctx.guild.id, index-1, bump=song)
+            outbox.send(ctx.channel, f"Bumped **{song['title']}**!")
 
     @commands.command(name="stop")
     async def stop(self, ctx):
-        self.music_queue = []
-        self.current_song = None
-        self.loop_mode = "off"
+        player = self.player(ctx.guild.id)
+        player.queue.clear()
+        player.current_song = None
+        player.loop_mode = "off"
         await self.save_state(ctx.guild.id)
         if ctx.voice_client: await ctx.voice_client.disconnect()
-        await ctx.send("Stopped.")
+        outbox.send(ctx.channel, "Stopped.")
 
     @commands.group(name="playlist", aliases=["pl"], invoke_without_command=True)
     async def playlist(self, ctx):
-        await ctx.send("Use: `!playlist save <name>`, `load <name>`, `list`")
+        outbox.send(ctx.channel, "Use: `!playlist save <name>`, `load <name>`, `list`, `show <name> [page]`, `add <name>`, `remove <name> <#>`, `move <name> <from> <to>`, `delete <name>`")
 
     @playlist.command(name="save")
     async def pl_save(self, ctx, name: str):
-        songs = ([self.current_song] if self.current_song else []) + self.music_queue
-        if not songs: return await ctx.send("Nothing to save.")
-        if len(songs) > 20: songs = songs[:20]
-        
-        json_songs = json.dumps(songs)
+        player = self.player(ctx.guild.id)
+        songs = ([player.current_song] if player.current_song else []) + player.queue.page(1, playlists.PLAYLIST_MAX_SONGS)
+        if not songs: return outbox.send(ctx.channel, "Nothing to save.")
+        songs = songs[:playlists.PLAYLIST_MAX_SONGS]
+
         pool = await Database.get_pool()
         async with pool.acquire() as conn:
             try:
-                await conn.execute("INSERT INTO playlists (user_id, name, songs) VALUES ($1, $2, $3)", ctx.author.id, name, json_songs)
-                await ctx.send(f"Playlist **{name}** saved!")
+                await playlists.create_playlist(conn, ctx.author.id, name, songs)
+                Database.pin(ctx.author.id)
+                outbox.send(ctx.channel, f"Playlist **{name}** saved ({len(songs)} songs)!")
+            except asyncpg.UniqueViolationError:
+                outbox.send(ctx.channel, f"Playlist **{name}** already exists. Use a different name.")
             except Exception as e:
-                # Likely duplicate or DB error
-                if "unique constraint" in str(e).lower():
-                     await ctx.send(f"Playlist **{name}** already exists. Use a different name.")
-                else:
-                     await ctx.send(f"Error saving playlist: {e}")
+                outbox.send(ctx.channel, f"Error saving playlist: {e}")
 
     @playlist.command(name="load")
     async def pl_load(self, ctx, name: str):
-        if not ctx.author.voice: return await ctx.send("Join VC first.")
+        if not ctx.author.voice: return outbox.send(ctx.channel, "Join VC first.")
+        if not ctx.voice_client: await ctx.author.voice.channel.connect()
         pool = await Database.get_pool()
         async with pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT songs FROM playlists WHERE user_id = $1 AND name = $2", ctx.author.id, name)
-            if not row: return await ctx.send("Not found.")
-            for s in json.loads(row['songs']): self.music_queue.append(s)
-            await ctx.send(f"Loaded **{name}**!")
-            if not (ctx.voice_client and ctx.voice_client.is_playing()) and not self.current_song:
+            playlist_id = await playlists.get_playlist_id(conn, ctx.author.id, name)
+        if not playlist_id: return outbox.send(ctx.channel, "Not found.")
+
+        # Stream the playlist page by page; playback starts after the first page.
+        player = self.player(ctx.guild.id)
+        loaded, cursor = 0, playlists.PAGE_START
+        while True:
+            async with pool.acquire() as conn:
+                rows = await playlists.fetch_page(conn, playlist_id, cursor)
+            if not rows or not ctx.voice_client: break
+            songs = [{'url': r['url'], 'title': r['title'], 'duration': r['duration'], 'requester_id': ctx.author.id} for r in rows]
+            player.queue.extend(songs)
+            await self.update_state(ctx.guild.id, push=songs)
+            if loaded == 0 and not (ctx.voice_client.is_playing() or ctx.voice_client.is_paused()) and not player.current_song:
                 self.check_queue(ctx, None)
+            loaded += len(rows)
+            cursor = (rows[-1]['position'], rows[-1]['item_id'])
+            if len(rows) < playlists.PLAYLIST_PAGE_SIZE: break
+        outbox.send(ctx.channel, f"Loaded **{name}** ({loaded} songs)!")
 
     @playlist.command(name="list")
     async def pl_list(self, ctx):
-        pool = await Database.get_pool()
+        pool = await Database.reader(ctx.author.id)
         async with pool.acquire() as conn:
-            rows = await conn.fetch("SELECT name, jsonb_array_length(songs) as count FROM playlists WHERE user_id = $1", ctx.author.id)
-            if not rows: return await ctx.send("No playlists.")
+            rows = await playlists.list_playlists(conn, ctx.author.id)
+            if not rows: return outbox.send(ctx.channel, "No playlists.")
             desc = "\n".join([f"• **{r['name']}** ({r['count']} songs)" for r in rows])
-            await ctx.send(embed=discord.Embed(title="Playlists", description=desc, color=discord.Color.green()))
-
-    @tasks.loop(minutes=5)
-    async def inactivity_check(self):
-        for guild in self.bot.guilds:
-            if guild.voice_client and guild.voice_client.is_connected():
-                if not guild.voice_client.is_playing() and not guild.voice_client.is_paused():
-                     await guild.voice_client.disconnect()
-                if len(guild.voice_client.channel.members) == 1:
-                    await guild.voice_client.disconnect()
-
-    @inactivity_check.before_loop
-    async def before_inactivity(self):
+            outbox.send(ctx.channel, embed=discord.Embed(title="Playlists", description=desc, color=discord.Color.green()))
+
+    @playlist.command(name="show")
+    async def pl_show(self, ctx, name: str, page: int = 1):
+        page = max(1, page)
+        pool = await Database.reader(ctx.author.id)
+        async with pool.acquire() as conn:
+            playlist_id = await playlists.get_playlist_id(conn, ctx.author.id, name)
+            if not playlist_id: return outbox.send(ctx.channel, "Not found.")
+            rows = await playlists.fetch_page_at(conn, playlist_id, page, QUEUE_PAGE_SIZE)
+        if not rows: return outbox.send(ctx.channel, "Page is empty.")
+        start = (page - 1) * QUEUE_PAGE_SIZE + 1
+        desc = "\n".join(f"{i}. {r['title']}" for i, r in enumerate(rows, start))
+        outbox.send(ctx.channel, embed=discord.Embed(title=f"{name} (page {page})", description=desc, color=discord.Color.green()))
+
+    @playlist.command(name="add")
+    async def pl_add(self, ctx, name: str):
+        song = self.player(ctx.guild.id).current_song
+        if not song: return outbox.send(ctx.channel, "Nothing playing to add.")
+        pool = await Database.get_pool()
+        async with pool.acquire() as conn:
+            playlist_id = await playlists.get_playlist_id(conn, ctx.author.id, name)
+            if not playlist_id: return outbox.send(ctx.channel, "Not found.")
+            if not await playlists.add_item(conn, playlist_id, song):
+                return outbox.send(ctx.channel, f"Playlist is full ({playlists.PLAYLIST_MAX_SONGS} songs).")
+        Database.pin(ctx.author.id)
+        outbox.send(ctx.channel, f"Added **{song['title']}** to **{name}**.")
+
+    @playlist.command(name="remove")
+    async def pl_remove(self, ctx, name: str, index: int):
+        pool = await Database.get_pool()
+        async with pool.acquire() as conn:
+            playlist_id = await playlists.get_playlist_id(conn, ctx.author.id, name)
+            if not playlist_id: return outbox.send(ctx.channel, "Not found.")
+            title = await playlists.remove_item(conn, playlist_id, index - 1) if index >= 1 else None
+        if title is None: return outbox.send(ctx.channel, "No song at that position.")
+        Database.pin(ctx.author.id)
+        outbox.send(ctx.channel, f"Removed **{title}** from **{name}**.")
+
+    @playlist.command(name="move")
+    async def pl_move(self, ctx, name: str, src: int, dst: int):
+        pool = await Database.get_pool()
+        async with pool.acquire() as conn:
+            playlist_id = await playlists.get_playlist_id(conn, ctx.author.id, name)
+            if not playlist_id: return outbox.send(ctx.channel, "Not found.")
+            count = await conn.fetchval("SELECT COUNT(*) FROM playlist_items WHERE playlist_id = $1", playlist_id)
+            if not (1 <= src <= count): return outbox.send(ctx.channel, "No song at that position.")
+            title = await playlists.move_item(conn, playlist_id, src - 1, max(1, min(dst, count)) - 1)
+        Database.pin(ctx.author.id)
+        outbox.send(ctx.channel, f"Moved **{title}** to #{max(1, min(dst, count))}.")
+
+    @playlist.command(name="delete")
+    async def pl_delete(self, ctx, name: str):
+        pool = await Database.get_pool()
+        async with pool.acquire() as conn:
+            result = await conn.execute("DELETE FROM playlists WHERE user_id = $1 AND name = $2", ctx.author.id, name)
+        if result == "DELETE 0": return outbox.send(ctx.channel, "Not found.")
+        Database.pin(ctx.author.id)
+        outbox.send(ctx.channel, f"Deleted **{name}**.")
+
+    # --- IDLE DETECTION (event driven) ---
+
+    @staticmethod
+    def is_idle(vc):
+        alone = all(m.bot for m in vc.channel.members)
+        return alone or not (vc.is_playing() or vc.is_paused())
+
+    def refresh_idle(self, guild):
+        """Arms the guild's idle deadline if the bot is alone or not playing, else disarms it."""
+        vc = guild.voice_client
+        if vc and vc.is_connected() and self.is_idle(vc): self.idle.arm(guild.id)
+        else: self.idle.disarm(guild.id)
+
+    async def on_idle_timeout(self, guild_id):
+        guild = self.bot.get_guild(guild_id)
+        vc = guild.voice_client if guild else None
+        if vc and vc.is_connected() and self.is_idle(vc):
+            await vc.disconnect()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        if member.id == self.bot.user.id and after.channel is None:
+            return self.idle.disarm(member.guild.id)
+        vc = member.guild.voice_client
+        if vc and vc.channel in (before.channel, after.channel):
+            self.refresh_idle(member.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.players.pop(guild.id, None)
+
+    def cog_unload(self):
+        self.ffmpeg_watchdog.cancel()
+        self.idle.stop()
+
+    @tasks.loop(seconds=5)
+    async def ffmpeg_watchdog(self):
+        for source in self.supervisor.sample():
+            print(f"⚠️ Killed stalled ffmpeg stream in guild {source.guild_id} (no audio for {self.supervisor.stall_timeout:.0f}s)")
+
+    @commands.command(name="ffstats", help="ffmpeg process stats (Admin only)")
+    @commands.is_owner()
+    async def ffstats(self, ctx):
+        sup = self.supervisor
+        embed = discord.Embed(title="🎛️ ffmpeg Supervisor", color=discord.Color.blurple())
+        embed.add_field(name="Transcodes", value=f"**{sup.active()}/{sup.limit}** ({sup.waiting} waiting)", inline=True)
+        embed.add_field(name="Lifetime", value=f"{sup.stats['spawned']} spawned | {sup.stats['stalled']} stalled | {sup.stats['crashed']} crashed", inline=True)
+        embed.add_field(name="Max Slot Wait", value=f"{sup.stats['max_wait']:.2f}s", inline=True)
+        lines = []
+        for r in sup.report()[:15]:
+            if r.get("state"):
+                lines.append(f"`{r['guild_id']}` {r['state']}...")
+                continue
+            cpu = f"{r['cpu_percent']:.0f}%" if r['cpu_percent'] is not None else "n/a"
+            rss = f"{r['rss_mb']:.0f}MB" if r['rss_mb'] is not None else "n/a"
+            lines.append(f"`{r['guild_id']}` pid {r['pid']} | CPU {cpu} | RSS {rss} | {r['age']:.0f}s")
+        embed.add_field(name="Streams", value="\n".join(lines) or "None", inline=False)
+        outbox.send(ctx.channel, embed=embed)
+
+    @ffmpeg_watchdog.before_loop
+    async def before_ffmpeg_watchdog(self):
         await self.bot.wait_until_ready()
 
 async def setup(bot):
@@ -0,0 +1,54 @@
+import time
+from collections import Counter
+
+
+class VoiceClock:
+    """
+    Listening time per user, driven by voice state updates instead of a per-minute scan.
+    A session runs while the user sits in the bot's voice channel; closing it (leave, or a
+    checkpoint for long sessions) yields whole minutes and keeps the leftover seconds for
+    next time, so partial minutes aren't lost.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self):
+        self.active = {}  # user_id -> (guild_id, started_at)
+        self.carry = {}   # user_id -> seconds not yet settled
+
+    def sync(self, guild_id, listeners, now=None):
+        """
+        `listeners` are the user ids in the guild's bot channel right now (empty if the bot
+        isn't in voice). Starts newcomers' clocks; returns {user_id: minutes} for those who left.
+        """
+        now = time.time() if now is None else now
+        listeners = set(listeners)
+        for user_id in listeners:
+            if user_id not in self.active:
+                self.active[user_id] = (guild_id, now)
+        gone = [u for u, (g, _) in self.active.items() if g == guild_id and u not in listeners]
+        return Counter({u: self._close(u, now) for u in gone})
+
+    def checkpoint(self, now=None):
+        """Settles everyone still listening; their clocks restart now. Returns {user_id: minutes}."""
+        now = time.time() if now is None else now
+        minutes = Counter()
+        for user_id, (guild_id, _) in list(self.active.items()):
+            minutes[user_id] = self._close(user_id, now)
+            self.active[user_id] = (guild_id, now)
+        return minutes
+
+    def refund(self, minutes):
+        """Puts {user_id: minutes} that couldn't be settled back, to go out with the next settlement."""
+        for user_id, m in minutes.items():
+            self.carry[user_id] = self.carry.get(user_id, 0) + m * 60
+
+    def _close(self, user_id, now):
+        _, started = self.active.pop(user_id)
+        seconds = now - started + self.carry.pop(user_id, 0)
+        minutes, rest = divmod(int(seconds), 60)
+        if rest:
+            self.carry[user_id] = rest
+        return minutes
+
+    def __len__(self):
+        return len(self.active)
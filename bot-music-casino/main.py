@@ -1,9 +1,15 @@
+from common.startup import profiler  # first, so import time is measured
 import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv, find_dotenv
 import asyncio
 from common.database.db import Database
+from common import metrics
+from common.cluster import cluster, ClusterBus
+from common.outbox import outbox
+
+profiler.mark("imports")
 
 # Load environment variables
 load_dotenv(find_dotenv(usecwd=True))
@@ -14,31 +20,59 @@ intents.message_content = True
 intents.voice_states = True
 intents.members = True # Required for Economy (XP/Rain)
 
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+initial_extensions = ['cogs.music_cog', 'cogs.economy_cog', 'cogs.help_cog']
+
+class MusicBot(commands.AutoShardedBot):
+    lag_sampler = None  # metrics.sample_loop_lag task, started in main()
+
+    async def setup_hook(self):
+        # Runs once, during login. on_ready fires again on every gateway reconnect.
+        for extension in initial_extensions:
+            try:
+                with profiler.phase(extension):
+                    await self.load_extension(extension)
+                print(f"Loaded {extension}")
+            except Exception as e:
+                print(f"Failed to load extension {extension}: {e}")
+        if cluster.clustered:
+            self.cluster_bus.start()
+
+    async def close(self):
+        if self.lag_sampler:
+            self.lag_sampler.cancel()
+        # Replies still queued in the outbox go out before the gateway closes
+        await outbox.flush()
+        await super().close()
+
+# Cluster mode (common.cluster launcher): this process runs only its share of the shards
+bot = MusicBot(command_prefix='!', intents=intents, help_command=None, **cluster.bot_kwargs())
+bot.cluster_bus = ClusterBus("music", bot)
+metrics.instrument_bot(bot)
 
 @bot.event
 async def on_ready():
     print(f'Logged in as {bot.user.name}')
-    
-    # Load Cogs
-    initial_extensions = ['cogs.music_cog', 'cogs.economy_cog', 'cogs.help_cog']
-    for extension in initial_extensions:
-        try:
-            await bot.load_extension(extension)
-            print(f"Loaded {extension}")
-        except Exception as e:
-            print(f"Failed to load extension {extension}: {e}")
+    profiler.ready("Music bot")
 
 # Duplicate ping command removed (handled by HelpCog)
 
-@bot.command(name='restart', help='Restarts the bot (Admin only)')
+@bot.command(name='restart', help='Restarts the bot (Admin only). `!restart all` restarts every cluster.')
 @commands.is_owner()
-async def restart(ctx):
+async def restart(ctx, scope: str = None):
+    if scope == 'all' and cluster.clustered:
+        receivers = await bot.cluster_bus.broadcast('restart')
+        return await ctx.send(f'Restarting {receivers} clusters...')
     await ctx.send('Restarting...')
     await bot.close()
     import sys
     sys.exit(0)
 
+@bot.cluster_bus.on('restart')
+async def on_cluster_restart(message):
+    # The launcher starts us again straight away (clean exit)
+    print(f"🔁 Restart requested by cluster {message['from']}")
+    await bot.close()
+
 async def main():
     # Support both docker env var (mapped) and native .env (direct)
     token = os.getenv('DISCORD_TOKEN') or os.getenv('MUSIC_BOT_TOKEN')
@@ -46,19 +80,30 @@ async def main():
         print("Error: MUSIC_BOT_TOKEN not found in .env file.")
         return
     
-    # GUARD RAIL: Connect to DB *before* logging in
-    # This specifically prevents "Zombie" native processes (which lack DB) 
-    # from staying online and confusing users.
-    print("⏳ Connecting to Database...")
-    try:
-        await Database.get_pool()
-        print("✅ Database connection established.")
-    except Exception as e:
-        print(f"❌ CRITICAL failure: Could not connect to Database. Bot will NOT start.\nReason: {e}")
-        return
+    # Optional Prometheus endpoint (METRICS_PORT); loop lag is sampled either way
+    if os.getenv('METRICS_PORT'):
+        await metrics.start_http_server(int(os.getenv('METRICS_PORT')))
+    bot.lag_sampler = asyncio.create_task(metrics.sample_loop_lag())
 
     async with bot:
-        await bot.start(token)
+        # The DB pool and the Discord login (which loads the cogs and their Redis check) start together.
+        print("⏳ Connecting to Database...")
+        database = asyncio.create_task(profiler.run("database", Database.get_pool()))
+        with profiler.phase("login"):
+            await bot.login(token)
+
+        # GUARD RAIL: No gateway connection (bot shows online) without a DB.
+        # This specifically prevents "Zombie" native processes (which lack DB)
+        # from staying online and confusing users.
+        try:
+            await database
+            print("✅ Database connection established.")
+        except Exception as e:
+            print(f"❌ CRITICAL failure: Could not connect to Database. Bot will NOT start.\nReason: {e}")
+            return
+
+        profiler.begin("gateway")
+        await bot.connect()
 
 if __name__ == "__main__":
     try:
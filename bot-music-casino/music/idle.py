@@ -0,0 +1,71 @@
+import asyncio
+import heapq
+import time
+
+
+class IdleTracker:
+    """
+    Per-guild idle deadlines held in a min-heap and serviced by one task that
+    sleeps until the earliest deadline. Arming/disarming is O(log n) / O(1);
+    nothing ever scans all guilds.
+    Must be called from the event loop thread (use call_soon_threadsafe from player callbacks).
+    """
+
+    def __init__(self, timeout, on_idle):
+        self.timeout = timeout
+        self.on_idle = on_idle  # async callable(guild_id)
+        self._heap = []  # (deadline, guild_id); entries not matching _deadlines are stale
+        self._deadlines = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def is_armed(self, guild_id):
+        return guild_id in self._deadlines
+
+    def arm(self, guild_id):
+        """Starts the idle countdown. Re-arming an armed guild keeps the original deadline."""
+        if guild_id in self._deadlines: return
+        deadline = time.monotonic() + self.timeout
+        self._deadlines[guild_id] = deadline
+        heapq.heappush(self._heap, (deadline, guild_id))
+        if self._heap[0][1] == guild_id:
+            self._wakeup.set()
+
+    def disarm(self, guild_id):
+        # The heap entry is dropped lazily when it reaches the top.
+        self._deadlines.pop(guild_id, None)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            deadline, guild_id = self._heap[0]
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._deadlines[guild_id]
+            try:
+                await self.on_idle(guild_id)
+            except Exception as e:
+                print(f"⚠️ Idle handler failed for guild {guild_id}: {e}")
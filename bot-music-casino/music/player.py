@@ -0,0 +1,53 @@
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from music.queue import SongQueue
+
+QUEUE_TOMBSTONE = "__removed__"
+
+
+def queue_key(guild_id):
+    return f"music_queue:{guild_id}"
+
+
+def state_key(guild_id):
+    return f"music_state:{guild_id}"
+
+
+@dataclass
+class GuildPlayer:
+    """
+    Playback state for one guild. The cog keeps one per guild, so guilds sharing a
+    process (or a cluster worker) never share a queue, loop mode or filter.
+    Mirrored to Redis under queue_key / state_key and restored from there on startup.
+    """
+    queue: SongQueue = field(default_factory=SongQueue)
+    current_song: Optional[dict] = None
+    loop_mode: str = "off"
+    active_filter: str = "normal"
+    volume: float = 0.5
+    consecutive_errors: int = 0  # Prevent infinite loops
+
+    def state(self):
+        """The music_state hash."""
+        return {
+            "loop_mode": self.loop_mode,
+            "filter": self.active_filter,
+            "current": json.dumps(self.current_song) if self.current_song else "",
+        }
+
+    @classmethod
+    def restore(cls, state, songs: List[str]):
+        """
+        Rebuilds a player from its Redis mirror. Nothing is playing after a restart,
+        so the song that was playing goes back to the head of the queue.
+        """
+        queue = [json.loads(s) for s in songs if s != QUEUE_TOMBSTONE]
+        if state.get("current"):
+            queue.insert(0, json.loads(state["current"]))
+        return cls(
+            queue=SongQueue(queue),
+            loop_mode=state.get("loop_mode") or "off",
+            active_filter=state.get("filter") or "normal",
+        )
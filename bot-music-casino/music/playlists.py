@@ -0,0 +1,145 @@
+"""
+Playlist storage (playlists + playlist_items).
+Items are ordered by a sparse `position` so add/remove/move touch a single
+row; the playlist is only renumbered when two neighbours run out of gap.
+"""
+
+POSITION_STEP = 1024
+PLAYLIST_MAX_SONGS = 5000
+PLAYLIST_PAGE_SIZE = 100
+
+ITEM_COLUMNS = ['playlist_id', 'position', 'url', 'title', 'duration']
+# Keyset cursor that sorts before every item (moves to the front can go negative).
+PAGE_START = (-2 ** 63, 0)
+
+
+async def get_playlist_id(conn, user_id, name):
+    return await conn.fetchval("SELECT playlist_id FROM playlists WHERE user_id = $1 AND name = $2", user_id, name)
+
+
+async def create_playlist(conn, user_id, name, songs):
+    """Creates the playlist and bulk-loads its songs with COPY. Raises UniqueViolationError on duplicates."""
+    async with conn.transaction():
+        playlist_id = await conn.fetchval(
+            "INSERT INTO playlists (user_id, name) VALUES ($1, $2) RETURNING playlist_id", user_id, name
+        )
+        records = [
+            (playlist_id, (i + 1) * POSITION_STEP, s['url'], s.get('title'), int(s.get('duration') or 0))
+            for i, s in enumerate(songs)
+        ]
+        await conn.copy_records_to_table('playlist_items', records=records, columns=ITEM_COLUMNS)
+    return playlist_id
+
+
+async def fetch_page(conn, playlist_id, after=PAGE_START, limit=PLAYLIST_PAGE_SIZE):
+    """Keyset page of items after (position, item_id); no OFFSET scan as the load goes deeper."""
+    return await conn.fetch(
+        """
+        SELECT item_id, position, url, title, duration FROM playlist_items
+        WHERE playlist_id = $1 AND (position, item_id) > ($2, $3)
+        ORDER BY position, item_id LIMIT $4
+        """,
+        playlist_id, after[0], after[1], limit
+    )
+
+
+async def fetch_page_at(conn, playlist_id, page, per_page=10):
+    return await conn.fetch(
+        """
+        SELECT title, duration FROM playlist_items WHERE playlist_id = $1
+        ORDER BY position, item_id OFFSET $2 LIMIT $3
+        """,
+        playlist_id, (page - 1) * per_page, per_page
+    )
+
+
+async def list_playlists(conn, user_id):
+    return await conn.fetch(
+        """
+        SELECT p.name, COUNT(i.item_id) AS count
+        FROM playlists p LEFT JOIN playlist_items i ON i.playlist_id = p.playlist_id
+        WHERE p.user_id = $1
+        GROUP BY p.playlist_id, p.name ORDER BY p.name
+        """,
+        user_id
+    )
+
+
+async def add_item(conn, playlist_id, song):
+    """Appends one song. Returns False if the playlist is full."""
+    item_id = await conn.fetchval(
+        """
+        INSERT INTO playlist_items (playlist_id, position, url, title, duration)
+        SELECT $1, COALESCE(MAX(position), 0) + $2, $3, $4, $5
+        FROM playlist_items WHERE playlist_id = $1
+        HAVING COUNT(*) < $6
+        RETURNING item_id
+        """,
+        playlist_id, POSITION_STEP, song['url'], song.get('title'), int(song.get('duration') or 0), PLAYLIST_MAX_SONGS
+    )
+    return item_id is not None
+
+
+async def remove_item(conn, playlist_id, index):
+    """Deletes the item at 0-based `index`. Returns its title (None if out of range)."""
+    return await conn.fetchval(
+        """
+        DELETE FROM playlist_items WHERE item_id = (
+            SELECT item_id FROM playlist_items WHERE playlist_id = $1
+            ORDER BY position, item_id OFFSET $2 LIMIT 1
+        ) RETURNING title
+        """,
+        playlist_id, index
+    )
+
+
+async def renumber(conn, playlist_id):
+    await conn.execute(
+        """
+        UPDATE playlist_items i SET position = r.rn * $2
+        FROM (
+            SELECT item_id, ROW_NUMBER() OVER (ORDER BY position, item_id) AS rn
+            FROM playlist_items WHERE playlist_id = $1
+        ) r
+        WHERE i.item_id = r.item_id
+        """,
+        playlist_id, POSITION_STEP
+    )
+
+
+async def move_item(conn, playlist_id, src, dst):
+    """Moves the item at 0-based `src` to `dst` by rewriting only its position. Returns its title."""
+    async with conn.transaction():
+        item = await conn.fetchrow(
+            "SELECT item_id, title FROM playlist_items WHERE playlist_id = $1 ORDER BY position, item_id OFFSET $2 LIMIT 1",
+            playlist_id, src
+        )
+        if not item: return None
+
+        for _ in range(2):
+            # Neighbours of the target slot, with the moving item taken out of the ordering.
+            neighbours = await conn.fetch(
+                """
+                SELECT position FROM playlist_items WHERE playlist_id = $1 AND item_id <> $2
+                ORDER BY position, item_id OFFSET $3 LIMIT 2
+                """,
+                playlist_id, item['item_id'], max(dst - 1, 0)
+            )
+            positions = [r['position'] for r in neighbours]
+            if dst == 0:
+                before, after = None, (positions[0] if positions else None)
+            else:
+                before = positions[0] if positions else None
+                after = positions[1] if len(positions) > 1 else None
+
+            if before is None and after is None: return item['title']
+            if before is None: before = after - 2 * POSITION_STEP
+            if after is None: after = before + 2 * POSITION_STEP
+
+            new_position = (before + after) // 2
+            if before < new_position < after:
+                await conn.execute("UPDATE playlist_items SET position = $2 WHERE item_id = $1", item['item_id'], new_position)
+                return item['title']
+            # Gap exhausted between these neighbours: spread everything out once and retry.
+            await renumber(conn, playlist_id)
+        return item['title']
@@ -0,0 +1,66 @@
+from collections import deque
+from itertools import islice
+
+
+class SongQueue:
+    """
+    Deque-backed song queue.
+    Head pops and tail appends are O(1); positional moves rotate from the
+    nearer end instead of shifting the whole list like `list.pop(0)`.
+    Indexes are 0-based here; the commands translate from 1-based.
+    """
+
+    def __init__(self, songs=None):
+        self._songs = deque(songs or [])
+
+    def __len__(self):
+        return len(self._songs)
+
+    def __bool__(self):
+        return bool(self._songs)
+
+    def __iter__(self):
+        return iter(self._songs)
+
+    def append(self, song):
+        self._songs.append(song)
+
+    def extend(self, songs):
+        self._songs.extend(songs)
+
+    def pop_next(self):
+        """Remove and return the head of the queue (None if empty)."""
+        return self._songs.popleft() if self._songs else None
+
+    def clear(self):
+        self._songs.clear()
+
+    def remove(self, index):
+        """Remove and return the song at `index`."""
+        if not 0 <= index < len(self._songs):
+            raise IndexError("queue index out of range")
+        song = self._songs[index]
+        # deque deletes/inserts by rotating from the nearer end, so moves
+        # near either end of a 10k queue stay cheap.
+        del self._songs[index]
+        return song
+
+    def insert(self, index, song):
+        self._songs.insert(index, song)
+
+    def move(self, src, dst):
+        """Move the song at `src` to position `dst` and return it."""
+        song = self.remove(src)
+        self.insert(dst, song)
+        return song
+
+    def page(self, page, per_page=10):
+        """Returns the songs on a 1-based page without copying the queue."""
+        start = (page - 1) * per_page
+        return list(islice(self._songs, start, start + per_page))
+
+    def page_count(self, per_page=10):
+        return max(1, -(-len(self._songs) // per_page))
+
+    def total_duration(self):
+        return sum(s.get('duration') or 0 for s in self._songs)
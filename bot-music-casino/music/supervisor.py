@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+import discord
+from common import metrics
+
+# Host-wide cap on concurrent ffmpeg transcodes. Guilds past the cap wait in FIFO order.
+MAX_TRANSCODES = int(os.getenv('MAX_FFMPEG_PROCESSES', (os.cpu_count() or 1) * 4))
+# A playing stream that produces no PCM frame for this long is considered stalled and killed.
+STALL_TIMEOUT = float(os.getenv('FFMPEG_STALL_TIMEOUT', 20))
+
+FFMPEG_STARTUP_SECONDS = metrics.Histogram("ffmpeg_first_frame_seconds", "ffmpeg spawn to first PCM frame")
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def read_proc_usage(pid):
+    """(cpu_seconds, rss_bytes) for a pid from /proc, or (None, None) off Linux / after exit."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+        with open(f'/proc/{pid}/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        return cpu, rss
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+
+class SupervisedSource(discord.PCMVolumeTransformer):
+    """Volume transformer that reports frame progress and cleanup to the supervisor."""
+
+    def __init__(self, original, supervisor, guild_id, voice_client, volume=0.5):
+        super().__init__(original, volume=volume)
+        self.supervisor = supervisor
+        self.guild_id = guild_id
+        self.voice_client = voice_client
+        self.started_at = time.monotonic()
+        self.last_frame_at = self.started_at
+        self.frames = 0
+        self.killed = None  # reason, if the supervisor killed the process
+        self.cpu_percent = None
+        self.rss = None
+        self._last_cpu = (None, self.started_at)
+
+    @property
+    def process(self):
+        proc = getattr(self.original, '_process', None)
+        return proc if hasattr(proc, 'pid') else None
+
+    def read(self):
+        data = super().read()
+        if data:
+            self.frames += 1
+            self.last_frame_at = time.monotonic()
+            if self.frames == 1:
+                FFMPEG_STARTUP_SECONDS.observe(self.last_frame_at - self.started_at)
+        return data
+
+    def kill(self, reason):
+        self.killed = reason
+        proc = self.process
+        if proc and proc.poll() is None:
+            proc.kill()
+
+    def cleanup(self):
+        proc = self.process
+        exit_code = proc.poll() if proc else None
+        super().cleanup()
+        # Called from the player thread.
+        self.supervisor.loop.call_soon_threadsafe(self.supervisor.release, self.guild_id, self, exit_code)
+
+
+class FFmpegSupervisor:
+    """
+    Tracks every ffmpeg child per guild and caps concurrent transcodes per host.
+    Each guild holds at most one slot; respawns (seek, loop song) reuse it.
+    """
+
+    def __init__(self, loop, limit=MAX_TRANSCODES, stall_timeout=STALL_TIMEOUT):
+        self.loop = loop
+        self.limit = limit
+        self.stall_timeout = stall_timeout
+        self._slots = asyncio.Semaphore(limit)
+        self.leases = {}  # guild_id -> current SupervisedSource (None while waiting for a slot or spawning)
+        self._pending = {}  # guild_id -> future resolved once the guild's slot wait is over
+        self.waiting = 0
+        self.stats = {"spawned": 0, "stalled": 0, "crashed": 0, "max_wait": 0.0}
+
+    async def acquire(self, guild_id):
+        pending = self._pending.get(guild_id)
+        if pending:
+            # Another play for this guild is already queued for the slot: share it, don't take a second
+            await asyncio.shield(pending)
+            return await self.acquire(guild_id)  # re-check: that wait may have been cancelled
+        if guild_id in self.leases: return
+        # Reserve the guild before waiting, so concurrent plays for it find the reservation
+        self.leases[guild_id] = None
+        pending = self._pending[guild_id] = self.loop.create_future()
+        self.waiting += 1
+        start = time.monotonic()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            if guild_id in self.leases and self.leases[guild_id] is None:
+                del self.leases[guild_id]
+            raise
+        finally:
+            self.waiting -= 1
+            del self._pending[guild_id]
+            pending.set_result(None)
+        self.stats["max_wait"] = max(self.stats["max_wait"], time.monotonic() - start)
+
+    def active(self):
+        """Guilds holding a slot (spawning or streaming)."""
+        return len(self.leases) - len(self._pending)
+
+    def attach(self, guild_id, source):
+        self.leases[guild_id] = source
+        self.stats["spawned"] += 1
+
+    def release(self, guild_id, source=None, exit_code=None):
+        """Frees the guild's slot unless a newer respawn already owns it."""
+        if source is not None and exit_code not in (None, 0) and not source.killed:
+            self.stats["crashed"] += 1
+            print(f"⚠️ ffmpeg for guild {guild_id} exited with code {exit_code}")
+        if guild_id not in self.leases or self.leases[guild_id] is not source: return
+        del self.leases[guild_id]
+        self._slots.release()
+
+    def sample(self):
+        """Refreshes CPU/RSS for every stream and kills stalled ones. Returns the killed sources."""
+        now = time.monotonic()
+        killed = []
+        for source in list(self.leases.values()):
+            if source is None: continue
+            proc = source.process
+            if proc:
+                cpu, source.rss = read_proc_usage(proc.pid)
+                last_cpu, last_at = source._last_cpu
+                if cpu is not None and last_cpu is not None and now > last_at:
+                    source.cpu_percent = (cpu - last_cpu) / (now - last_at) * 100
+                source._last_cpu = (cpu, now)
+
+            if source.voice_client.is_paused():
+                source.last_frame_at = now
+            elif now - source.last_frame_at > self.stall_timeout and not source.killed:
+                self.stats["stalled"] += 1
+                source.kill("stalled")
+                killed.append(source)
+        return killed
+
+    def report(self):
+        rows = []
+        for guild_id, source in self.leases.items():
+            if source is None:
+                rows.append({"guild_id": guild_id, "state": "waiting" if guild_id in self._pending else "spawning"})
+                continue
+            proc = source.process
+            rows.append({
+                "guild_id": guild_id,
+                "pid": proc.pid if proc else None,
+                "cpu_percent": source.cpu_percent,
+                "rss_mb": source.rss / 1_048_576 if source.rss else None,
+                "age": time.monotonic() - source.started_at,
+                "frames": source.frames,
+            })
+        return rows
@@ -0,0 +1,245 @@
+"""
+Cluster mode: one bot split over several processes, each owning a subset of shards.
+
+Workers read CLUSTER_ID / CLUSTER_COUNT / SHARD_COUNT (set by the launcher below) and pass
+ClusterConfig.bot_kwargs() to their AutoShardedBot. Shard i belongs to cluster
+i % CLUSTER_COUNT, and a guild lives on shard (guild_id >> 22) % SHARD_COUNT, so every
+guild (its voice, queue, sessions) is handled by exactly one process. Shared state lives in
+Postgres / Redis; ClusterBus broadcasts owner commands to every worker.
+
+Launcher (from a bot directory, PYTHONPATH at the repo root):
+    python -m common.cluster main.py --clusters 4 [--shards 8]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional
+
+from common.redis_client import RedisClient
+
+# Workers report in this often; the registry entry expires after a few missed beats.
+HEARTBEAT_INTERVAL = 15
+# Crashed workers are restarted with this backoff (seconds), reset after a stable minute.
+RESTART_BACKOFF = (1, 5, 15, 60)
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+@dataclass
+class ClusterConfig:
+    cluster_id: int = 0
+    cluster_count: int = 1
+    shard_count: Optional[int] = None  # None: single process, discord.py picks the count
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            cluster_id=_env_int('CLUSTER_ID', 0),
+            cluster_count=max(1, _env_int('CLUSTER_COUNT', 1)),
+            shard_count=_env_int('SHARD_COUNT', None),
+        )
+
+    @property
+    def clustered(self):
+        return self.shard_count is not None
+
+    @property
+    def shard_ids(self) -> Optional[List[int]]:
+        if not self.clustered:
+            return None
+        return [i for i in range(self.shard_count) if i % self.cluster_count == self.cluster_id]
+
+    def bot_kwargs(self):
+        if not self.clustered:
+            return {}
+        return {'shard_count': self.shard_count, 'shard_ids': self.shard_ids}
+
+    def owns_guild(self, guild_id):
+        if not self.clustered:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+
+cluster = ClusterConfig.from_env()
+
+
+class ClusterBus:
+    """
+    Redis pub/sub between the workers of one service, plus a heartbeat registry.
+    Handlers are `async fn(message: dict)`, registered per command with on().
+    """
+
+    def __init__(self, service, bot):
+        self.service = service
+        self.bot = bot
+        self.channel = f"cluster:{service}"
+        self.registry = f"cluster:{service}:members"
+        self.handlers = {}
+        self._tasks = []
+
+    def on(self, command):
+        def register(fn):
+            self.handlers[command] = fn
+            return fn
+        return register
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._heartbeat())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        try:
+            await RedisClient.get().hdel(self.registry, cluster.cluster_id)
+        except Exception:
+            pass
+
+    async def broadcast(self, command, **data):
+        """Sends to every worker, this one included. Returns how many received it."""
+        message = {"command": command, "id": uuid.uuid4().hex, "from": cluster.cluster_id, **data}
+        return await RedisClient.get().publish(self.channel, json.dumps(message))
+
+    async def members(self):
+        """Live workers' last heartbeat, by cluster id."""
+        raw = await RedisClient.get().hgetall(self.registry)
+        now = time.time()
+        members = {int(k): json.loads(v) for k, v in raw.items()}
+        return {k: v for k, v in sorted(members.items()) if now - v["ts"] < HEARTBEAT_INTERVAL * 3}
+
+    def status(self):
+        bot = self.bot
+        online = sum(1 for g in bot.guilds for m in g.members if not m.bot and str(m.status) != "offline")
+        return {
+            "ts": time.time(),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "shards": cluster.shard_ids or list(getattr(bot, 'shards', {}) or [0]),
+            "guilds": len(bot.guilds),
+            "online": online,
+            "latency_ms": round(bot.latency * 1000, 1) if bot.latency == bot.latency else None,  # NaN before connect
+        }
+
+    async def _heartbeat(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await RedisClient.get().hset(self.registry, cluster.cluster_id, json.dumps(self.status()))
+            except Exception as e:
+                print(f"⚠️ Cluster heartbeat failed: {e}")
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = RedisClient.get().pubsub()
+                await pubsub.subscribe(self.channel)
+                async for raw in pubsub.listen():
+                    if raw["type"] != "message":
+                        continue
+                    message = json.loads(raw["data"])
+                    handler = self.handlers.get(message.get("command"))
+                    if handler:
+                        try:
+                            await handler(message)
+                        except Exception as e:
+                            print(f"⚠️ Cluster command {message.get('command')} failed: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Cluster bus disconnected ({e}). Resubscribing in 5s...")
+                await asyncio.sleep(5)
+
+
+# --- Launcher ---
+
+async def recommended_shards(token):
+    """Discord's recommended shard count for this token (GET /gateway/bot)."""
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get("https://discord.com/api/v10/gateway/bot",
+                               headers={"Authorization": f"Bot {token}"}) as resp:
+            resp.raise_for_status()
+            return (await resp.json())["shards"]
+
+
+class Launcher:
+    def __init__(self, script, clusters, shards):
+        self.script = script
+        self.clusters = clusters
+        self.shards = shards
+        self.procs = {}
+        self.stopping = False
+
+    def env_for(self, cluster_id):
+        env = dict(os.environ, CLUSTER_ID=str(cluster_id), CLUSTER_COUNT=str(self.clusters), SHARD_COUNT=str(self.shards))
+        # The service's DB budget is split across workers; metrics ports are consecutive.
+        env.setdefault('DB_POOL_PROCESSES', str(self.clusters))
+        if os.getenv('METRICS_PORT'):
+            env['METRICS_PORT'] = str(int(os.environ['METRICS_PORT']) + cluster_id)
+        return env
+
+    async def supervise(self, cluster_id):
+        failures = 0
+        while not self.stopping:
+            started = time.monotonic()
+            proc = await asyncio.create_subprocess_exec(sys.executable, self.script, env=self.env_for(cluster_id))
+            self.procs[cluster_id] = proc
+            print(f"🚀 Cluster {cluster_id} started (pid {proc.pid})")
+            code = await proc.wait()
+            if self.stopping:
+                return
+            # Clean exit (!restart) comes straight back; crashes back off.
+            failures = 0 if code == 0 or time.monotonic() - started > 60 else failures + 1
+            delay = RESTART_BACKOFF[min(failures, len(RESTART_BACKOFF) - 1)] if failures else 1
+            print(f"⚠️ Cluster {cluster_id} exited with {code}. Restarting in {delay}s...")
+            await asyncio.sleep(delay)
+
+    def stop(self):
+        self.stopping = True
+        for proc in self.procs.values():
+            if proc.returncode is None:
+                proc.terminate()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+        print(f"🧩 {self.clusters} clusters, {self.shards} shards")
+        await asyncio.gather(*(self.supervise(i) for i in range(self.clusters)))
+        await asyncio.gather(*(p.wait() for p in self.procs.values()))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a bot as several sharded worker processes")
+    parser.add_argument("script", help="Bot entry point, e.g. main.py")
+    parser.add_argument("--clusters", type=int, default=_env_int('BOT_CLUSTERS', os.cpu_count() or 1))
+    parser.add_argument("--shards", type=int, default=_env_int('SHARD_COUNT', None),
+                        help="Total shards (default: Discord's recommendation, at least one per cluster)")
+    args = parser.parse_args()
+
+    shards = args.shards
+    if shards is None:
+        from dotenv import load_dotenv, find_dotenv
+        load_dotenv(find_dotenv(usecwd=True))
+        token = os.getenv('DISCORD_TOKEN')
+        try:
+            shards = await recommended_shards(token) if token else 1
+        except Exception as e:
+            print(f"⚠️ Could not fetch recommended shard count ({e}).")
+            shards = 1
+    shards = max(shards, args.clusters)
+    await Launcher(args.script, args.clusters, shards).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
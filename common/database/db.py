@@ -1,56 +1,169 @@
+import asyncio
 import asyncpg
 import os
+import random
+import time
 from typing import Optional
+from common.database.pool import PoolConfig, MeteredPool, create_pool
+from common.database import queries
+from common import metrics
+
+# Reads for a user stay on the primary this long after they write (replica lag cover).
+REPLICA_PIN_SECONDS = float(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
 
 class Database:
-    _pool: Optional[asyncpg.Pool] = None
+    _pool: Optional[MeteredPool] = None
+    _read_pool: Optional[MeteredPool] = None
+    _lock: Optional[asyncio.Lock] = None
+    _pins = {}  # user_id -> monotonic time until which reads go to the primary
+    _replica_retry_at = 0.0
+    config: Optional[PoolConfig] = None
 
     @classmethod
     async def get_pool(cls) -> asyncpg.Pool:
         if cls._pool is None:
-            # 1. Validate Env Vars
+            # Concurrent first callers share one pool instead of each opening their own
+            if cls._lock is None:
+                cls._lock = asyncio.Lock()
+            async with cls._lock:
+                if cls._pool is None:
+                    cls._pool = await cls._connect()
+        return cls._pool
+
+    @classmethod
+    async def get_read_pool(cls) -> asyncpg.Pool:
+        """Pool on the read replica (DB_REPLICA_HOST), or the primary pool when none is configured."""
+        replica = os.getenv('DB_REPLICA_HOST')
+        if cls._read_pool is None:
+            primary = await cls.get_pool()  # also sets up the lock
+            if not replica or time.monotonic() < cls._replica_retry_at:
+                return primary
+            async with cls._lock:
+                if cls._read_pool is None:
+                    try:
+                        cls._read_pool = await cls._connect(replica, readonly=True)
+                    except ConnectionError:
+                        # Don't stall every read on reconnects; try the replica again in a minute.
+                        print("⚠️ Read replica unavailable, reading from the primary.")
+                        cls._replica_retry_at = time.monotonic() + 60
+                        return primary
+        return cls._read_pool
+
+    @classmethod
+    def pin(cls, *user_ids):
+        """Call after writing for these users: their next reads see the write (primary for a few seconds)."""
+        until = time.monotonic() + REPLICA_PIN_SECONDS
+        for user_id in user_ids:
+            cls._pins[user_id] = until
+        if len(cls._pins) > 10000:
+            now = time.monotonic()
+            cls._pins = {u: t for u, t in cls._pins.items() if t > now}
+
+    @classmethod
+    async def reader(cls, user_id=None) -> asyncpg.Pool:
+        """Pool for a read-only query: the replica, unless `user_id` wrote moments ago."""
+        if user_id is not None and cls._pins.get(user_id, 0) > time.monotonic():
+            return await cls.get_pool()
+        return await cls.get_read_pool()
+
+    @classmethod
+    async def connect_direct(cls) -> asyncpg.Connection:
+        """
+        One connection to the primary outside the pools, for session state such as LISTEN.
+        DB_DIRECT_HOST bypasses PgBouncer in transaction mode (defaults to DB_HOST).
+        """
+        dsn, _, _ = cls._dsn(os.getenv('DB_DIRECT_HOST'))
+        name = os.getenv('DB_APPLICATION_NAME')
+        return await asyncpg.connect(dsn, timeout=10,
+                                     server_settings={'application_name': f"{name}-listen"} if name else None)
+
+    @classmethod
+    def _dsn(cls, host=None):
+        # 1. Validate Env Vars
+        user = os.getenv('POSTGRES_USER')
+        password = os.getenv('POSTGRES_PASSWORD')
+        host = host or os.getenv('DB_HOST') # Host might be "postgres" (docker) or "localhost"
+        db_name = os.getenv('POSTGRES_DB')
+
+        if not all([user, password, host, db_name]):
+            # Attempt to load .env manually if missing (e.g. running from subdir)
+            print("⚠️  DB Env vars missing. Attempting to load .env from parents...")
+            from dotenv import load_dotenv, find_dotenv
+            load_dotenv(find_dotenv(usecwd=True))
+            
+            # Retry fetch
             user = os.getenv('POSTGRES_USER')
             password = os.getenv('POSTGRES_PASSWORD')
-            host = os.getenv('DB_HOST') # Host might be "postgres" (docker) or "localhost"
+            host = host or os.getenv('DB_HOST')
             db_name = os.getenv('POSTGRES_DB')
+        
+        if not all([user, password, host, db_name]):
+             raise ValueError(f"❌ Missing DB Env Vars! User={user}, Host={host}, DB={db_name}")
 
-            if not all([user, password, host, db_name]):
-                # Attempt to load .env manually if missing (e.g. running from subdir)
-                print("⚠️  DB Env vars missing. Attempting to load .env from parents...")
-                from dotenv import load_dotenv, find_dotenv
-                load_dotenv(find_dotenv(usecwd=True))
-                
-                # Retry fetch
-                user = os.getenv('POSTGRES_USER')
-                password = os.getenv('POSTGRES_PASSWORD')
-                host = os.getenv('DB_HOST')
-                db_name = os.getenv('POSTGRES_DB')
-            
-            if not all([user, password, host, db_name]):
-                 raise ValueError(f"❌ Missing DB Env Vars! User={user}, Host={host}, DB={db_name}")
+        return f"postgresql://{user}:{password}@{host}/{db_name}", user, host
 
-            dsn = f"postgresql://{user}:{password}@{host}/{db_name}"
-            
-            import asyncio
-            for i in range(5):
-                try:
-                    print(f"⏳ Connecting to DB at {host} as {user}...")
-                    cls._pool = await asyncpg.create_pool(dsn)
-                    print(f"✅ DB Connected to {host}")
+    @classmethod
+    async def _connect(cls, host=None, readonly=False) -> MeteredPool:
+        dsn, user, host = cls._dsn(host)
+        config = PoolConfig.from_env()
+        if readonly:
+            # Guard against a write slipping onto the replica pool (e.g. same server pointed at twice)
+            config.read_only = True
+            config.max_size = max(1, int(os.getenv('DB_REPLICA_POOL_MAX', config.max_size)))
+            config.min_size = min(config.min_size, config.max_size)
+        else:
+            cls.config = config
+
+        # The replica is optional: give up quickly and read from the primary instead.
+        attempts = 1 if readonly else int(os.getenv('DB_CONNECT_RETRIES', 5))
+        for i in range(attempts):
+            try:
+                print(f"⏳ Connecting to DB at {host} as {user} (pool {config.min_size}-{config.max_size}"
+                      f"{', pgbouncer mode' if config.pgbouncer else ''})...")
+                # Registry statements are prepared on every new connection (not under PgBouncer,
+                # where named statements don't survive between transactions).
+                name = "replica" if readonly else "primary"
+                if config.pgbouncer:
+                    pool = await create_pool(dsn, config, name=name)
+                else:
+                    pool = await create_pool(dsn, config, init=queries.prepare_all,
+                                             connection_class=queries.RegistryConnection, name=name)
+                print(f"✅ DB Connected to {host}{' (read replica)' if readonly else ''}")
+                return pool
+            except Exception as e:
+                if i == attempts - 1:
+                    print(f"⚠️ DB Connection Failed ({e}).")
                     break
-                except Exception as e:
-                    wait = 2 ** i
-                    print(f"⚠️ DB Connection Failed ({e}). Retrying in {wait}s...")
-                    await asyncio.sleep(wait)
-            
-            if cls._pool is None:
-                raise ConnectionError("Could not connect to Database after retries.")
-        return cls._pool
+                # Capped exponential backoff with jitter so restarting services don't retry in lockstep
+                wait = min(30, 2 ** i) * random.uniform(0.5, 1.5)
+                print(f"⚠️ DB Connection Failed ({e}). Retrying in {wait:.1f}s...")
+                await asyncio.sleep(wait)
+
+        raise ConnectionError("Could not connect to Database after retries.")
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """Checkout wait times and pool occupancy (empty before the first connection)."""
+        stats = cls._pool.stats() if cls._pool else {}
+        if cls._read_pool:
+            stats["replica"] = cls._read_pool.stats()
+        return stats
+
+    @classmethod
+    def export_metrics(cls):
+        for pool in (cls._pool, cls._read_pool):
+            if pool:
+                pool.export()
 
     @classmethod
     async def close(cls):
+        if cls._read_pool:
+            await cls._read_pool.close()
+            cls._read_pool = None
         if cls._pool:
             await cls._pool.close()
             cls._pool = None
 
+metrics.on_collect(Database.export_metrics)
+
 db = Database
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+
+import asyncpg
+
+from common import metrics
+
+# Checkouts slower than this count as "slow" in the pool stats.
+SLOW_CHECKOUT = 0.1
+
+POOL_WAIT_SECONDS = metrics.Histogram("db_pool_wait_seconds", "Time spent waiting to check out a connection", ("pool",))
+POOL_CONNECTIONS = metrics.Gauge("db_pool_connections", "Open pool connections", ("pool", "state"))
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+@dataclass
+class PoolConfig:
+    """
+    Pool settings for one process, from env.
+    DB_POOL_BUDGET is what the whole service may hold open (all its processes together,
+    listener connections included); each process gets budget / DB_POOL_PROCESSES.
+    Keep the sum over all services below Postgres max_connections (100 by default).
+    """
+    budget: int = 10
+    processes: int = 1
+    min_size: int = 1
+    max_size: int = 10
+    max_idle: float = 300.0         # close connections idle this long (seconds)
+    max_queries: int = 50000        # recycle a connection after this many queries
+    statement_cache: int = 100
+    command_timeout: float = None
+    pgbouncer: bool = False
+    application_name: str = None
+    read_only: bool = False
+
+    @classmethod
+    def from_env(cls):
+        budget = _env_int('DB_POOL_BUDGET', 10)
+        processes = max(1, _env_int('DB_POOL_PROCESSES', 1))
+        max_size = max(1, _env_int('DB_POOL_MAX', budget // processes))
+        timeout = os.getenv('DB_COMMAND_TIMEOUT')
+        return cls(
+            budget=budget,
+            processes=processes,
+            min_size=min(_env_int('DB_POOL_MIN', 1), max_size),
+            max_size=max_size,
+            max_idle=float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            max_queries=_env_int('DB_POOL_MAX_QUERIES', 50000),
+            statement_cache=_env_int('DB_STATEMENT_CACHE', 100),
+            command_timeout=float(timeout) if timeout else None,
+            # PgBouncer in transaction mode can't keep named prepared statements across transactions.
+            pgbouncer=os.getenv('DB_PGBOUNCER', '0') == '1',
+            application_name=os.getenv('DB_APPLICATION_NAME'),
+        )
+
+    def connect_kwargs(self):
+        kwargs = {
+            'statement_cache_size': 0 if self.pgbouncer else self.statement_cache,
+            'command_timeout': self.command_timeout,
+        }
+        settings = {}
+        if self.application_name:
+            settings['application_name'] = self.application_name
+        if self.read_only:
+            settings['default_transaction_read_only'] = 'on'
+        if settings:
+            kwargs['server_settings'] = settings
+        return kwargs
+
+
+class MeteredPool(asyncpg.Pool):
+    """asyncpg pool that records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, name="primary", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+        self.checkout_stats = {"count": 0, "wait_total": 0.0, "wait_max": 0.0, "slow": 0, "timeouts": 0}
+
+    async def _acquire(self, timeout):
+        start = time.perf_counter()
+        try:
+            return await super()._acquire(timeout)
+        except asyncio.TimeoutError:
+            self.checkout_stats["timeouts"] += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            stats = self.checkout_stats
+            stats["count"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+            POOL_WAIT_SECONDS.observe(wait, pool=self.name)
+            if wait >= SLOW_CHECKOUT:
+                stats["slow"] += 1
+
+    def stats(self):
+        stats = dict(self.checkout_stats)
+        stats["wait_avg"] = stats["wait_total"] / stats["count"] if stats["count"] else 0.0
+        stats.update(size=self.get_size(), idle=self.get_idle_size(), max_size=self.get_max_size())
+        return stats
+
+    def export(self):
+        idle = self.get_idle_size()
+        POOL_CONNECTIONS.set(idle, pool=self.name, state="idle")
+        POOL_CONNECTIONS.set(self.get_size() - idle, pool=self.name, state="busy")
+
+
+async def create_pool(dsn, config: PoolConfig, init=None, connection_class=asyncpg.Connection, name="primary") -> MeteredPool:
+    pool = MeteredPool(
+        dsn,
+        name=name,
+        min_size=config.min_size,
+        max_size=config.max_size,
+        max_queries=config.max_queries,
+        max_inactive_connection_lifetime=config.max_idle,
+        setup=None,
+        init=init,
+        loop=None,
+        connection_class=connection_class,
+        record_class=asyncpg.Record,
+        **config.connect_kwargs(),
+    )
+    return await pool
@@ -0,0 +1,175 @@
+import time
+from dataclasses import dataclass
+from typing import Dict
+
+import asyncpg
+
+from common import metrics
+
+# Every hot statement, by name. Prepared once per connection when the pool opens it,
+# so the first command after startup doesn't pay parse/plan.
+REGISTRY: Dict[str, "Query"] = {}
+
+QUERY_SECONDS = metrics.Histogram("db_query_seconds", "Registry query latency (excludes pool wait)", ("query",))
+
+
+class RegistryConnection(asyncpg.Connection):
+    """Connection that carries its prepared registry statements."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+
+
+async def prepare_all(conn):
+    """Pool `init` hook: prepares every registered statement on a new connection."""
+    for query in REGISTRY.values():
+        try:
+            conn.prepared[query.name] = await conn.prepare(query.sql)
+        except asyncpg.PostgresError:
+            # Schema not applied yet (e.g. init_db on a fresh database); prepared on first use instead.
+            pass
+
+
+@dataclass
+class Query:
+    """
+    A named statement. Call with a connection (inside a transaction) or the pool.
+    Runs the connection's prepared statement. Without one, as under PgBouncer or on a
+    plain connection, it falls back to the ordinary query path.
+    """
+    name: str
+    sql: str
+
+    def __post_init__(self):
+        self.stats = {"calls": 0, "total": 0.0, "max": 0.0}
+        REGISTRY[self.name] = self
+
+    async def fetch(self, db, *args):
+        return await self._run(db, "fetch", args)
+
+    async def fetchrow(self, db, *args):
+        return await self._run(db, "fetchrow", args)
+
+    async def fetchval(self, db, *args):
+        return await self._run(db, "fetchval", args)
+
+    async def _run(self, db, method, args):
+        if isinstance(db, asyncpg.Pool):
+            async with db.acquire() as conn:
+                return await self._run(conn, method, args)
+
+        start = time.perf_counter()
+        try:
+            prepared = getattr(db, "prepared", None)
+            if prepared is None:
+                return await getattr(db, method)(self.sql, *args)
+            stmt = prepared.get(self.name)
+            if stmt is None:
+                stmt = prepared[self.name] = await db.prepare(self.sql)
+            try:
+                return await getattr(stmt, method)(*args)
+            except asyncpg.InvalidCachedStatementError:
+                # Schema changed under the statement (migration); re-prepare once.
+                stmt = prepared[self.name] = await db.prepare(self.sql)
+                return await getattr(stmt, method)(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats["calls"] += 1
+            self.stats["total"] += elapsed
+            self.stats["max"] = max(self.stats["max"], elapsed)
+            QUERY_SECONDS.observe(elapsed, query=self.name)
+
+
+def query_stats():
+    """Per-query call counts and latency (ms), busiest first."""
+    rows = []
+    for q in REGISTRY.values():
+        calls = q.stats["calls"]
+        rows.append({
+            "name": q.name,
+            "calls": calls,
+            "avg_ms": q.stats["total"] / calls * 1000 if calls else 0.0,
+            "max_ms": q.stats["max"] * 1000,
+        })
+    return sorted(rows, key=lambda r: r["calls"], reverse=True)
+
+
+# --- Users / economy ---
+
+# Returns the user_id only when the row was just created.
+ENSURE_USER = Query(
+    "ensure_user",
+    "INSERT INTO users (user_id, balance) VALUES ($1, 0) ON CONFLICT (user_id) DO NOTHING RETURNING user_id"
+)
+GET_BALANCE = Query("get_balance", "SELECT balance FROM users WHERE user_id = $1")
+GET_USER = Query("get_user", "SELECT user_id, balance, xp, level, badges, inventory FROM users WHERE user_id = $1")
+# Return the new balance and its version, or no row when funds are short.
+DEBIT = Query(
+    "debit",
+    "UPDATE users SET balance = balance - $2 WHERE user_id = $1 AND balance >= $2 RETURNING balance, balance_version"
+)
+CREDIT = Query("credit", "UPDATE users SET balance = balance + $2 WHERE user_id = $1 RETURNING balance, balance_version")
+ADD_XP = Query("add_xp", "UPDATE users SET xp = xp + $2 WHERE user_id = $1 RETURNING xp, level, badges")
+SET_LEVEL = Query("set_level", "UPDATE users SET level = $2 WHERE user_id = $1")
+ADD_BADGE = Query("add_badge", "UPDATE users SET badges = array_append(badges, $2) WHERE user_id = $1")
+ADD_ITEM = Query("add_item", "UPDATE users SET inventory = array_append(inventory, $2) WHERE user_id = $1")
+
+# Voice time settlement for many users in one statement: $1 user ids (unique), $2 minutes,
+# $3 solvency multiplier, $4 XP per minute, $5 XP per level. Income per minute is 1/2/3 by
+# level (10+, 20+); the bank pays the total only if it can cover all of it, XP is granted
+# either way. Every CTE sees the same snapshot, so old_level is the level before this update.
+SETTLE_VOICE = Query(
+    "settle_voice",
+    """
+    WITH accrued AS (
+        SELECT a.user_id, a.minutes, COALESCE(u.level, 1) AS old_level,
+               FLOOR(a.minutes * CASE WHEN COALESCE(u.level, 1) >= 20 THEN 3
+                                      WHEN COALESCE(u.level, 1) >= 10 THEN 2 ELSE 1 END * $3::float8)::int AS income
+        FROM unnest($1::bigint[], $2::int[]) AS a(user_id, minutes)
+        LEFT JOIN users u ON u.user_id = a.user_id
+    ),
+    bank AS (
+        UPDATE users SET balance = balance - (SELECT COALESCE(SUM(income), 0) FROM accrued)
+        WHERE user_id = 0 AND balance >= (SELECT COALESCE(SUM(income), 0) FROM accrued)
+        RETURNING balance, balance_version
+    ),
+    paid AS (
+        INSERT INTO users AS u (user_id, balance, xp, level)
+        SELECT user_id, CASE WHEN EXISTS (SELECT 1 FROM bank) THEN income ELSE 0 END,
+               minutes * $4, minutes * $4 / $5 + 1
+        FROM accrued
+        ON CONFLICT (user_id) DO UPDATE SET
+            balance = u.balance + EXCLUDED.balance,
+            xp = u.xp + EXCLUDED.xp,
+            level = GREATEST(u.level, (u.xp + EXCLUDED.xp) / $5 + 1),
+            last_active = NOW()
+        RETURNING u.user_id, u.balance, u.balance_version, u.xp, u.level, u.badges
+    )
+    SELECT p.user_id, p.balance, p.balance_version, p.xp, p.level, a.old_level, p.badges,
+           CASE WHEN EXISTS (SELECT 1 FROM bank) THEN a.income ELSE 0 END AS income,
+           (SELECT balance FROM bank) AS bank_balance, (SELECT balance_version FROM bank) AS bank_version
+    FROM paid p JOIN accrued a USING (user_id)
+    """
+)
+
+# Fallback for the leaderboard when Redis isn't configured (idx_users_balance).
+TOP_BALANCES = Query(
+    "top_balances",
+    "SELECT user_id, balance FROM users WHERE user_id <> 0 AND balance > 0 ORDER BY balance DESC LIMIT $1"
+)
+
+# API profiles; xmin is the row version behind the ETags.
+USER_PROFILE = Query(
+    "user_profile",
+    "SELECT user_id, balance, xp, level, badges, inventory, xmin::text AS version FROM users WHERE user_id = $1"
+)
+USER_PROFILES = Query(
+    "user_profiles",
+    "SELECT user_id, balance, xp, level, badges, inventory, xmin::text AS version FROM users WHERE user_id = ANY($1::bigint[])"
+)
+
+# --- Cinema ---
+
+PURCHASE_TICKET = Query("purchase_ticket", "SELECT status, price, balance, balance_version FROM purchase_cinema_ticket($1::uuid, $2)")
+SET_SESSION_VIDEO = Query("set_session_video", "UPDATE cinema_sessions SET video_url = $2 WHERE session_id = $1::uuid")
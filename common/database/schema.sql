@@ -4,6 +4,7 @@
 CREATE TABLE IF NOT EXISTS users (
     user_id BIGINT PRIMARY KEY,              -- Discord user ID
     balance INT DEFAULT 0 CHECK (balance >= 0),
+    balance_version BIGINT NOT NULL DEFAULT 0, -- Bumped on every balance change (orders leaderboard events)
     xp INT DEFAULT 0,
     level INT DEFAULT 1,
     badges TEXT[] DEFAULT '{}',              -- Array of badge names
@@ -15,6 +16,21 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance);
 CREATE INDEX IF NOT EXISTS idx_users_level ON users(level);
 
+ALTER TABLE users ADD COLUMN IF NOT EXISTS balance_version BIGINT NOT NULL DEFAULT 0;
+
+-- Per-row counter, so consumers can tell which of two balances for a user is newer.
+-- Row locks serialize balance updates, so versions follow commit order (xmin doesn't).
+CREATE OR REPLACE FUNCTION bump_balance_version() RETURNS trigger AS $$
+BEGIN
+    NEW.balance_version := OLD.balance_version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_balance_version ON users;
+CREATE TRIGGER trg_users_balance_version BEFORE UPDATE OF balance ON users
+    FOR EACH ROW WHEN (OLD.balance IS DISTINCT FROM NEW.balance) EXECUTE FUNCTION bump_balance_version();
+
 -- ==========================================
 -- TRANSACTIONS TABLE (Immutable Ledger)
 -- ==========================================
@@ -50,6 +66,7 @@ CREATE TABLE IF NOT EXISTS cinema_sessions (
 );
 
 CREATE INDEX IF NOT EXISTS idx_cinema_sessions_active ON cinema_sessions(is_active) WHERE is_active = TRUE;
+CREATE INDEX IF NOT EXISTS idx_cinema_sessions_host ON cinema_sessions(host_id, guild_id, created_at DESC) WHERE is_active = TRUE;
 CREATE INDEX IF NOT EXISTS idx_cinema_sessions_guild ON cinema_sessions(guild_id);
 
 -- ==========================================
@@ -68,6 +85,74 @@ CREATE TABLE IF NOT EXISTS cinema_tickets (
 CREATE INDEX IF NOT EXISTS idx_cinema_tickets_session ON cinema_tickets(session_id);
 CREATE INDEX IF NOT EXISTS idx_cinema_tickets_user ON cinema_tickets(user_id);
 
+-- Ticket/session NOTIFY feeds the API's in-memory room authorization index.
+-- Payload: '<session_id>:<user_id>' (tickets) / '<session_id>:<host_id>' (new sessions).
+-- Ended sessions go out on 'cinema_sessions_ended' with just the session id.
+CREATE OR REPLACE FUNCTION notify_cinema_ticket() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('cinema_tickets', NEW.session_id::text || ':' || NEW.user_id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cinema_ticket_notify ON cinema_tickets;
+CREATE TRIGGER trg_cinema_ticket_notify AFTER INSERT ON cinema_tickets
+    FOR EACH ROW EXECUTE FUNCTION notify_cinema_ticket();
+
+CREATE OR REPLACE FUNCTION notify_cinema_session() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('cinema_sessions', NEW.session_id::text || ':' || NEW.host_id::text);
+    ELSIF OLD.is_active AND NOT NEW.is_active THEN
+        PERFORM pg_notify('cinema_sessions_ended', NEW.session_id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cinema_session_notify ON cinema_sessions;
+CREATE TRIGGER trg_cinema_session_notify AFTER INSERT OR UPDATE OF is_active ON cinema_sessions
+    FOR EACH ROW EXECUTE FUNCTION notify_cinema_session();
+
+-- Ticket purchase in one round trip: session check, debit, bank credit (user 0) and ticket
+-- insert all commit together or not at all. Safe to retry: an existing ticket is never charged again.
+-- status: 'purchased' | 'owned' | 'no_session' | 'insufficient_funds'
+DROP FUNCTION IF EXISTS purchase_cinema_ticket(UUID, BIGINT);  -- return type changed (balance_version)
+CREATE FUNCTION purchase_cinema_ticket(p_session_id UUID, p_user_id BIGINT)
+RETURNS TABLE (status TEXT, price INT, balance INT, balance_version BIGINT) AS $$
+DECLARE
+    v_price INT;
+BEGIN
+    SELECT s.ticket_price INTO v_price FROM cinema_sessions s
+    WHERE s.session_id = p_session_id AND s.is_active = TRUE;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'no_session'::TEXT, NULL::INT, NULL::INT, NULL::BIGINT;
+        RETURN;
+    END IF;
+
+    -- Claim the ticket first: a concurrent duplicate blocks on the unique index, then finds it taken.
+    INSERT INTO cinema_tickets (session_id, user_id) VALUES (p_session_id, p_user_id)
+    ON CONFLICT ON CONSTRAINT unique_ticket DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'owned'::TEXT, v_price, (SELECT u.balance FROM users u WHERE u.user_id = p_user_id), NULL::BIGINT;
+        RETURN;
+    END IF;
+
+    UPDATE users u SET balance = u.balance - v_price
+    WHERE u.user_id = p_user_id AND u.balance >= v_price
+    RETURNING u.balance, u.balance_version INTO balance, balance_version;
+    IF NOT FOUND THEN
+        -- Undo the ticket claim (and its NOTIFY) by failing the statement.
+        RAISE EXCEPTION 'insufficient_funds' USING ERRCODE = 'P0001';
+    END IF;
+    UPDATE users SET balance = users.balance + v_price WHERE user_id = 0;
+
+    RETURN QUERY SELECT 'purchased'::TEXT, v_price, balance, balance_version;
+EXCEPTION WHEN SQLSTATE 'P0001' THEN
+    RETURN QUERY SELECT 'insufficient_funds'::TEXT, v_price, (SELECT u.balance FROM users u WHERE u.user_id = p_user_id), NULL::BIGINT;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ==========================================
 -- PERSISTENT PLAYLISTS
 -- ==========================================
@@ -75,7 +160,7 @@ CREATE TABLE IF NOT EXISTS playlists (
     playlist_id SERIAL PRIMARY KEY,
     user_id BIGINT NOT NULL,
     name VARCHAR(50) NOT NULL,
-    songs JSONB NOT NULL DEFAULT '[]',       -- List of song objects
+    songs JSONB NOT NULL DEFAULT '[]',       -- Legacy; songs live in playlist_items
     created_at TIMESTAMP DEFAULT NOW(),
     
     CONSTRAINT unique_user_playlist_name UNIQUE (user_id, name)
@@ -83,6 +168,30 @@ CREATE TABLE IF NOT EXISTS playlists (
 
 CREATE INDEX IF NOT EXISTS idx_playlists_user ON playlists(user_id);
 
+-- ==========================================
+-- PLAYLIST ITEMS (one row per song)
+-- ==========================================
+CREATE TABLE IF NOT EXISTS playlist_items (
+    item_id BIGSERIAL PRIMARY KEY,
+    playlist_id INT NOT NULL REFERENCES playlists(playlist_id) ON DELETE CASCADE,
+    position BIGINT NOT NULL,                -- Sparse sort key (steps of 1024) so moves touch one row
+    url TEXT NOT NULL,
+    title TEXT,
+    duration INT DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_playlist_items_order ON playlist_items(playlist_id, position, item_id);
+
+-- Migrate legacy JSONB blobs (playlists.songs) into playlist_items, then empty them.
+-- Safe to re-run: only non-empty blobs are copied.
+INSERT INTO playlist_items (playlist_id, position, url, title, duration)
+SELECT p.playlist_id, s.ord * 1024, s.song->>'url', s.song->>'title', COALESCE((s.song->>'duration')::numeric::int, 0)
+FROM playlists p
+CROSS JOIN LATERAL jsonb_array_elements(p.songs) WITH ORDINALITY AS s(song, ord)
+WHERE jsonb_array_length(p.songs) > 0;
+
+UPDATE playlists SET songs = '[]' WHERE jsonb_array_length(songs) > 0;
+
 -- ==========================================
 -- SPECIAL ACCOUNTS
 -- ==========================================
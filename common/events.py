@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import socket
+import time
+
+import redis.asyncio as redis
+
+from common import metrics
+from common.redis_client import RedisClient
+
+# Streams are trimmed (approximately) to this many entries each.
+STREAM_MAXLEN = int(os.getenv('EVENT_STREAM_MAXLEN', 100000))
+# Entries a dead consumer left unacknowledged this long (ms) are taken over by a live one.
+CLAIM_IDLE_MS = 60000
+
+# Topics. One stream per topic so consumers only read what they care about.
+ECONOMY = "economy"            # transfer, level_up, item_bought
+CINEMA_SESSIONS = "cinema_sessions"  # session_created, session_ended
+CINEMA_TICKETS = "cinema_tickets"    # ticket_purchased
+
+# At most one "Redis is down" warning per this many seconds, not one per event.
+WARN_INTERVAL = 30
+
+PUBLISHED = metrics.Counter("events_published_total", "Events published to the bus", ("topic", "type"))
+PUBLISH_FAILED = metrics.Counter("events_publish_failed_total", "Events dropped because Redis was unavailable", ("topic",))
+HANDLED = metrics.Counter("events_handled_total", "Events handled by consumer groups", ("group", "topic", "status"))
+
+
+_last_warning = 0.0
+
+
+def stream_key(topic):
+    return f"events:{topic}"
+
+
+async def publish(topic, type, **data):
+    """
+    Appends one event to the topic's stream. Never raises: the write it describes has
+    already committed, so a Redis outage costs the event, not the command.
+    """
+    global _last_warning
+    fields = {"type": type, "ts": f"{time.time():.3f}", "data": json.dumps(data)}
+    try:
+        await RedisClient.get().xadd(stream_key(topic), fields, maxlen=STREAM_MAXLEN, approximate=True)
+        PUBLISHED.inc(topic=topic, type=type)
+    except Exception as e:
+        PUBLISH_FAILED.inc(topic=topic)
+        if time.monotonic() - _last_warning > WARN_INTERVAL:
+            _last_warning = time.monotonic()
+            print(f"⚠️ Event {topic}/{type} not published: {e}")
+
+
+async def publish_many(topic, type, items):
+    """publish() for a batch (list of data dicts) in one round trip. Never raises either."""
+    global _last_warning
+    if not items:
+        return
+    now = f"{time.time():.3f}"
+    try:
+        async with RedisClient.get().pipeline(transaction=False) as pipe:
+            for data in items:
+                pipe.xadd(stream_key(topic), {"type": type, "ts": now, "data": json.dumps(data)},
+                          maxlen=STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+        PUBLISHED.inc(len(items), topic=topic, type=type)
+    except Exception as e:
+        PUBLISH_FAILED.inc(len(items), topic=topic)
+        if time.monotonic() - _last_warning > WARN_INTERVAL:
+            _last_warning = time.monotonic()
+            print(f"⚠️ {len(items)} {topic}/{type} events not published: {e}")
+
+
+class Event:
+    __slots__ = ("topic", "id", "type", "ts", "data")
+
+    def __init__(self, topic, id, fields):
+        self.topic = topic
+        self.id = id
+        self.type = fields.get("type")
+        self.ts = float(fields.get("ts") or 0)
+        self.data = json.loads(fields.get("data") or "{}")
+
+
+class Consumer:
+    """
+    Reads topics as one member of a consumer group: each event goes to one member of the
+    group (e.g. one API worker), every group sees every event. `handler(event)` is awaited
+    per event and the event is acknowledged once it returns; if it raises, the event stays
+    pending and is retried (by this member on restart, or claimed by another after
+    CLAIM_IDLE_MS).
+    """
+
+    def __init__(self, group, topics, handler, name=None, batch=100, block_ms=5000):
+        self.group = group
+        self.topics = list(topics)
+        self.handler = handler
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch = batch
+        self.block_ms = block_ms
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def ensure_groups(self, client):
+        for topic in self.topics:
+            try:
+                # '$': a new group starts with events published from now on
+                await client.xgroup_create(stream_key(topic), self.group, id="$", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def run(self):
+        backoff = 1
+        while True:
+            try:
+                client = RedisClient.get()
+                await self.ensure_groups(client)
+                # Our own unacknowledged events first (from before a crash/restart), then stale ones of dead members
+                await self.drain(client, {stream_key(t): "0" for t in self.topics})
+                await self.claim_stale(client)
+                backoff = 1
+                while True:
+                    streams = {stream_key(t): ">" for t in self.topics}
+                    reply = await client.xreadgroup(self.group, self.name, streams, count=self.batch, block=self.block_ms)
+                    if reply:
+                        await self.handle(client, reply)
+                    else:
+                        await self.claim_stale(client)  # idle: look after other members' leftovers
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Event consumer {self.group} error: {e}. Retrying in {backoff}s...")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    async def drain(self, client, streams):
+        while True:
+            reply = await client.xreadgroup(self.group, self.name, streams, count=self.batch)
+            if not reply or not any(entries for _, entries in reply):
+                return
+            await self.handle(client, reply)
+            streams = {key: entries[-1][0] for key, entries in reply if entries}
+
+    async def claim_stale(self, client):
+        for topic in self.topics:
+            _, entries, *_ = await client.xautoclaim(stream_key(topic), self.group, self.name,
+                                                      min_idle_time=CLAIM_IDLE_MS, count=self.batch)
+            if entries:
+                await self.handle(client, [(stream_key(topic), entries)])
+
+    async def handle(self, client, reply):
+        for key, entries in reply:
+            topic = key.split(":", 1)[1]
+            done = []
+            for entry_id, fields in entries:
+                if fields is None:
+                    done.append(entry_id)  # trimmed away while pending
+                    continue
+                try:
+                    await self.handler(Event(topic, entry_id, fields))
+                    done.append(entry_id)
+                    HANDLED.inc(group=self.group, topic=topic, status="ok")
+                except Exception as e:
+                    HANDLED.inc(group=self.group, topic=topic, status="error")
+                    print(f"⚠️ {self.group} failed on {topic} event {entry_id}: {e}")
+            if done:
+                await client.xack(key, self.group, *done)
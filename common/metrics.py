@@ -0,0 +1,179 @@
+import asyncio
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets (seconds): 1 ms up to 30 s, wide enough for both queries and yt-dlp.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# How often the loop-lag sampler wakes up (seconds).
+LOOP_LAG_INTERVAL = float(os.getenv('METRICS_LOOP_LAG_INTERVAL', 0.5))
+
+REGISTRY = {}
+_collect_hooks = []
+
+
+def on_collect(fn):
+    """Registers `fn()` to run before every render (refresh gauges from live stats)."""
+    _collect_hooks.append(fn)
+    return fn
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        # Histograms are also fed from voice/executor threads.
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        return tuple(labels.get(n, '') for n in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]  # bucket counts, count, sum
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, count, total = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [le])} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [le])} {count}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        return lines
+
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    for fn in _collect_hooks:
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ Metrics collector failed: {e}")
+    lines = []
+    for metric in list(REGISTRY.values()):
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Shared metrics ---
+
+COMMAND_SECONDS = Histogram("discord_command_seconds", "Bot command latency", ("command", "status"))
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+YTDL_SECONDS = Histogram("ytdl_extract_seconds", "yt-dlp extraction time", ("kind",))
+
+
+async def sample_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Sleeps `interval` over and over; any extra time is how long something blocked the loop."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def instrument_bot(bot):
+    """Times every prefix command through the bot-wide before/after invoke hooks."""
+
+    @bot.before_invoke
+    async def start_timer(ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    @bot.after_invoke
+    async def stop_timer(ctx):
+        started = getattr(ctx, 'metrics_started', None)
+        if started is not None:
+            status = "error" if ctx.command_failed else "ok"
+            COMMAND_SECONDS.observe(time.perf_counter() - started, command=ctx.command.qualified_name, status=status)
+
+
+async def start_http_server(port):
+    """Serves /metrics on `port` (bots; the API has its own route). Returns the aiohttp runner."""
+    from aiohttp import web  # ships with discord.py
+
+    async def handle(request):
+        return web.Response(body=render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    print(f"📈 Metrics on :{port}/metrics")
+    return runner
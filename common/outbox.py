@@ -0,0 +1,193 @@
+"""
+Outbound message queue: commands hand their replies to `outbox.send(channel, ...)` and move on.
+
+Each channel gets a worker that waits a short window, merges adjacent messages into one
+(up to Discord's 2,000 characters / 10 embeds), splits anything longer and paces sends to
+the per-channel and global message limits. While a channel is waiting for its bucket, new
+messages keep merging, so a burst (rain payouts, level-ups, casino results) turns into a
+few large messages instead of a string of 429s that stall the command handlers.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+from common import metrics
+
+MESSAGE_LIMIT = 2000
+EMBED_LIMIT = 10
+# Adjacent messages sent within this window (seconds) are merged.
+WINDOW = float(os.getenv('OUTBOX_WINDOW_MS', 200)) / 1000
+# Discord: 5 messages per 5 s per channel, 50 requests per second per bot.
+CHANNEL_RATE = (5, 5.0)
+GLOBAL_RATE = (50, 1.0)
+# Queued messages per channel before the oldest are dropped.
+MAX_PENDING = int(os.getenv('OUTBOX_MAX_PENDING', 200))
+
+QUEUED = metrics.Counter("outbox_messages_total", "Messages handed to the outbox")
+SENT = metrics.Counter("outbox_sends_total", "Discord messages actually sent by the outbox", ("status",))
+DROPPED = metrics.Counter("outbox_dropped_total", "Messages dropped because a channel's queue was full")
+PENDING = metrics.Gauge("outbox_pending", "Messages waiting in the outbox")
+DELAY_SECONDS = metrics.Histogram("outbox_delay_seconds", "Time from send() to the message being posted")
+
+
+def split_content(text, limit=MESSAGE_LIMIT):
+    """Splits text into chunks of at most `limit`, preferring line then word boundaries."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            chunks.append(text[:limit])
+            text = text[limit:]
+            continue
+        chunks.append(text[:cut])
+        text = text[cut + 1:]  # the separator itself is dropped
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+class RateWindow:
+    """At most `count` events per `period` seconds (sliding window)."""
+
+    def __init__(self, count, period):
+        self.count = count
+        self.period = period
+        self.sent = deque()
+
+    def delay(self, now):
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+        return 0.0 if len(self.sent) < self.count else self.sent[0] + self.period - now
+
+    def hit(self, now):
+        self.sent.append(now)
+
+
+class _Item:
+    __slots__ = ("content", "embeds", "kwargs", "future", "queued_at")
+
+    def __init__(self, content, embeds, kwargs, future):
+        self.content = content
+        self.embeds = embeds
+        self.kwargs = kwargs  # files, views, references...: sent on their own
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class _ChannelQueue:
+    def __init__(self, channel):
+        self.channel = channel
+        self.items = deque()
+        self.rate = RateWindow(*CHANNEL_RATE)
+        self.task = None
+
+    def take(self):
+        """Pops the next message to send: the head plus whatever can be merged into it."""
+        first = self.items.popleft()
+        batch = [first]
+        if first.kwargs:
+            return first.content, first.embeds, first.kwargs, batch
+        content, embeds = first.content, list(first.embeds)
+        while self.items:
+            nxt = self.items[0]
+            # Content renders above embeds, so text can't follow an embed without reordering
+            if nxt.kwargs or (embeds and nxt.content):
+                break
+            merged = "\n".join(c for c in (content, nxt.content) if c) or None
+            if len(merged or "") > MESSAGE_LIMIT or len(embeds) + len(nxt.embeds) > EMBED_LIMIT:
+                break
+            content = merged
+            embeds.extend(nxt.embeds)
+            batch.append(self.items.popleft())
+        return content, embeds, {}, batch
+
+
+class Outbox:
+    def __init__(self):
+        self.queues = {}
+        self.global_rate = RateWindow(*GLOBAL_RATE)
+        metrics.on_collect(lambda: PENDING.set(sum(len(q.items) for q in self.queues.values())))
+
+    def send(self, channel, content=None, *, embed=None, embeds=None, **kwargs) -> asyncio.Future:
+        """
+        Queues a message for `channel` and returns at once. The returned future resolves to
+        the Message that carried it (None if sending failed); awaiting it is optional.
+        Must be called on the event loop, see send_threadsafe().
+        """
+        future = asyncio.get_running_loop().create_future()
+        embeds = list(embeds or ()) + ([embed] if embed else [])
+        content = None if content is None else str(content)
+        chunks = split_content(content) if content else [None]
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = _ChannelQueue(channel)
+        for i, chunk in enumerate(chunks):
+            last = i == len(chunks) - 1
+            # Only the last chunk carries the embeds/attachments and resolves the future
+            queue.items.append(_Item(chunk, embeds if last else [], kwargs if last else {},
+                                     future if last else None))
+        QUEUED.inc()
+        while len(queue.items) > MAX_PENDING:
+            dropped = queue.items.popleft()
+            DROPPED.inc()
+            if dropped.future and not dropped.future.done():
+                dropped.future.set_result(None)
+        if queue.task is None:
+            queue.task = asyncio.create_task(self._run(queue))
+        return future
+
+    def send_threadsafe(self, loop, channel, content=None, **kwargs):
+        """send() from a non-loop thread (voice `after` callbacks)."""
+        loop.call_soon_threadsafe(lambda: self.send(channel, content, **kwargs))
+
+    async def _run(self, queue):
+        try:
+            await asyncio.sleep(WINDOW)  # let the burst gather
+            while queue.items:
+                # Wait for the buckets; meanwhile new messages keep merging into the head
+                while True:
+                    now = time.monotonic()
+                    wait = max(queue.rate.delay(now), self.global_rate.delay(now))
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                now = time.monotonic()
+                queue.rate.hit(now)
+                self.global_rate.hit(now)
+                await self._deliver(queue.channel, *queue.take())
+        finally:
+            queue.task = None
+            # Keep the channel's send history until its window passes, so the next burst is paced too
+            asyncio.get_running_loop().call_later(queue.rate.period, self._forget, queue)
+
+    def _forget(self, queue):
+        if queue.task is None and not queue.items and self.queues.get(queue.channel.id) is queue:
+            del self.queues[queue.channel.id]
+
+    async def _deliver(self, channel, content, embeds, kwargs, batch):
+        message = None
+        try:
+            if embeds:
+                kwargs = dict(kwargs, embeds=embeds)
+            message = await channel.send(content=content, **kwargs)
+            SENT.inc(status="ok")
+        except Exception as e:  # Forbidden, deleted channel...: the command already moved on
+            SENT.inc(status="error")
+            print(f"⚠️ Outbox send to #{getattr(channel, 'name', channel.id)} failed: {e}")
+        now = time.monotonic()
+        for item in batch:
+            DELAY_SECONDS.observe(now - item.queued_at)
+            if item.future and not item.future.done():
+                item.future.set_result(message)
+
+    async def flush(self, timeout=5):
+        """Waits (bounded) for queued messages to go out, e.g. before the bot closes."""
+        tasks = [q.task for q in self.queues.values() if q.task]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+
+outbox = Outbox()
@@ -0,0 +1,65 @@
+import asyncio
+import os
+from typing import Optional
+
+import redis.asyncio as redis
+
+DEFAULT_URL = 'redis://redis:6379/0'
+LOCAL_URL = 'redis://localhost:6379/0'
+# Connections the process-wide pool may open (all cogs / handlers share them).
+MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+
+
+class RedisClient:
+    """One pooled async Redis client per process, like Database for Postgres."""
+    _client: Optional[redis.Redis] = None
+    url: Optional[str] = None
+
+    @classmethod
+    def get(cls) -> redis.Redis:
+        """The shared client. Cheap: connections are opened lazily by the pool."""
+        if cls._client is None:
+            cls._connect(os.getenv('REDIS_URL', DEFAULT_URL))
+        return cls._client
+
+    @classmethod
+    def _connect(cls, url):
+        cls.url = url
+        cls._client = redis.from_url(
+            url,
+            decode_responses=True,
+            max_connections=MAX_CONNECTIONS,
+            health_check_interval=30,  # PING idle connections before reuse
+            socket_keepalive=True,
+            retry_on_timeout=True,
+        )
+
+    @classmethod
+    async def check(cls) -> bool:
+        """
+        Startup check. If the compose hostname doesn't resolve (native runs), switches to
+        localhost. Returns whether Redis answered a PING; callers only warn, Redis can come later.
+        """
+        client = cls.get()
+        host = client.connection_pool.connection_kwargs.get('host', 'localhost')
+        try:
+            await asyncio.get_running_loop().getaddrinfo(host, None)
+        except OSError:
+            print("⚠️ Could not resolve Redis host. Falling back to localhost.")
+            await client.aclose()
+            cls._connect(LOCAL_URL)
+        return await cls.healthy()
+
+    @classmethod
+    async def healthy(cls, timeout=3) -> bool:
+        try:
+            return await asyncio.wait_for(cls.get().ping(), timeout=timeout)
+        except Exception as e:
+            print(f"⚠️ Redis not reachable ({e}).")
+            return False
+
+    @classmethod
+    async def close(cls):
+        if cls._client:
+            await cls._client.aclose()
+            cls._client = None
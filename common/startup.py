@@ -0,0 +1,64 @@
+import time
+from contextlib import contextmanager
+
+from common import metrics
+
+STARTUP_SECONDS = metrics.Gauge("startup_phase_seconds", "Duration of each startup phase", ("phase",))
+READY_SECONDS = metrics.Gauge("startup_ready_seconds", "Process start (first import) to first on_ready")
+
+
+class StartupProfiler:
+    """
+    Time-to-ready per startup phase, printed once on the first on_ready.
+    Phases can overlap (database, Redis and Discord login run side by side), so each
+    is shown as start → end offsets from when this module was first imported.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases = {}  # name -> (start, end) offsets in seconds
+        self._open = {}
+        self.ready_at = None
+
+    def _now(self):
+        return time.perf_counter() - self.t0
+
+    def mark(self, name):
+        """Records a phase that started at import time and ends now (e.g. module imports)."""
+        self.phases[name] = (0.0, self._now())
+
+    def begin(self, name):
+        self._open[name] = self._now()
+
+    def end(self, name):
+        start = self._open.pop(name, None)
+        if start is not None:
+            self.phases[name] = (start, self._now())
+
+    @contextmanager
+    def phase(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    async def run(self, name, coro):
+        with self.phase(name):
+            return await coro
+
+    def ready(self, label):
+        """Closes open phases (e.g. the gateway connect) and reports. Later calls (reconnects) are ignored."""
+        if self.ready_at is not None:
+            return
+        for name in list(self._open):
+            self.end(name)
+        self.ready_at = self._now()
+        READY_SECONDS.set(self.ready_at)
+        print(f"⏱️ {label} ready in {self.ready_at:.2f}s")
+        for name, (start, end) in sorted(self.phases.items(), key=lambda p: p[1]):
+            STARTUP_SECONDS.set(end - start, phase=name)
+            print(f"   {name:<22} {start:6.2f}s → {end:6.2f}s  ({end - start:.2f}s)")
+
+
+profiler = StartupProfiler()